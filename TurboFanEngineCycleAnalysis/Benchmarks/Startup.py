@@ -0,0 +1,70 @@
+"""
+This code measures how long a fresh worker process takes to import the cycle model and how long single calls take once it
+is loaded. Each import is timed in a new interpreter, and the heavy optional packages (sympy, scipy, pandas, matplotlib)
+that end up in sys.modules are reported, since the headless core should only pull in NumPy.
+
+    Usage:
+        python Benchmarks/Startup.py
+"""
+import sys
+sys.path.append(".")
+import subprocess
+import time
+import timeit
+import numpy as np
+
+HEAVY_MODULES = ('sympy', 'scipy', 'pandas', 'matplotlib')
+CORE_MODULES  = ('CycleAnalysis.TurboFan', 'CycleAnalysis.TurboFanBatch')
+
+
+# Wall time of starting an interpreter that imports the given module, and the heavy modules it loaded
+def import_time(module, repeat=5):
+    code = f"import sys, time; t = time.perf_counter(); import {module}; t = time.perf_counter() - t; " \
+           f"print(t, *[m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+    process_times, import_times = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split()
+        process_times.append(time.perf_counter() - start)
+        import_times.append(float(output[0]))
+    return min(process_times), min(import_times), output[1:]
+
+
+# Best time per call of fn over a few timeit runs, [s]
+def call_latency(fn, number=1000, repeat=5):
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number
+
+
+def measure():
+    results = {}
+    for module in CORE_MODULES:
+        process, imported, heavy = import_time(module)
+        results[f"startup {module}"] = (process, imported, heavy)
+
+    from CycleAnalysis.TurboFan import TurboFan
+    from CycleAnalysis.TurboFanBatch import TurboFanBatch
+    engine = TurboFan()
+    engine.run_all_calculations()
+
+    def cold_performance(): # Clear the shared stage cache so every stage runs
+        for cache in TurboFan._stage_cache.values():
+            cache.clear()
+        TurboFan().performance()
+
+    latencies = {
+        'TurboFan.combustor':             call_latency(engine.combustor),
+        'TurboFan.performance (cold)':    call_latency(cold_performance),
+        'TurboFan.performance (cached)':  call_latency(lambda: TurboFan().performance()),
+        'TurboFanBatch.performance (1)':  call_latency(lambda: TurboFanBatch().performance()),
+        'TurboFanBatch.performance (1e5 points) per point':
+            call_latency(lambda: TurboFanBatch(np.linspace(5, 20, 100000)).performance(), number=5) / 100000,
+    }
+    return results, latencies
+
+
+if __name__ == '__main__':
+    startup, latencies = measure()
+    for name, (process, imported, heavy) in startup.items():
+        print(f"{name:45s} process {process*1e3:8.1f} ms   import {imported*1e3:8.1f} ms   heavy modules: {', '.join(heavy) or 'none'}")
+    for name, latency in latencies.items():
+        print(f"{name:45s} {latency*1e6:10.2f} us")
@@ -0,0 +1,235 @@
+"""
+This code is the benchmark suite of the cycle model and its sweep and I/O paths. It measures
+    - startup:    wall time of a fresh interpreter importing the core modules (Benchmarks/Startup.py)
+    - point:      per-point latency of TurboFan.run_all_calculations, performance and display_results, cold and cached
+    - stage:      time of every TurboFan stage method
+    - sweep:      throughput of sweep_grid in points/s at several grid sizes, and the Iterate.py sweep spec end to end
+    - io:         writing and reading sweep results with the result store, and building the text tables
+    - plot:       Plotter.plot_3 with the Agg backend, including saving the figures, and a Plotter/Reports.py report
+                  of a dense 2-D sweep
+Every result is the best of a few repeats. A run is appended as one JSON line to the history file (with the git commit,
+Python, NumPy and machine), and compared against the baseline file: a result more than its threshold worse than the
+baseline is a regression, and the suite then exits with status 1.
+
+    Usage:
+        python Benchmarks/Suite.py                        # run everything, record it and compare with the baseline
+        python Benchmarks/Suite.py --quick --only point,stage
+        python Benchmarks/Suite.py --save-baseline        # make this run the baseline
+"""
+import sys
+sys.path.append(".")
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import timeit
+import numpy as np
+from Benchmarks.Startup import import_time, call_latency, CORE_MODULES
+
+GROUPS     = ('startup', 'point', 'stage', 'sweep', 'io', 'plot')
+HISTORY    = 'Benchmarks/history.jsonl'
+BASELINE   = 'Benchmarks/baseline.json'
+GRID_SIZES = (1000, 10000, 100000, 1000000) # Points per sweep_grid benchmark
+THRESHOLD  = 0.25 # Allowed slowdown against the baseline before a result counts as a regression
+THRESHOLDS = {'startup': 0.5, 'plot': 0.5} # Noisier groups, by result name prefix
+
+
+# Best wall time of fn over repeat runs, [s]
+def best_time(fn, repeat=3):
+    return min(timeit.repeat(fn, number=1, repeat=repeat))
+
+
+def bench_startup(quick):
+    return {f"startup {module}": (import_time(module, repeat=2 if quick else 5)[0], 's') for module in CORE_MODULES}
+
+
+def bench_point(quick):
+    from CycleAnalysis.TurboFan import TurboFan
+    number = 200 if quick else 2000
+
+    def clear_cache(): # Shared stage cache emptied, so every stage runs
+        for cache in TurboFan._stage_cache.values():
+            cache.clear()
+
+    def cold(method):
+        def run():
+            clear_cache()
+            engine = TurboFan()
+            getattr(engine, method)()
+            return engine
+        return run
+
+    engine = cold('performance')()
+    return {
+        'point run_all_calculations (cold)': (call_latency(cold('run_all_calculations'), number), 's'),
+        'point run_all_calculations (cached)': (call_latency(lambda: TurboFan().run_all_calculations(), number), 's'),
+        'point performance (cold)': (call_latency(cold('performance'), number), 's'),
+        'point performance (cached)': (call_latency(lambda: TurboFan().performance(), number), 's'),
+        'point display_results': (call_latency(engine.display_results, max(1, number // 100)), 's'),
+    }
+
+
+def bench_stage(quick):
+    from CycleAnalysis.TurboFan import TurboFan, STAGES
+    engine = TurboFan()
+    engine.run_all_calculations()
+    return {f"stage {name}": (call_latency(getattr(engine, name), 1000 if quick else 10000), 's') for name, *_ in STAGES}
+
+
+def bench_sweep(quick):
+    from Iterations.Sweep import sweep_grid, run_sweep, load_spec
+    results = {}
+    for size in GRID_SIZES[:2] if quick else GRID_SIZES:
+        n = round(size**(1/3)) # Cubic BPR x pi_f x pi_c grid
+        axes = {'BPR': {'start': 5, 'stop': 20, 'num': n}, 'pi_f': {'start': 1.3, 'stop': 1.8, 'num': n},
+                'pi_c': {'start': 20, 'stop': 40, 'num': n}}
+        for workers in (1, None):
+            seconds = best_time(lambda: sweep_grid(axes, workers=workers), 1 if quick else 3)
+            results[f"sweep {n**3} points, {'1 worker' if workers == 1 else 'all cores'}"] = (n**3 / seconds, 'points/s')
+    spec = load_spec('Iterations/IterateSweep.json')
+    directory = tempfile.mkdtemp()
+    try:
+        spec['store'] = os.path.join(directory, 'store')
+        results['sweep Iterate.py spec'] = (best_time(lambda: run_sweep(spec), 1 if quick else 3), 's')
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+
+def bench_io(quick):
+    from Storage.ResultStore import ResultWriter, ResultReader
+    from Iterations.Sweep import OUTPUTS
+    rows = 100000 if quick else 1000000
+    chunk = {name: np.random.default_rng(0).random(rows) for name in OUTPUTS}
+    directory = tempfile.mkdtemp()
+    try:
+        store = os.path.join(directory, 'store')
+        def write():
+            with ResultWriter(store, OUTPUTS) as writer:
+                for start in range(0, rows, 100000):
+                    writer.append({name: array[start:start + 100000] for name, array in chunk.items()})
+        seconds = best_time(write)
+        reader = ResultReader(store)
+        return {
+            'io write rows': (rows / seconds, 'rows/s'),
+            'io read column': (best_time(lambda: np.array(ResultReader(store)['TSFC'])), 's'),
+            'io component_table': (call_latency(lambda: reader.component_table(rows // 2), 20), 's'),
+            'io performance table 1000 rows': (call_latency(lambda: reader.table(['F_m0', 'TSFC', 'f'], slice(0, 1000)), 5), 's'),
+        }
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_plot(quick):
+    try:
+        import matplotlib
+    except ImportError: # Plotting is optional
+        return {}
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from Plotter.Plotter import Plotter
+    from Plotter.Reports import render_report
+    from Iterations.Sweep import SweepResult
+    BPRs, pi_fs, pi_cs = np.linspace(5, 20, 16), np.linspace(1.2, 2.0, 9), np.linspace(20, 40, 21)
+    rng = np.random.default_rng(0)
+    metric = lambda: [rng.random(16), rng.random(9), rng.random(21)]
+    # Dense 2-D sweep for the report figures, random outputs as only the plotting is timed
+    dims, n = ('BPR', 'pi_f'), 1000
+    grid = SweepResult(dims, {'BPR': np.linspace(5, 20, n), 'pi_f': np.linspace(1.2, 2.0, n)},
+                       {name: rng.random((n, n)).cumsum(0) for name in ('F_m0', 'TSFC')})
+    figures = [{'kind': 'contour', 'x': 'BPR', 'y': 'pi_f', 'z': 'TSFC'}, {'kind': 'carpet', 'x': 'F_m0', 'y': 'TSFC'},
+               {'kind': 'lines', 'x': 'BPR', 'y': ['TSFC'], 'series': 'pi_f'}]
+    directory = tempfile.mkdtemp()
+    try:
+        def plot():
+            Plotter(BPRs, metric(), metric(), metric(), metric(), metric(), metric(), pi_fs, pi_cs).plot_3(directory, show=False)
+            plt.close('all')
+        report = lambda: render_report(figures, {'grid': grid}, directory, workers=1)
+        return {'plot plot_3 and save PNG': (best_time(plot, 1 if quick else 3), 's'),
+                'plot report 1000x1000 contour, carpet, lines PNG': (best_time(report, 1 if quick else 3), 's')}
+    finally:
+        shutil.rmtree(directory)
+
+
+def run(groups=GROUPS, quick=False):
+    results = {}
+    for group in groups:
+        results.update(globals()[f"bench_{group}"](quick))
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+# One history record of a run
+def record(results):
+    return {
+        'time':     time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit':   _git_commit(),
+        'python':   platform.python_version(),
+        'numpy':    np.__version__,
+        'machine':  f"{platform.machine()} {platform.processor() or platform.system()}, {os.cpu_count()} cores",
+        'results':  {name: {'value': value, 'unit': unit} for name, (value, unit) in results.items()},
+    }
+
+
+# Compare a record with a baseline record. Returns (name, baseline, current, relative change, regressed) per common result,
+# where a positive change is always a slowdown (more seconds, fewer points per second)
+def compare(current, baseline, threshold=THRESHOLD):
+    rows = []
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        old, new = baseline['results'][name]['value'], result['value']
+        change = (new / old - 1) if result['unit'] == 's' else (old / new - 1)
+        limit = next((value for prefix, value in THRESHOLDS.items() if name.startswith(prefix)), threshold)
+        rows.append((name, old, new, change, change > limit))
+    return rows
+
+
+def _format(value, unit):
+    if unit == 's':
+        return f"{value*1e6:12.2f} us" if value < 1e-3 else f"{value*1e3:12.2f} ms"
+    return f"{value:12.4g} {unit}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the cycle model, sweeps and I/O paths")
+    parser.add_argument('--only', help=f"comma separated groups to run, of: {', '.join(GROUPS)}")
+    parser.add_argument('--quick', action='store_true', help="fewer repeats and smaller sizes")
+    parser.add_argument('--history', default=HISTORY, help="JSON lines file the run is appended to")
+    parser.add_argument('--baseline', default=BASELINE, help="baseline record to compare with")
+    parser.add_argument('--save-baseline', action='store_true', help="write this run as the new baseline")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help="allowed relative slowdown")
+    args = parser.parse_args()
+    groups = args.only.split(',') if args.only else GROUPS
+    unknown = sorted(set(groups) - set(GROUPS))
+    if unknown:
+        sys.exit(f"Unknown benchmark groups: {', '.join(unknown)}")
+
+    current = record(run(groups, args.quick))
+    with open(args.history, 'a') as file:
+        file.write(json.dumps(current) + '\n')
+    for name, result in current['results'].items():
+        print(f"{name:50s} {_format(result['value'], result['unit'])}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(current, file, indent=4)
+        print(f"Saved baseline {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            rows = compare(current, json.load(file), args.threshold)
+        print(f"\nCompared with {args.baseline}:")
+        for name, old, new, change, regressed in rows:
+            print(f"{name:50s} {change:+8.1%} {'REGRESSION' if regressed else ''}")
+        if any(regressed for *_, regressed in rows):
+            sys.exit(1)
@@ -0,0 +1,118 @@
+"""
+This code defines compact containers for evaluated engine states, with one fixed schema (STATE_FIELDS) holding the design
+variables, T04, every station quantity of the cycle and the performance outputs:
+    - EngineState: one design point, a __slots__ object of floats, without the instance __dict__ and engine objects of a
+      TurboFan (TurboFan.state())
+    - EngineStates: a batch of design points as a struct of arrays, one array per field (TurboFanBatch.states(),
+      SweepResult.states()). Each field is kept at the smallest shape it broadcasts from, so in a sweep over BPR, pi_f and
+      pi_c the inlet values are stored once, the fan values once per pi_f and so on, and only the fields that depend on
+      every swept parameter take memory for every point. Fields come out as read-only broadcast views, and indexing with
+      integers and slices returns views too, so selecting part of a large batch copies nothing. Integer indices that
+      select a single point return an EngineState.
+The tables of display() and the records of to_records() are only built when asked for.
+
+    Usage:
+        states = TurboFanBatch(*np.ix_(BPRs, pi_fs, pi_cs)).states()
+        states['TSFC']          # (nBPR, npi_f, npi_c) view
+        states[:, 2]            # EngineStates view at the third pi_f
+        states[0, 2, 5]         # EngineState
+        states.nbytes           # memory actually held
+"""
+import sys
+sys.path.append(".")
+import numpy as np
+from CycleAnalysis.TurboFanBatch import DESIGN_NAMES, STATION_FIELDS, PERFORMANCE_FIELDS
+
+# Every quantity of an engine state, in order
+STATE_FIELDS = DESIGN_NAMES + ('T04',) + STATION_FIELDS + PERFORMANCE_FIELDS
+
+
+# The same array with every broadcast (zero-stride) axis cut to length 1, a view of the memory actually held
+def _compact(array):
+    return array[tuple(slice(0, 1) if stride == 0 and n > 1 else slice(None) for stride, n in zip(array.strides, array.shape))]
+
+
+class EngineState:
+    __slots__ = STATE_FIELDS
+
+    def __init__(self, **values):
+        unknown = sorted(set(values) - set(STATE_FIELDS))
+        if unknown:
+            raise ValueError(f"Unknown engine state fields: {', '.join(unknown)}")
+        for name in STATE_FIELDS: # Fields not given are NaN
+            setattr(self, name, float(values.get(name, np.nan)))
+
+    def __repr__(self):
+        return f"EngineState(BPR={self.BPR:g}, pi_f={self.pi_f:g}, pi_c={self.pi_c:g}, T04={self.T04:g}; " \
+               f"F_m0={self.F_m0:.4g}, TSFC={self.TSFC:.4g}, d={self.d:.4g})"
+
+    # State of a TurboFan after its calculations, running them if needed
+    @classmethod
+    def from_engine(cls, engine):
+        values = dict(zip(PERFORMANCE_FIELDS, engine.performance()))
+        values.update({name: getattr(engine, name) for name in DESIGN_NAMES + STATION_FIELDS}, T04=engine.design.T04)
+        return cls(**values)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in STATE_FIELDS}
+
+    # Per-component results table, as a string
+    def display(self):
+        from CycleAnalysis.TurboFan import component_table
+        return component_table(self.as_dict())
+
+
+class EngineStates:
+    __slots__ = ('shape', 'fields')
+
+    # fields: name -> array (or scalar) broadcastable to the batch shape, fields not given are NaN. With a dtype, e.g.
+    # np.float32, the fields are stored at that precision
+    def __init__(self, fields, shape=None, dtype=None):
+        unknown = sorted(set(fields) - set(STATE_FIELDS))
+        if unknown:
+            raise ValueError(f"Unknown engine state fields: {', '.join(unknown)}")
+        self.fields = {}
+        for name in STATE_FIELDS:
+            array = _compact(np.asarray(fields.get(name, np.nan)))
+            self.fields[name] = array if dtype is None else array.astype(dtype, copy=False)
+        self.shape = tuple(shape) if shape is not None else np.broadcast_shapes(*(a.shape for a in self.fields.values()))
+
+    def __repr__(self):
+        return f"EngineStates(shape={self.shape}, {self.nbytes / 1e6:.3g} MB)"
+
+    def __len__(self):
+        return self.shape[0]
+
+    # A field name gives that field over the batch as a read-only view. Any other index selects points like NumPy
+    # indexing of the batch shape: integers and slices give views, a single point gives an EngineState
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return np.broadcast_to(self.fields[key], self.shape)
+        selected = {name: np.broadcast_to(array, self.shape)[key] for name, array in self.fields.items()}
+        shape = np.shape(selected[STATE_FIELDS[0]])
+        if shape == ():
+            return EngineState(**selected)
+        return EngineStates(selected, shape)
+
+    # Bytes held by the fields, fields broadcast along an axis hold one value along it
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.fields.values())
+
+    def as_dict(self):
+        return {name: self[name] for name in STATE_FIELDS}
+
+    # Copy into a NumPy structured array of the batch shape, one record per point
+    def to_records(self):
+        records = np.empty(self.shape, dtype=[(name, array.dtype) for name, array in self.fields.items()])
+        for name, array in self.fields.items():
+            records[name] = array
+        return records
+
+    # States of a TurboFanBatch, running its calculations. Fields that do not depend on every input are kept at their own
+    # shapes, without copies
+    @classmethod
+    def from_batch(cls, batch, dtype=None):
+        values = dict(zip(PERFORMANCE_FIELDS, batch.performance()))
+        values.update({name: getattr(batch, name) for name in DESIGN_NAMES + STATION_FIELDS}, T04=batch.T04)
+        return cls(values, batch.shape, dtype)
@@ -4,136 +4,254 @@ The class initializes with default parameters for the Bypass Ratio (BPR), Fan Pr
 The class includes methods for each component of the turbofan such as the inlet, fan, compressor, combustor, HP Turbine, LP Rotor, 
 cold and hot nozzles, and a method for calculating flight metrics. It also provides methods to run all calculations and display the 
 results in a table. 
+Each stage is declared in STAGES with the attributes and parameters it reads and the attributes it sets. Stage results are
+memoized by those inputs, so re-running the calculations after changing a design variable only reruns the stages downstream
+of it, and engines that share upstream stations (e.g. the points of a BPR sweep) reuse them from the shared stage cache.
+The operating point and engine constants come from the FlightCondition and EngineDesign objects passed to the engine
+(Parameters/Conditions.py), so engines at different flight conditions can be evaluated side by side, also from several threads.
+With real_gas=True the compressors, combustor, turbines and nozzles use temperature dependent properties of air and
+combustion products (Tools/GasProperties.py) instead of the constant c_p and gamma values, and the combustor iterates on the
+fuel-air ratio. Real-gas and constant-property results are cached apart.
+Only NumPy is imported at module load, pandas is imported by component_table when a results table is requested.
 """
 import sys
 sys.path.append(".")
 import numpy as np 
 from Tools.Eqns import *
+import Tools.GasProperties as Gas
 import math 
-from scipy.optimize import fsolve
-from Parameters.TurboFanParameters import *
-import pandas as pd
-import sympy as sp
+import threading
+from Parameters.Conditions import FlightCondition, EngineDesign, parameter_values
+import Tools.Instrumentation as Instrumentation
+
+# Stage method, engine attributes it reads, FlightCondition / EngineDesign fields it reads, attributes it sets
+STAGES = (
+    ('inlet',                    (),                                               ('M0', 'n_i', 'pa', 'T0', 'gamma_c'),
+                                 ('p0a_pa', 'p01_pa', 'p0a', 'p01', 'T0a')),
+    ('fan',                      ('pi_f', 'T0a', 'p01'),                           ('n_inff', 'gamma_c', 'R'),
+                                 ('T01', 'n', 'T02', 'p02', 'DeltaT012')),
+    ('coldNozzle',               ('T02', 'p02'),                                   ('p8', 'gamma_c', 'n_j', 'c_p', 'R'),
+                                 ('DeltaT028', 'C8')),
+    ('compressor',               ('pi_c', 'T02', 'p02'),                           ('n_infc', 'gamma_c', 'c_p', 'R'),
+                                 ('p03', 'nc', 'DeltaT023', 'T03', 'wc')),
+    ('combustor',                ('T03', 'p03'),                                   ('T04', 'pi_b', 'c_pg', 'c_pa', 'h_fuel', 'n_b'),
+                                 ('DeltaT034', 'p04', 'f_act')),
+    ('hpTurbine',                ('BPR', 'T02', 'DeltaT023', 'f_act', 'p04'),      ('n_m', 'c_pa', 'c_pg', 'T04', 'n_inft', 'gamma_h', 'R'),
+                                 ('B', 'DeltaT045', 'T05', 'm', 'p05')),
+    ('lpRotor',                  ('B', 'T02', 'DeltaT012', 'f_act', 'T05', 'p05', 'm'), ('n_m', 'c_pa', 'c_pg', 'n_inft', 'R'),
+                                 ('DeltaT056', 'T06', 'p06')),
+    ('hotNozzle',                ('T06', 'p06', 'f_act'),                          ('p7', 'n_j', 'gamma_h', 'c_pg', 'R'),
+                                 ('DeltaT067', 'C7')),
+    ('calculate_flight_metrics', ('C7', 'C8', 'B', 'f_act'),                       ('M0', 'gamma_c', 'R', 'T0', 'pa', 'W', 'S_W'),
+                                 ('Ca', 'q_bar', 'q', 'C_L', 'C_D', 'D', 'mDota', 'd')),
+)
+STAGE_CACHE_SIZE = 4096 # Memoized results kept per stage
+_stage_cache_lock = threading.Lock()
+
+
+# Build the per-component results table of one design point from its station values, as a string
+@Instrumentation.instrumented('component_table')
+def component_table(values):
+    import pandas as pd # Only needed for the report table
+    # Dictionary to hold results from each component
+    data = {
+        'Component':                    ['Inlet', 'Fan', 'Cold Nozzle', 'Compressor', 'Combustor', 'HP Turbine', 'LP Rotor', 'Hot Nozzle', 'Flight Metrics'],
+        'Stagnation Pressure (bar)':    [values['p0a'], values['p02'], None, values['p03'], values['p04'], values['p05'], values['p06'], None, None],
+        'Stagnation Temperature (K)':   [values['T0a'], values['T02'], None, values['T03'], values['T04'], values['T05'], values['T06'], None, None],
+        'Pressure Change (bar)':        [values['p01_pa'], None, None, None, values['p04'], None, None, None, None],
+        'Temperature Change (K)':       [None, values['DeltaT012'], values['DeltaT028'], values['DeltaT023'], values['DeltaT034'], values['DeltaT045'], values['DeltaT056'], values['DeltaT067'], None],
+        'Velocity (m/s)':               [None, None, values['C8'], None, None, None, None, values['C7'], values['Ca']],
+        'Specific Work (kJ/kg)':        [None, None, None, values['wc'], None, None, None, None, None],
+        'Fuel Flow Fraction':           [None, None, None, None, values['f_act'], None, None, None, None],
+        'Lift Coefficient':             [None, None, None, None, None, None, None, None, values['C_L']],
+        'Drag Coefficient':             [None, None, None, None, None, None, None, None, values['C_D']],
+        'Drag Force (N)':               [None, None, None, None, None, None, None, None, values['D']],
+        'Mass Flow Rate (kg/s)':        [None, None, None, None, None, None, None, None, values['mDota']],
+        'Fan Diameter (m)':             [None, None, None, None, None, None, None, None, values['d']]
+    }
+    df = pd.DataFrame(data) # Converting to a pandas dataframe
+    
+    return df.to_string() # Return data as a string
 
 
 class TurboFan:
-    def __init__(self, BPR=10, pi_f=1.5, pi_c=36.):
-        self.BPR  = BPR  # Bypass ratio 
-        self.pi_f = pi_f # Fan pressure ratio 
-        self.pi_c = pi_c # Compressor pressure ratio 
+    _stage_cache = {name: {} for name, *_ in STAGES} # Stage results shared by all engines, keyed by the stage inputs
+
+    def __init__(self, BPR=10, pi_f=1.5, pi_c=36., flight=None, design=None, exact=False, real_gas=False):
+        self.BPR  = float(BPR)  # Bypass ratio 
+        self.pi_f = float(pi_f) # Fan pressure ratio 
+        self.pi_c = float(pi_c) # Compressor pressure ratio 
+        self.flight = flight if flight is not None else FlightCondition() # Operating point
+        self.design = design if design is not None else EngineDesign()    # Engine constants
+        self.exact  = exact # Skip the rounding of the station values, for a smooth, full-precision model
+        self.real_gas = real_gas # Temperature dependent gas properties instead of constant c_p and gamma
+        self._stage_keys = {} # Inputs each stage was last evaluated with on this engine
+
+    # Station values are rounded to the given digits, unless the engine is exact
+    def _round(self, x, ndigits):
+        return x if self.exact else round(x, ndigits)
 
     def inlet(self):
-        self.p0a_pa = round(pressure_ratio(M0), 4) # Stagnation pressure ratio (p0a/pa)
-        self.p01_pa = round(pressure_ratio_n(M0, n_i), 4) # Pressure loss ratio (p01/pa)
-        self.p0a    = round(self.p0a_pa * pa, 3) # Stagnation pressure, [bar]
-        self.p01    = round(self.p01_pa * pa, 3) # Pressure after loss, [bar] 
-        self.T0a    = round(total_temperature(M0, T0, gamma_c), 3) # Stagnation temperature of flow just before it enters the fan, [K]
+        self.p0a_pa = self._round(pressure_ratio(self.flight.M0, self.design.gamma_c), 4) # Stagnation pressure ratio (p0a/pa)
+        self.p01_pa = self._round(pressure_ratio_n(self.flight.M0, self.design.n_i, self.design.gamma_c), 4) # Pressure loss ratio (p01/pa)
+        self.p0a    = self._round(self.p0a_pa * self.flight.pa, 3) # Stagnation pressure, [bar]
+        self.p01    = self._round(self.p01_pa * self.flight.pa, 3) # Pressure after loss, [bar] 
+        self.T0a    = self._round(total_temperature(self.flight.M0, self.flight.T0, self.design.gamma_c), 3) # Stagnation temperature of flow just before it enters the fan, [K]
 
     def fan(self):
         self.T01 = self.T0a # Stagnation temperature of flow just before it enters the fan, [K]
-        self.n   = n1_n(n_inff) # Polytropic exponent 
-        self.T02 = round(self.T01 * T02_T01(self.pi_f, self.n), 3) # Temperature after fan, [K]
-        self.p02 = round(self.pi_f * self.p01, 3) # Pressure after fan, [bar] 
-        self.DeltaT012 = round(self.T02 - self.T01, 2) # Temp change in fan, [K]
+        self.n   = n1_n(self.design.n_inff, self.design.gamma_c, self.exact) # Polytropic exponent 
+        if self.real_gas:
+            T02 = Gas.polytropic_temperature(self.T01, self.pi_f, self.design.n_inff, R=self.design.R / 1000)
+        else:
+            T02 = self.T01 * T02_T01(self.pi_f, self.n)
+        self.T02 = self._round(T02, 3) # Temperature after fan, [K]
+        self.p02 = self._round(self.pi_f * self.p01, 3) # Pressure after fan, [bar] 
+        self.DeltaT012 = self._round(self.T02 - self.T01, 2) # Temp change in fan, [K]
 
     def coldNozzle(self):
-        p02_p8 = self.p02/p8 # Pressure ratio
-        g1_g   = ((gamma_c-1)/gamma_c) # Calculating the gamma ratio for calculation below 
-        self.DeltaT028 = round( n_j * self.T02 * (1 - (1/(p02_p8))**g1_g), 2) # Temperature change in nozzle, [K] 
-        self.C8        = round(np.sqrt(2 * c_p * self.DeltaT028), 3) # Velocity at nozzle exit, [m/s]
+        p02_p8 = self.p02/self.flight.p8 # Pressure ratio
+        if self.real_gas:
+            DeltaT028, C8 = Gas.nozzle(self.T02, p02_p8, self.design.n_j, R=self.design.R / 1000)
+            self.DeltaT028 = self._round(DeltaT028, 2) # Temperature change in nozzle, [K]
+            self.C8        = self._round(C8, 3) # Velocity at nozzle exit, [m/s]
+            return
+        g1_g   = ((self.design.gamma_c-1)/self.design.gamma_c) # Calculating the gamma ratio for calculation below 
+        self.DeltaT028 = self._round( self.design.n_j * self.T02 * (1 - (1/(p02_p8))**g1_g), 2) # Temperature change in nozzle, [K] 
+        self.C8        = self._round(np.sqrt(2 * self.design.c_p * self.DeltaT028), 3) # Velocity at nozzle exit, [m/s]
 
     def compressor(self):
-        self.p03 = round(self.pi_c * self.p02, 3) # Pressure after the compressor, [bar]
-        self.nc  = n1_n(n_infc)
-        self.DeltaT023 = round(self.T02 * (self.pi_c**self.nc -1), 1) # Temperature change in compressor, [K] 
-        self.T03 = round(self.T02 + self.DeltaT023, 2) # Temperature at compressor exit, [K]
-        self.wc  = round(c_p * self.DeltaT023 / 1000, 3) # Specific work done, [kJ/kg]
+        self.p03 = self._round(self.pi_c * self.p02, 3) # Pressure after the compressor, [bar]
+        self.nc  = n1_n(self.design.n_infc, self.design.gamma_c, self.exact)
+        if self.real_gas:
+            DeltaT023 = Gas.polytropic_temperature(self.T02, self.pi_c, self.design.n_infc, R=self.design.R / 1000) - self.T02
+        else:
+            DeltaT023 = self.T02 * (self.pi_c**self.nc -1)
+        self.DeltaT023 = self._round(DeltaT023, 1) # Temperature change in compressor, [K] 
+        self.T03 = self._round(self.T02 + self.DeltaT023, 2) # Temperature at compressor exit, [K]
+        if self.real_gas:
+            wc = Gas.enthalpy(self.T03) - Gas.enthalpy(self.T02)
+        else:
+            wc = self.design.c_p * self.DeltaT023 / 1000
+        self.wc  = self._round(wc, 3) # Specific work done, [kJ/kg]
     
     def combustor(self): 
-        self.DeltaT034 = round(T04 - self.T03, 2) # Temperature change across combustor, [K] 
-        self.p04       = round(self.p03 * (1 - (1 - pi_b)), 3) # Pressure change across the combustor, [bar]
-        f = sp.symbols('f')
-        solve_f = (1 + f)*c_pg*(T04 - 298) + (f * -h_fuel) + (c_pa * (298 - self.T03))
-        f_ideal = sp.solve(solve_f, f)
-        f_ideal = round(float(f_ideal[0]), 5) # Ideal fuel flow fraction
-        f_ideal = round(( (c_pg*T04) - (c_pa*self.T03) ) / ( h_fuel - (c_pg*T04) ), 6) # Actual fuel flow fraction   
-        self.f_act   = round(f_ideal / n_b , 5) # Actual fuel flow fraction
+        self.DeltaT034 = self._round(self.design.T04 - self.T03, 2) # Temperature change across combustor, [K] 
+        self.p04       = self._round(self.p03 * (1 - (1 - self.design.pi_b)), 3) # Pressure change across the combustor, [bar]
+        if self.real_gas: # The products enthalpy depends on the fuel-air ratio being solved for
+            f_ideal = self._round(Gas.fuel_air_ratio(self.T03, self.design.T04, self.design.h_fuel), 6) # Ideal fuel flow fraction
+        else:
+            f_ideal = self._round(( (self.design.c_pg*self.design.T04) - (self.design.c_pa*self.T03) ) / ( self.design.h_fuel - (self.design.c_pg*self.design.T04) ), 6) # Ideal fuel flow fraction   
+        self.f_act   = self._round(f_ideal / self.design.n_b , 5) # Actual fuel flow fraction
 
     def hpTurbine(self):
         self.B   = self.BPR 
-        self.DeltaT045 = round(( 1/n_m * ((1/(self.B+1)) * c_pa * self.DeltaT023) ) / ((1/(self.B+1) + self.f_act) * c_pg) , 3) # Temperature change across the HP Turbine, [K]
-        self.T05 = round(T04 - self.DeltaT045, 3) # Temperature after the HP Turbine
-        self.m   = round(m1_m(n_inft, gamma_h), 3) # Polytropic exponent 
-        self.p05 = round(self.p04 * (self.T05/T04)**(1/self.m), 3) # Pressure after the HP Turbine, [bar]
+        if self.real_gas: # Compressor work per unit turbine gas, from the real-gas enthalpies
+            work = (Gas.enthalpy(self.T02 + self.DeltaT023) - Gas.enthalpy(self.T02)) / (self.design.n_m * (1 + self.f_act * (self.B + 1)))
+            T05, p05_p04 = Gas.turbine(self.design.T04, work, self.design.n_inft, self.f_act, R=self.design.R / 1000)
+            self.DeltaT045 = self._round(self.design.T04 - T05, 3) # Temperature change across the HP Turbine, [K]
+            self.T05 = self._round(self.design.T04 - self.DeltaT045, 3) # Temperature after the HP Turbine
+            self.m   = self._round(m1_m(self.design.n_inft, self.design.gamma_h, self.exact), 3) # Polytropic exponent 
+            self.p05 = self._round(self.p04 * p05_p04, 3) # Pressure after the HP Turbine, [bar]
+            return
+        self.DeltaT045 = self._round(( 1/self.design.n_m * ((1/(self.B+1)) * self.design.c_pa * self.DeltaT023) ) / ((1/(self.B+1) + self.f_act) * self.design.c_pg) , 3) # Temperature change across the HP Turbine, [K]
+        self.T05 = self._round(self.design.T04 - self.DeltaT045, 3) # Temperature after the HP Turbine
+        self.m   = self._round(m1_m(self.design.n_inft, self.design.gamma_h, self.exact), 3) # Polytropic exponent 
+        self.p05 = self._round(self.p04 * (self.T05/self.design.T04)**(1/self.m), 3) # Pressure after the HP Turbine, [bar]
 
     def lpRotor(self):
-        self.DeltaT056 = round( (1/n_m * (c_pa * self.DeltaT012) ) / ((1/(self.B+1) + self.f_act) * c_pg), 3) # Temperature change across the LP Rotor, [K]
+        if self.real_gas: # Fan work per unit turbine gas, from the real-gas enthalpies
+            work = (Gas.enthalpy(self.T02) - Gas.enthalpy(self.T02 - self.DeltaT012)) / (self.design.n_m * (1/(self.B+1) + self.f_act))
+            T06, p06_p05 = Gas.turbine(self.T05, work, self.design.n_inft, self.f_act, R=self.design.R / 1000)
+            self.DeltaT056 = self._round(self.T05 - T06, 3) # Temperature change across the LP Rotor, [K]
+            self.T06       = self.T05 - self.DeltaT056 # Temperature after the LP Rotor, [K]
+            self.p06       = self._round(self.p05 * p06_p05, 3) # Pressure after the LP Rotor, [bar]
+            return
+        self.DeltaT056 = self._round( (1/self.design.n_m * (self.design.c_pa * self.DeltaT012) ) / ((1/(self.B+1) + self.f_act) * self.design.c_pg), 3) # Temperature change across the LP Rotor, [K]
         self.T06       = self.T05 - self.DeltaT056 # Temperature after the LP Rotor, [K]
-        self.p06       = round(( self.p05 * (self.T06/self.T05)**(1/self.m) ), 3) # Pressure after the LP Rotor, [bar]
+        self.p06       = self._round(( self.p05 * (self.T06/self.T05)**(1/self.m) ), 3) # Pressure after the LP Rotor, [bar]
     
     def hotNozzle(self): 
-        pr = self.p06/p7
-        self.DeltaT067 = round( n_j * self.T06 * (1 - ((1/(pr)))**((gamma_h-1)/gamma_h)), 2) # Temperature change in the hot nozzle, [K]
-        self.C7 = round( np.sqrt(2 * c_pg*1000 * self.DeltaT067), 2) # Velocity at the exit of the hot nozzle, [m/s]
+        pr = self.p06/self.flight.p7
+        if self.real_gas:
+            DeltaT067, C7 = Gas.nozzle(self.T06, pr, self.design.n_j, self.f_act, R=self.design.R / 1000)
+            self.DeltaT067 = self._round(DeltaT067, 2) # Temperature change in the hot nozzle, [K]
+            self.C7 = self._round(C7, 2) # Velocity at the exit of the hot nozzle, [m/s]
+            return
+        self.DeltaT067 = self._round( self.design.n_j * self.T06 * (1 - ((1/(pr)))**((self.design.gamma_h-1)/self.design.gamma_h)), 2) # Temperature change in the hot nozzle, [K]
+        self.C7 = self._round( np.sqrt(2 * self.design.c_pg*1000 * self.DeltaT067), 2) # Velocity at the exit of the hot nozzle, [m/s]
       
     def calculate_flight_metrics(self):
-        self.Ca    = round( M0 * (np.sqrt(gamma_c * R * T0)), 3) # Velocity at ambient conditions, [m/s]
-        self.q_bar = round( gamma_c/2 * pa * M0**2, 5) # Dynamic pressure, [bar]
+        self.Ca    = self._round( self.flight.M0 * (np.sqrt(self.design.gamma_c * self.design.R * self.flight.T0)), 3) # Velocity at ambient conditions, [m/s]
+        self.q_bar = self._round( self.design.gamma_c/2 * self.flight.pa * self.flight.M0**2, 5) # Dynamic pressure, [bar]
         self.q     = self.q_bar*10**5 # Dynamic pressure, [Pa]
-        self.C_L   = round( (W * 4.448) / (self.q * S_W), 4) # Lift coefficient
-        self.C_D   = round( 0.056*self.C_L**2 - 0.004*self.C_L +0.014, 5) # Drag coefficient
-        self.D     = round(self.C_D * self.q * S_W, 2) # Drag force, [N]
-        def equation(mDota, C7, Ca, B, f_act, C8): # Define equation and solve for mass flow rate of air
-            return self.D - (C7 - Ca) * (mDota / (B + 1) + f_act * mDota) - (C8 - Ca) * (mDota * B / (B + 1))
-        mDota_initial_guess = 400. # Use fsolve to solve for mDota
-        mDota_solution, = fsolve(equation, mDota_initial_guess, args=(self.C7, self.Ca, self.B, self.f_act, self.C8))
-        self.mDota = round(mDota_solution, 2) # Storing the solution for mDota, [kg/s]
-        Ta = T0
-        self.d = round( np.sqrt((4*self.mDota*R*Ta) / (pa*10**5 * self.Ca * np.pi)), 3) # Calculating fan diameter, [m]
+        self.C_L   = self._round( (self.flight.W * 4.448) / (self.q * self.flight.S_W), 4) # Lift coefficient
+        self.C_D   = self._round( drag_coefficient(self.C_L), 5) # Drag coefficient
+        self.D     = self._round(self.C_D * self.q * self.flight.S_W, 2) # Drag force, [N]
+        # D = (C7 - Ca)*(mDota/(B+1) + f_act*mDota) + (C8 - Ca)*(mDota*B/(B+1)) is linear in mDota, solve it directly
+        thrust_per_mDota = (self.C7 - self.Ca) * (1 / (self.B + 1) + self.f_act) + (self.C8 - self.Ca) * (self.B / (self.B + 1))
+        self.mDota = self._round(self.D / thrust_per_mDota, 2) # Mass flow rate of air, [kg/s]
+        if Instrumentation.PROFILER is not None: # Direct solve, one evaluation, fails where the nozzles give no thrust
+            Instrumentation.PROFILER.solver('mDota thrust balance', nfev=1, converged=np.isfinite(self.mDota))
+        Ta = self.flight.T0
+        self.d = self._round( np.sqrt((4*self.mDota*self.design.R*Ta) / (self.flight.pa*10**5 * self.Ca * np.pi)), 3) # Calculating fan diameter, [m]
 
 
     def run_all_calculations(self):
-        self.inlet()
-        self.fan()
-        self.coldNozzle()
-        self.compressor()
-        self.combustor()
-        self.hpTurbine()
-        self.lpRotor()
-        self.hotNozzle()
-        self.calculate_flight_metrics()
+        profiler = Instrumentation.PROFILER # Checked once, stages are only timed while a profiler is enabled
+        constants = parameter_values(self.flight, self.design)
+        for name, inputs, params, outputs in STAGES:
+            key = (self.exact, self.real_gas) + tuple(getattr(self, attr) for attr in inputs) + tuple(constants[param] for param in params)
+            if self._stage_keys.get(name) == key: # Inputs unchanged since the last run, results already set
+                continue
+            cache = self._stage_cache[name]
+            cached = cache.get(key) # A single lookup, another thread may evict the entry at any time
+            if cached is not None:
+                for attr, value in zip(outputs, cached):
+                    setattr(self, attr, value)
+                if profiler is not None:
+                    profiler.count(f"{name} cache hit")
+            else:
+                if profiler is None:
+                    getattr(self, name)()
+                else:
+                    with profiler.span(name):
+                        getattr(self, name)()
+                with _stage_cache_lock: # Engines in other threads share the cache
+                    if len(cache) >= STAGE_CACHE_SIZE: # Drop the oldest entry
+                        del cache[next(iter(cache))]
+                    cache[key] = tuple(getattr(self, attr) for attr in outputs)
+            self._stage_keys[name] = key
 
 
     def display_results(self):
-        # Dictionary to hold results from each component
-        data = {
-            'Component':                    ['Inlet', 'Fan', 'Cold Nozzle', 'Compressor', 'Combustor', 'HP Turbine', 'LP Rotor', 'Hot Nozzle', 'Flight Metrics'],
-            'Stagnation Pressure (bar)':    [self.p0a, self.p02, None, self.p03, self.p04, self.p05, self.p06, None, None],
-            'Stagnation Temperature (K)':   [self.T0a, self.T02, None, self.T03, T04, self.T05, self.T06, None, None],
-            'Pressure Change (bar)':        [self.p01_pa, None, None, None, self.p04, None, None, None, None],
-            'Temperature Change (K)':       [None, self.DeltaT012, self.DeltaT028, self.DeltaT023, self.DeltaT034, self.DeltaT045, self.DeltaT056, self.DeltaT067, None],
-            'Velocity (m/s)':               [None, None, self.C8, None, None, None, None, self.C7, self.Ca],
-            'Specific Work (kJ/kg)':        [None, None, None, self.wc, None, None, None, None, None],
-            'Fuel Flow Fraction':           [None, None, None, None, self.f_act, None, None, None, None],
-            'Lift Coefficient':             [None, None, None, None, None, None, None, None, self.C_L],
-            'Drag Coefficient':             [None, None, None, None, None, None, None, None, self.C_D],
-            'Drag Force (N)':               [None, None, None, None, None, None, None, None, self.D],
-            'Mass Flow Rate (kg/s)':        [None, None, None, None, None, None, None, None, self.mDota],
-            'Fan Diameter (m)':             [None, None, None, None, None, None, None, None, self.d]
-        }
-        df = pd.DataFrame(data) # Converting to a pandas dataframe
-        
-        return df.to_string() # Return data as a string 
-
-
-    def performance(self):
-        self.run_all_calculations() # Call components to set up the performance calculations
+        return component_table(dict(vars(self), T04=self.design.T04))
+
+
+    # Compact copy of the design point, its station values and performance (CycleAnalysis/EngineState.py), to keep
+    # many evaluated points without their engines
+    def state(self):
+        from CycleAnalysis.EngineState import EngineState
+        return EngineState.from_engine(self)
+
+
+    # Performance outputs. With derivatives=True also returns their derivatives with respect to the inputs in wrt (default
+    # the design variables and every parameter), as a dict of output name -> dict of input name -> float, computed by
+    # TurboFanBatch.derivatives on the exact model
+    def performance(self, derivatives=False, wrt=None):
+        if derivatives:
+            from CycleAnalysis.TurboFanBatch import TurboFanBatch
+            batch = TurboFanBatch(self.BPR, self.pi_f, self.pi_c, self.flight, self.design, real_gas=self.real_gas)
+            gradients = {output: {name: float(value) for name, value in values.items()}
+                         for output, values in batch.derivatives(wrt).items()}
+            return self.performance(), gradients
+        self.run_all_calculations() # Call components to set up the performance calculations, only reruns stages with changed inputs
         mDotc = mdotCold(self.mDota, self.BPR) # Massflow through cold section, [kg/s]
         mDoth = mdotHot(self.mDota, self.BPR) # Massflow through hot section, [kg/s]
         F_m0  = self.D / self.mDota # Thrust to mass flow rate of air, [N/(kg/s)]  
         TSFC  = get_TSFC(self.f_act, self.D, self.mDota) # Thrust specific fuel consumption, [g/kN-s]
         f     = self.f_act # Fuel air ratio
-        eta_T = eta_Thermal(self.BPR, self.C8, self.f_act, self.C7, self.Ca, h_fuel) # Thermal efficiency
+        eta_T = eta_Thermal(self.BPR, self.C8, self.f_act, self.C7, self.Ca, self.design.h_fuel) # Thermal efficiency
         eta_P = eta_Propulsive(self.Ca, mDotc, self.C8, mDoth, self.C7, self.mDota) # Propulsive efficiency
         eta_O = eta_T * eta_P # Overall efficiency
 
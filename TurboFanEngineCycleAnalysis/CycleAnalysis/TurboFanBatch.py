@@ -0,0 +1,270 @@
+"""
+This code defines a TurboFanBatch class that evaluates the same cycle as the TurboFan class for whole arrays of
+design points at once. The Bypass Ratio (BPR), Fan Pressure Ratio (pi_f) and Compressor Pressure Ratio (pi_c) can be
+scalars or NumPy arrays of any broadcastable shape, and every station quantity and performance output comes back as an
+array of the broadcast shape. The operating point and engine constants come from the FlightCondition and EngineDesign
+objects (Parameters/Conditions.py), whose fields may be arrays too, and any parameter listed in PARAMETER_NAMES can also be
+overridden per batch, e.g. TurboFanBatch(10, 1.5, 36., T04=np.linspace(1400, 1700, 7)) or
+TurboFanBatch(10, 1.5, 36., flight=FlightCondition.at_altitude(altitudes[:, None], M0=machs)).
+The stage methods mirror the ones in TurboFan, including the rounding of each station value, so a batch reproduces the
+per-point results. The drag / mass flow balance in calculate_flight_metrics is linear in mDota, so it is solved directly
+for the whole batch instead of calling fsolve once per point.
+With real_gas=True the compressors, combustor, turbines and nozzles use temperature dependent properties of air and
+combustion products (Tools/GasProperties.py) instead of the constant c_p and gamma values, like TurboFan.
+"""
+import sys
+sys.path.append(".")
+import numpy as np
+from Tools.Eqns import *
+import Tools.GasProperties as Gas
+from Parameters.Conditions import parameter_values
+import Tools.Instrumentation as Instrumentation
+
+# FlightCondition and EngineDesign fields that can be overridden per batch
+PARAMETER_NAMES = (
+    'gamma_c', 'gamma_h', 'c_pg', 'c_pa', 'c_p', 'R',                  # Thermo properties
+    'n_inft', 'n_inff', 'n_infc', 'n_b', 'n_i', 'n_m', 'n_j',          # Component efficiencies
+    'pi_b', 'pa', 'p7', 'p8', 'T0', 'T04',                             # Pressures and temperatures
+    'W', 'S_W', 'h_fuel', 'M0',                                        # Aircraft and flight characteristics
+)
+
+# Design variables of the cycle, set by the TurboFanBatch arguments
+DESIGN_NAMES = ('BPR', 'pi_f', 'pi_c')
+
+# Station quantities stored by the cycle, in the order of the stages that produce them
+STATION_FIELDS = (
+    'p0a_pa', 'p01_pa', 'p0a', 'p01', 'T0a',          # Inlet
+    'T01', 'T02', 'p02', 'DeltaT012',                  # Fan
+    'DeltaT028', 'C8',                                 # Cold nozzle
+    'p03', 'DeltaT023', 'T03', 'wc',                   # Compressor
+    'DeltaT034', 'p04', 'f_act',                       # Combustor
+    'DeltaT045', 'T05', 'p05',                         # HP Turbine
+    'DeltaT056', 'T06', 'p06',                         # LP Rotor
+    'DeltaT067', 'C7',                                 # Hot nozzle
+    'Ca', 'q', 'C_L', 'C_D', 'D', 'mDota', 'd',        # Flight metrics
+)
+
+# Stage methods, in the order run_all_calculations calls them
+STAGE_NAMES = ('inlet', 'fan', 'coldNozzle', 'compressor', 'combustor', 'hpTurbine', 'lpRotor', 'hotNozzle',
+               'calculate_flight_metrics')
+
+# Outputs of performance(), in the order they are returned
+PERFORMANCE_FIELDS = ('F_m0', 'TSFC', 'f', 'eta_T', 'eta_P', 'eta_O')
+
+
+# Inputs as float arrays, complex arrays are kept complex for the complex-step derivatives
+def _as_array(value):
+    return np.asarray(value, dtype=complex if np.iscomplexobj(value) else float)
+
+
+class TurboFanBatch:
+    def __init__(self, BPR=10, pi_f=1.5, pi_c=36., flight=None, design=None, exact=False, real_gas=False, **params):
+        unknown = sorted(set(params) - set(PARAMETER_NAMES))
+        if unknown:
+            raise ValueError(f"Unknown cycle parameters: {', '.join(unknown)}")
+        # Nozzle exit pressures not given (here or in the flight condition) are the ambient pressure, and follow pa in
+        # derivatives()
+        self.tied_to_pa = tuple(name for name in ('p7', 'p8') if name not in params and
+                                ('pa' in params or flight is None or name in flight.at_pa))
+        if 'pa' in params: # Nozzles exhaust to ambient pressure unless told otherwise
+            params.setdefault('p7', params['pa'])
+            params.setdefault('p8', params['pa'])
+        values = dict(parameter_values(flight, design), **params)
+        for name in PARAMETER_NAMES:
+            setattr(self, name, _as_array(values[name]))
+        self.shape = np.broadcast_shapes(np.shape(BPR), np.shape(pi_f), np.shape(pi_c),
+                                         *(getattr(self, name).shape for name in PARAMETER_NAMES)) # Shape shared by every output array
+        # Inputs are kept at their own shapes, so each stage only works on the shape of the inputs it depends on.
+        # Open grids such as np.ix_(BPRs, pi_fs, pi_cs) evaluate the fan once per pi_f and the compressor once per (pi_f, pi_c)
+        self.BPR  = _as_array(BPR)  # Bypass ratio
+        self.pi_f = _as_array(pi_f) # Fan pressure ratio
+        self.pi_c = _as_array(pi_c) # Compressor pressure ratio
+        self.exact = exact # Skip the rounding of the station values, for a smooth, full-precision model
+        self.real_gas = real_gas # Temperature dependent gas properties instead of constant c_p and gamma
+
+    # Station values are rounded like in TurboFan, unless the batch is exact
+    def _round(self, x, ndigits):
+        return x if self.exact else round_array(x, ndigits)
+
+    def inlet(self):
+        self.p0a_pa = self._round(pressure_ratio(self.M0, self.gamma_c), 4) # Stagnation pressure ratio (p0a/pa)
+        self.p01_pa = self._round(pressure_ratio_n(self.M0, self.n_i, self.gamma_c), 4) # Pressure loss ratio (p01/pa)
+        self.p0a    = self._round(self.p0a_pa * self.pa, 3) # Stagnation pressure, [bar]
+        self.p01    = self._round(self.p01_pa * self.pa, 3) # Pressure after loss, [bar]
+        self.T0a    = self._round(total_temperature(self.M0, self.T0, self.gamma_c), 3) # Stagnation temperature of flow just before it enters the fan, [K]
+
+    def fan(self):
+        self.T01 = self.T0a # Stagnation temperature of flow just before it enters the fan, [K]
+        self.n   = n1_n(self.n_inff, self.gamma_c, self.exact) # Polytropic exponent
+        if self.real_gas:
+            T02 = Gas.polytropic_temperature(self.T01, self.pi_f, self.n_inff, R=self.R / 1000)
+        else:
+            T02 = self.T01 * T02_T01(self.pi_f, self.n)
+        self.T02 = self._round(T02, 3) # Temperature after fan, [K]
+        self.p02 = self._round(self.pi_f * self.p01, 3) # Pressure after fan, [bar]
+        self.DeltaT012 = self._round(self.T02 - self.T01, 2) # Temp change in fan, [K]
+
+    def coldNozzle(self):
+        p02_p8 = self.p02/self.p8 # Pressure ratio
+        if self.real_gas:
+            DeltaT028, C8 = Gas.nozzle(self.T02, p02_p8, self.n_j, R=self.R / 1000)
+            self.DeltaT028 = self._round(DeltaT028, 2) # Temperature change in nozzle, [K]
+            self.C8        = self._round(C8, 3) # Velocity at nozzle exit, [m/s]
+            return
+        g1_g   = ((self.gamma_c-1)/self.gamma_c) # Calculating the gamma ratio for calculation below
+        self.DeltaT028 = self._round( self.n_j * self.T02 * (1 - (1/(p02_p8))**g1_g), 2) # Temperature change in nozzle, [K]
+        self.C8        = self._round(np.sqrt(2 * self.c_p * self.DeltaT028), 3) # Velocity at nozzle exit, [m/s]
+
+    def compressor(self):
+        self.p03 = self._round(self.pi_c * self.p02, 3) # Pressure after the compressor, [bar]
+        self.nc  = n1_n(self.n_infc, self.gamma_c, self.exact)
+        if self.real_gas:
+            DeltaT023 = Gas.polytropic_temperature(self.T02, self.pi_c, self.n_infc, R=self.R / 1000) - self.T02
+        else:
+            DeltaT023 = self.T02 * (self.pi_c**self.nc -1)
+        self.DeltaT023 = self._round(DeltaT023, 1) # Temperature change in compressor, [K]
+        self.T03 = self._round(self.T02 + self.DeltaT023, 2) # Temperature at compressor exit, [K]
+        if self.real_gas:
+            wc = Gas.enthalpy(self.T03) - Gas.enthalpy(self.T02)
+        else:
+            wc = self.c_p * self.DeltaT023 / 1000
+        self.wc  = self._round(wc, 3) # Specific work done, [kJ/kg]
+
+    def combustor(self):
+        self.DeltaT034 = self._round(self.T04 - self.T03, 2) # Temperature change across combustor, [K]
+        self.p04       = self._round(self.p03 * (1 - (1 - self.pi_b)), 3) # Pressure change across the combustor, [bar]
+        if self.real_gas: # The products enthalpy depends on the fuel-air ratio being solved for
+            f_ideal = self._round(Gas.fuel_air_ratio(self.T03, self.T04, self.h_fuel), 6) # Ideal fuel flow fraction
+        else:
+            f_ideal = self._round(( (self.c_pg*self.T04) - (self.c_pa*self.T03) ) / ( self.h_fuel - (self.c_pg*self.T04) ), 6) # Ideal fuel flow fraction
+        self.f_act   = self._round(f_ideal / self.n_b , 5) # Actual fuel flow fraction
+
+    def hpTurbine(self):
+        self.B   = self.BPR
+        if self.real_gas: # Compressor work per unit turbine gas, from the real-gas enthalpies
+            work = (Gas.enthalpy(self.T02 + self.DeltaT023) - Gas.enthalpy(self.T02)) / (self.n_m * (1 + self.f_act * (self.B + 1)))
+            T05, p05_p04 = Gas.turbine(self.T04, work, self.n_inft, self.f_act, R=self.R / 1000)
+            self.DeltaT045 = self._round(self.T04 - T05, 3) # Temperature change across the HP Turbine, [K]
+            self.T05 = self._round(self.T04 - self.DeltaT045, 3) # Temperature after the HP Turbine
+            self.m   = self._round(m1_m(self.n_inft, self.gamma_h, self.exact), 3) # Polytropic exponent
+            self.p05 = self._round(self.p04 * p05_p04, 3) # Pressure after the HP Turbine, [bar]
+            return
+        self.DeltaT045 = self._round(( 1/self.n_m * ((1/(self.B+1)) * self.c_pa * self.DeltaT023) ) / ((1/(self.B+1) + self.f_act) * self.c_pg) , 3) # Temperature change across the HP Turbine, [K]
+        self.T05 = self._round(self.T04 - self.DeltaT045, 3) # Temperature after the HP Turbine
+        self.m   = self._round(m1_m(self.n_inft, self.gamma_h, self.exact), 3) # Polytropic exponent
+        self.p05 = self._round(self.p04 * (self.T05/self.T04)**(1/self.m), 3) # Pressure after the HP Turbine, [bar]
+
+    def lpRotor(self):
+        if self.real_gas: # Fan work per unit turbine gas, from the real-gas enthalpies
+            work = (Gas.enthalpy(self.T02) - Gas.enthalpy(self.T02 - self.DeltaT012)) / (self.n_m * (1/(self.B+1) + self.f_act))
+            T06, p06_p05 = Gas.turbine(self.T05, work, self.n_inft, self.f_act, R=self.R / 1000)
+            self.DeltaT056 = self._round(self.T05 - T06, 3) # Temperature change across the LP Rotor, [K]
+            self.T06       = self.T05 - self.DeltaT056 # Temperature after the LP Rotor, [K]
+            self.p06       = self._round(self.p05 * p06_p05, 3) # Pressure after the LP Rotor, [bar]
+            return
+        self.DeltaT056 = self._round( (1/self.n_m * (self.c_pa * self.DeltaT012) ) / ((1/(self.B+1) + self.f_act) * self.c_pg), 3) # Temperature change across the LP Rotor, [K]
+        self.T06       = self.T05 - self.DeltaT056 # Temperature after the LP Rotor, [K]
+        self.p06       = self._round(( self.p05 * (self.T06/self.T05)**(1/self.m) ), 3) # Pressure after the LP Rotor, [bar]
+
+    def hotNozzle(self):
+        pr = self.p06/self.p7
+        if self.real_gas:
+            DeltaT067, C7 = Gas.nozzle(self.T06, pr, self.n_j, self.f_act, R=self.R / 1000)
+            self.DeltaT067 = self._round(DeltaT067, 2) # Temperature change in the hot nozzle, [K]
+            self.C7 = self._round(C7, 2) # Velocity at the exit of the hot nozzle, [m/s]
+            return
+        self.DeltaT067 = self._round( self.n_j * self.T06 * (1 - ((1/(pr)))**((self.gamma_h-1)/self.gamma_h)), 2) # Temperature change in the hot nozzle, [K]
+        self.C7 = self._round( np.sqrt(2 * self.c_pg*1000 * self.DeltaT067), 2) # Velocity at the exit of the hot nozzle, [m/s]
+
+    def calculate_flight_metrics(self):
+        self.Ca    = self._round( self.M0 * (np.sqrt(self.gamma_c * self.R * self.T0)), 3) # Velocity at ambient conditions, [m/s]
+        self.q_bar = self._round( self.gamma_c/2 * self.pa * self.M0**2, 5) # Dynamic pressure, [bar]
+        self.q     = self.q_bar*10**5 # Dynamic pressure, [Pa]
+        self.C_L   = self._round( (self.W * 4.448) / (self.q * self.S_W), 4) # Lift coefficient
+        self.C_D   = self._round( drag_coefficient(self.C_L), 5) # Drag coefficient
+        self.D     = self._round(self.C_D * self.q * self.S_W, 2) # Drag force, [N]
+        # D = (C7 - Ca)*(mDota/(B+1) + f_act*mDota) + (C8 - Ca)*(mDota*B/(B+1)) is linear in mDota, solve it directly
+        thrust_per_mDota = (self.C7 - self.Ca) * (1 / (self.B + 1) + self.f_act) + (self.C8 - self.Ca) * (self.B / (self.B + 1))
+        self.mDota = self._round(self.D / thrust_per_mDota, 2) # Mass flow rate of air, [kg/s]
+        if Instrumentation.PROFILER is not None: # Direct solve, one evaluation, fails where the nozzles give no thrust
+            Instrumentation.PROFILER.solver('mDota thrust balance (batch)', nfev=np.size(self.mDota), converged=np.isfinite(self.mDota))
+        Ta = self.T0
+        self.d = self._round( np.sqrt((4*self.mDota*self.R*Ta) / (self.pa*10**5 * self.Ca * np.pi)), 3) # Calculating fan diameter, [m]
+
+
+    def run_all_calculations(self):
+        profiler = Instrumentation.PROFILER # Checked once, stages are only timed while a profiler is enabled
+        for name in STAGE_NAMES:
+            if profiler is None:
+                getattr(self, name)()
+            else:
+                with profiler.span(f"batch {name}"):
+                    getattr(self, name)()
+
+
+    def inputs(self):
+        # Every design variable and parameter the batch was built with, broadcast to the batch shape
+        return {name: np.broadcast_to(getattr(self, name), self.shape) for name in DESIGN_NAMES + PARAMETER_NAMES}
+
+
+    def stations(self):
+        # Every station quantity broadcast to the batch shape
+        return {name: np.broadcast_to(getattr(self, name), self.shape) for name in STATION_FIELDS}
+
+
+    # Design variables, T04, station quantities and performance outputs as compact EngineStates
+    # (CycleAnalysis/EngineState.py), each field kept at the shape of the inputs it depends on. dtype=np.float32 halves
+    # the memory
+    def states(self, dtype=None):
+        from CycleAnalysis.EngineState import EngineStates
+        return EngineStates.from_batch(self, dtype)
+
+
+    # Performance outputs as a tuple of arrays. With derivatives=True also returns their derivatives with respect to the
+    # inputs in wrt (default every design variable and parameter), as a dict of output name -> dict of input name -> array
+    def performance(self, derivatives=False, wrt=None):
+        if derivatives:
+            return self.performance(), self.derivatives(wrt)
+        self.run_all_calculations() # Call components to set up the performance calculations
+        mDotc = mdotCold(self.mDota, self.BPR) # Massflow through cold section, [kg/s]
+        mDoth = mdotHot(self.mDota, self.BPR) # Massflow through hot section, [kg/s]
+        F_m0  = self.D / self.mDota # Thrust to mass flow rate of air, [N/(kg/s)]
+        TSFC  = get_TSFC(self.f_act, self.D, self.mDota) # Thrust specific fuel consumption, [g/kN-s]
+        f     = self.f_act # Fuel air ratio
+        eta_T = eta_Thermal(self.BPR, self.C8, self.f_act, self.C7, self.Ca, self.h_fuel) # Thermal efficiency
+        eta_P = eta_Propulsive(self.Ca, mDotc, self.C8, mDoth, self.C7, self.mDota) # Propulsive efficiency
+        eta_O = eta_T * eta_P # Overall efficiency
+
+        return tuple(np.broadcast_to(output, self.shape) for output in (F_m0, TSFC, f, eta_T, eta_P, eta_O))
+
+
+    # Derivatives of the outputs (performance outputs or station quantities, default the performance outputs) of the exact
+    # (unrounded) model by the complex-step method: each input in wrt is given an imaginary perturbation of size step
+    # along its own slot of a leading axis, so one complex batch evaluates every derivative at every point, to machine
+    # precision. Nozzle exit pressures that default to pa (tied_to_pa) move with it, so the pa derivative includes the
+    # nozzle expansion, as when the batch is evaluated at another pa. Returns a dict of output name -> dict of input name ->
+    # array, NaN where the cycle has no solution
+    def derivatives(self, wrt=None, outputs=PERFORMANCE_FIELDS, step=1e-30):
+        wrt = tuple(wrt or DESIGN_NAMES + PARAMETER_NAMES)
+        unknown = sorted(set(wrt) - set(DESIGN_NAMES + PARAMETER_NAMES))
+        if unknown:
+            raise ValueError(f"Cannot differentiate with respect to: {', '.join(unknown)}")
+        unknown = sorted(set(outputs) - set(PERFORMANCE_FIELDS + STATION_FIELDS))
+        if unknown:
+            raise ValueError(f"Cannot differentiate unknown outputs: {', '.join(unknown)}")
+        slots = (len(wrt),) + (1,) * len(self.shape)
+        inputs = {name: getattr(self, name) for name in DESIGN_NAMES + PARAMETER_NAMES}
+        for k, name in enumerate(wrt):
+            perturbation = np.zeros(slots, dtype=complex)
+            perturbation[k] = 1j * step
+            for moved in (name,) + (self.tied_to_pa if name == 'pa' else ()):
+                inputs[moved] = inputs[moved] + perturbation
+        engine = TurboFanBatch(exact=True, real_gas=self.real_gas, **inputs)
+        values = dict(zip(PERFORMANCE_FIELDS, engine.performance()))
+        exact = TurboFanBatch(exact=True, real_gas=self.real_gas, **{name: getattr(self, name) for name in DESIGN_NAMES + PARAMETER_NAMES})
+        feasible = ~np.isnan(exact.performance()[0]) # Complex square roots do not turn infeasible points into NaN
+        results = {}
+        for output in outputs:
+            array = values[output] if output in values else np.broadcast_to(getattr(engine, output), slots[:1] + self.shape)
+            results[output] = {name: np.where(feasible, array[k].imag / step, np.nan) for k, name in enumerate(wrt)}
+        return results
@@ -0,0 +1,177 @@
+"""
+This code builds and queries engine decks: tables of the TurboFan cycle outputs (F/m0, TSFC, f, the efficiencies, mDota
+and the fan diameter d) precomputed on a grid of design variables and parameters, for codes that need cycle results
+millions of times. Queries use multilinear interpolation on the grid.
+Decks tabulate the unrounded, full-precision (exact) model by default, which is smooth. While building, the cycle is also
+evaluated at the centre of every grid cell, where multilinear interpolation is furthest from the nodes. The larger of the
+model-vs-deck difference there and a curvature bound from the second differences of the surrounding nodes, maximised
+over the neighbouring cells, is stored per cell and output and returned as the error estimate of queries falling in that
+cell. It is a leading-order estimate, not a strict bound: where the curvature of an output changes quickly across a
+cell the true error can exceed it by a few percent. With "exact": false in the spec the deck tabulates the rounded model
+of TurboFan instead. Its outputs carry rounding noise of the order of the last rounded digits of the station values,
+which the estimate does not cover, so the interpolation error against the rounded model can be several times larger
+than the estimate.
+A deck is a directory with "deck.json" (axes and outputs) and the "table.npy" and "error.npy" arrays, which are opened
+memory-mapped so every process on a machine shares one copy through the page cache.
+
+    Usage:
+        python Deck/EngineDeck.py deck_spec.json DECK_DIR    # spec uses the "parameters" / "baseline" format of Sweep.py
+
+        deck = EngineDeck('DECK_DIR')
+        deck.query_point(BPR=10.2, pi_f=1.55, pi_c=34.)      # {'F_m0': ..., 'TSFC': ..., ...}
+        deck.query(BPR=BPRs, pi_f=1.5, pi_c=pi_cs)           # arrays of any broadcastable shape
+"""
+import sys
+sys.path.append(".")
+import bisect
+import json
+import os
+import numpy as np
+from Iterations.Sweep import sweep_grid, axis_values, load_spec
+
+DECK_OUTPUTS = ('F_m0', 'TSFC', 'f', 'eta_T', 'eta_P', 'eta_O', 'mDota', 'd')
+
+
+def _upper(array, axis):
+    return array[(slice(None),) * axis + (slice(1, None),)]
+
+
+def _lower(array, axis):
+    return array[(slice(None),) * axis + (slice(None, -1),)]
+
+
+# Leading-order multilinear interpolation error of every cell, sum over the axes of |second difference| / 8 taken from
+# the nodes around the cell. Catches curvature the cell centre alone can miss
+def _curvature_bound(table):
+    dims = table.ndim - 1
+    bound = np.zeros(tuple(n - 1 for n in table.shape[:-1]) + table.shape[-1:])
+    for axis in range(dims):
+        if table.shape[axis] < 3:
+            continue
+        second = np.abs(np.diff(table, n=2, axis=axis))
+        second = np.concatenate([second.take([0], axis=axis), second, second.take([-1], axis=axis)], axis=axis)
+        for other in range(dims): # Largest value over the nodes of each cell
+            second = np.fmax(_upper(second, other), _lower(second, other))
+        bound += second / 8
+    return bound
+
+
+# Largest value over each cell and its neighbours along every axis, so a cell whose own centre and corners happen to
+# show little curvature takes the estimate of the cells around it
+def _neighbourhood_max(error):
+    for axis in range(error.ndim - 1):
+        padded = np.concatenate([error.take([0], axis=axis), error, error.take([-1], axis=axis)], axis=axis)
+        error = np.fmax(np.fmax(_lower(_lower(padded, axis), axis), _upper(_upper(padded, axis), axis)), error)
+    return error
+
+
+# Tabulate the cycle on the grid spanned by axes (parameter name -> values, at least two per axis) and write the deck.
+# exact=False tabulates the rounded model, whose error estimates do not cover its rounding noise
+def build_deck(path, axes, fixed=None, outputs=DECK_OUTPUTS, workers=None, exact=True):
+    axes = {name: axis_values(values) for name, values in axes.items()}
+    for name, values in axes.items():
+        if len(values) < 2 or np.any(np.diff(values) <= 0):
+            raise ValueError(f"Deck axis {name} needs at least two increasing values")
+    nodes = sweep_grid(axes, fixed, outputs, workers=workers, exact=exact)
+    centres = sweep_grid({name: (values[1:] + values[:-1]) / 2 for name, values in axes.items()}, fixed, outputs,
+                         workers=workers, exact=exact)
+    table = np.stack([nodes[name] for name in outputs], axis=-1)
+    # Multilinear interpolation at a cell centre is the mean of the cell corners
+    corners = table
+    for axis in range(len(axes)):
+        corners = (_upper(corners, axis) + _lower(corners, axis)) / 2
+    error = np.abs(np.stack([centres[name] for name in outputs], axis=-1) - corners)
+    error = _neighbourhood_max(np.fmax(error, _curvature_bound(table)))
+
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, 'table.npy'), table)
+    np.save(os.path.join(path, 'error.npy'), error)
+    with open(os.path.join(path, 'deck.json'), 'w') as file:
+        json.dump({'axes': {name: values.tolist() for name, values in axes.items()},
+                   'outputs': list(outputs), 'fixed': dict(fixed or {}), 'exact': exact}, file, indent=4)
+    return EngineDeck(path)
+
+
+class EngineDeck:
+    def __init__(self, path):
+        with open(os.path.join(path, 'deck.json')) as file:
+            meta = json.load(file)
+        self.path    = path
+        self.names   = tuple(meta['axes'])
+        self.axes    = [np.asarray(values) for values in meta['axes'].values()]
+        self.outputs = tuple(meta['outputs'])
+        self.fixed   = meta['fixed']
+        self.table   = np.load(os.path.join(path, 'table.npy'), mmap_mode='r') # Shared, read-only
+        self.error   = np.load(os.path.join(path, 'error.npy'), mmap_mode='r')
+        self._flat_table = self.table.reshape(-1, len(self.outputs))
+        self._flat_error = self.error.reshape(-1, len(self.outputs))
+        self._lists   = [values.tolist() for values in self.axes] # For bisect in the scalar path
+        shape         = self.table.shape[:-1]
+        self._strides = [int(np.prod(shape[i + 1:])) for i in range(len(shape))]
+        self._cell_strides = [int(np.prod([n - 1 for n in shape[i + 1:]])) for i in range(len(shape))]
+        # Offset of every cell corner from the cell origin and its bit pattern, for the 2^N corners of a cell
+        bits = np.array(np.meshgrid(*([[0, 1]] * len(shape)), indexing='ij')).reshape(len(shape), -1).T
+        self._corner_bits    = bits
+        self._corner_offsets = bits @ np.array(self._strides)
+
+    def __repr__(self):
+        axes = ', '.join(f"{name}: {values[0]:g}..{values[-1]:g} ({len(values)})" for name, values in zip(self.names, self.axes))
+        return f"EngineDeck({axes}; outputs: {', '.join(self.outputs)})"
+
+    # Interpolated outputs for one point, given as keyword arguments for every axis. Returns a dict of floats,
+    # all NaN outside the deck. With error=True also returns the dict of error estimates
+    def query_point(self, error=False, **values):
+        cell, flat_cell, weights = 0, 0, [1.0]
+        for name, grid, stride, cell_stride in zip(self.names, self._lists, self._strides, self._cell_strides):
+            x = values[name]
+            if not grid[0] <= x <= grid[-1]:
+                result = dict.fromkeys(self.outputs, float('nan'))
+                return (result, dict(result)) if error else result
+            i = min(bisect.bisect_right(grid, x) - 1, len(grid) - 2)
+            t = (x - grid[i]) / (grid[i + 1] - grid[i])
+            weights = [w * s for w in weights for s in (1 - t, t)] # Corner weights, last axis varying fastest
+            cell += i * stride
+            flat_cell += i * cell_stride
+        result = dict(zip(self.outputs, (weights @ self._flat_table[cell + self._corner_offsets]).tolist()))
+        if error:
+            return result, dict(zip(self.outputs, self._flat_error[flat_cell].tolist()))
+        return result
+
+    # Interpolated outputs for arrays of points, given as keyword arguments for every axis (broadcastable arrays).
+    # Returns a dict of arrays, NaN outside the deck. With error=True also returns the dict of error estimates
+    def query(self, error=False, **values):
+        points = np.broadcast_arrays(*(np.asarray(values[name], dtype=float) for name in self.names))
+        shape = points[0].shape
+        cell = np.zeros(shape, dtype=np.intp)
+        flat_cell = np.zeros(shape, dtype=np.intp)
+        fractions, outside = [], np.zeros(shape, dtype=bool)
+        for x, grid, stride, cell_stride in zip(points, self.axes, self._strides, self._cell_strides):
+            outside |= ~((x >= grid[0]) & (x <= grid[-1]))
+            i = np.clip(np.searchsorted(grid, x, side='right') - 1, 0, len(grid) - 2)
+            fractions.append((x - grid[i]) / (grid[i + 1] - grid[i]))
+            cell += i * stride
+            flat_cell += i * cell_stride
+        result = np.zeros(shape + (len(self.outputs),))
+        for bits, offset in zip(self._corner_bits, self._corner_offsets):
+            weight = np.ones(shape)
+            for bit, t in zip(bits, fractions):
+                weight *= t if bit else 1 - t
+            result += weight[..., None] * self._flat_table[cell + offset]
+        result[outside] = np.nan
+        result = {name: result[..., k] for k, name in enumerate(self.outputs)}
+        if not error:
+            return result
+        estimates = np.array(self._flat_error[flat_cell])
+        estimates[outside] = np.nan
+        return result, {name: estimates[..., k] for k, name in enumerate(self.outputs)}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python Deck/EngineDeck.py deck_spec.json DECK_DIR")
+    spec = load_spec(sys.argv[1])
+    deck = build_deck(sys.argv[2], spec['parameters'], spec.get('baseline'), tuple(spec.get('outputs', DECK_OUTPUTS)),
+                      spec.get('workers'), bool(spec.get('exact', True)))
+    print(deck)
+    for k, name in enumerate(deck.outputs):
+        print(f"{name:6s} max error estimate {np.nanmax(deck.error[..., k]):.3g}")
@@ -0,0 +1,323 @@
+"""
+This code runs design-space sweeps of the TurboFan cycle from a declarative JSON or YAML spec.
+Any design variable (BPR, pi_f, pi_c) or constant listed in TurboFanBatch.PARAMETER_NAMES (T04, M0, T0, pa, the component
+efficiencies, ...) can be swept, either as a full-factorial grid over every swept parameter or one factor at a time
+around a baseline. The grid is split into blocks of at most chunk_size points, each a contiguous run of the grid in C
+order (rows along the first axis, or along a later axis where one row of the first is larger than chunk_size), that are
+evaluated with TurboFanBatch across a process pool, and the results are gathered into N-D arrays labelled with the swept
+parameters (a SweepResult). When a store path is given the chunks are streamed to a columnar result store
+(Storage/ResultStore.py) as they finish instead of being held in memory, and the SweepResult arrays are memory-mapped from
+the store. Every finished block is checkpointed in the store, so an interrupted sweep can be resumed, and with a result
+cache (Storage/ResultCache.py) points evaluated by any earlier sweep are reused instead of recomputed.
+
+    Example spec:
+        {
+            "mode": "full_factorial",                              # or "one_at_a_time"
+            "parameters": {
+                "BPR":  {"start": 5, "stop": 20, "num": 16},       # np.linspace arguments
+                "pi_f": [1.4, 1.5, 1.6],                           # explicit values
+                "T04":  {"values": [1450, 1560]}
+            },
+            "baseline": {"pi_c": 36.0},                            # values of the parameters not being swept
+            "outputs": ["F_m0", "TSFC"],                           # optional, default is every output
+            "chunk_size": 100000,
+            "workers": 4,                                          # optional, default is os.cpu_count()
+            "store": "Results/sweep",                              # optional, stream the results to a result store
+            "resume": true,                                        # optional, continue an interrupted sweep in the store
+            "cache": "cycle_cache.sqlite",                         # optional, reuse points from a persistent result cache
+            "exact": false,                                        # optional, evaluate the unrounded, full-precision model
+            "real_gas": false                                      # optional, temperature dependent gas properties
+        }
+
+    Usage:
+        python Iterations/Sweep.py spec.json results.npz
+"""
+import sys
+sys.path.append(".")
+import collections
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from CycleAnalysis.TurboFanBatch import TurboFanBatch, DESIGN_NAMES, PARAMETER_NAMES, STATION_FIELDS, PERFORMANCE_FIELDS
+from Storage.ResultStore import ResultWriter, ResultReader, MANIFEST
+from Storage.ResultCache import ResultCache, evaluate_cached
+import Tools.Instrumentation as Instrumentation
+
+SWEEPABLE   = DESIGN_NAMES + PARAMETER_NAMES
+OUTPUTS     = PERFORMANCE_FIELDS + STATION_FIELDS
+MODES       = ('full_factorial', 'one_at_a_time')
+CHUNK_SIZE  = 100000 # Default number of grid points per chunk
+IN_FLIGHT   = 2      # Chunks submitted per worker ahead of the one being collected
+
+
+class SweepResult:
+    def __init__(self, dims, coords, data, fixed=None):
+        self.dims   = tuple(dims)   # Names of the swept parameters, one per array axis
+        self.coords = coords        # Parameter name -> 1-D array of swept values
+        self.data   = data          # Output name -> N-D array of shape self.shape
+        self.fixed  = fixed or {}   # Values of the parameters held constant
+        self.shape  = tuple(len(coords[dim]) for dim in self.dims)
+
+    def __getitem__(self, name):
+        return self.data[name]
+
+    def __repr__(self):
+        dims = ', '.join(f"{dim}: {n}" for dim, n in zip(self.dims, self.shape))
+        return f"SweepResult({dims}; outputs: {', '.join(self.data)})"
+
+    # Return the outputs at the grid point closest to the given parameter values, dropping the selected axes
+    def sel(self, **values):
+        index, dims = [], []
+        for dim in self.dims:
+            if dim in values:
+                index.append(int(np.abs(self.coords[dim] - values[dim]).argmin()))
+            else:
+                index.append(slice(None))
+                dims.append(dim)
+        fixed = dict(self.fixed, **{dim: self.coords[dim][i] for dim, i in zip(self.dims, index) if dim in values})
+        return SweepResult(dims, {dim: self.coords[dim] for dim in dims},
+                           {name: array[tuple(index)] for name, array in self.data.items()}, fixed)
+
+    # Outputs as EngineStates (CycleAnalysis/EngineState.py) over the sweep shape, with the design variables and T04 the
+    # sweep was run at. Swept values are broadcast from their axes and the output arrays are used as they are
+    # (memory-mapped for a store), nothing is copied. Quantities not in the outputs are NaN
+    def states(self):
+        from CycleAnalysis.EngineState import EngineStates, STATE_FIELDS
+        inputs = TurboFanBatch(**self.fixed).inputs() # Fixed values with the defaults filled in
+        fields = {name: value for name, value in inputs.items() if name in STATE_FIELDS}
+        for axis, dim in enumerate(self.dims):
+            if dim in STATE_FIELDS:
+                fields[dim] = np.reshape(self.coords[dim], [-1 if i == axis else 1 for i in range(len(self.dims))])
+        fields.update(self.data)
+        return EngineStates(fields, self.shape)
+
+    # Flatten the sweep into a pandas DataFrame with one row per grid point
+    def to_frame(self):
+        import pandas as pd
+        grids = np.meshgrid(*(self.coords[dim] for dim in self.dims), indexing='ij')
+        columns = {dim: grid.ravel() for dim, grid in zip(self.dims, grids)}
+        columns.update({name: array.ravel() for name, array in self.data.items()})
+        return pd.DataFrame(columns)
+
+    def to_npz(self, path):
+        arrays = {f"coord_{dim}": self.coords[dim] for dim in self.dims}
+        arrays.update({f"data_{name}": array for name, array in self.data.items()})
+        meta = json.dumps({'dims': self.dims, 'fixed': self.fixed})
+        np.savez(path, __meta__=np.array(meta), **arrays)
+
+    # Open a sweep written to a result store, the data arrays are memory-mapped views of the store columns
+    @classmethod
+    def from_store(cls, path):
+        reader = ResultReader(path)
+        meta = reader.meta
+        coords = {dim: np.asarray(meta['coords'][dim]) for dim in meta['dims']}
+        shape = tuple(len(coords[dim]) for dim in meta['dims'])
+        data = {name: reader[name].reshape(shape) for name in meta['outputs']}
+        return cls(meta['dims'], coords, data, meta['fixed'])
+
+    @classmethod
+    def from_npz(cls, path):
+        with np.load(path) as npz:
+            meta = json.loads(str(npz['__meta__']))
+            coords = {dim: npz[f"coord_{dim}"] for dim in meta['dims']}
+            data = {key[5:]: npz[key] for key in npz.files if key.startswith('data_')}
+        return cls(meta['dims'], coords, data, meta['fixed'])
+
+
+# Read a sweep spec from a .json, .yaml or .yml file
+def load_spec(path):
+    with open(path) as file:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml # Optional dependency, only needed for YAML specs
+            return yaml.safe_load(file)
+        return json.load(file)
+
+
+# Turn one "parameters" entry of a spec into a 1-D array of values
+def axis_values(entry):
+    if isinstance(entry, dict):
+        if 'values' in entry:
+            return np.asarray(entry['values'], dtype=float)
+        return np.linspace(entry['start'], entry['stop'], int(entry['num']))
+    return np.atleast_1d(np.asarray(entry, dtype=float))
+
+
+# Blocks of the grid of the given shape from the flat (C order) index start on, as (start, stop) flat index ranges of at
+# most chunk_size points. Every block is a box of the grid: whole rows along the shallowest axis whose rows fit in
+# chunk_size (and that start is aligned with), within one row of the axis before it. A grid without swept parameters is
+# one block of its single point
+def _blocks(shape, start, chunk_size):
+    total = int(np.prod(shape))
+    if not shape:
+        yield from [(0, 1)][start:]
+        return
+    while start < total:
+        for axis in range(len(shape)):
+            row = int(np.prod(shape[axis + 1:]))
+            if row <= chunk_size and start % row == 0:
+                break
+        end = (start // (row * shape[axis]) + 1) * (row * shape[axis]) # End of the row of the axis before
+        stop = min(start + max(1, chunk_size // row) * row, end)
+        yield start, stop
+        start = stop
+
+
+# Slices of the grid of the given shape covered by the block start..stop of _blocks
+def _box(shape, start, stop):
+    if not shape:
+        return []
+    index = np.unravel_index(start, shape)
+    for axis in range(len(shape)):
+        row = int(np.prod(shape[axis + 1:]))
+        count = (stop - start) // row
+        if start % row == 0 and (stop - start) % row == 0 and index[axis] + count <= shape[axis]:
+            return ([slice(i, i + 1) for i in index[:axis]] + [slice(index[axis], index[axis] + count)]
+                    + [slice(None)] * (len(shape) - axis - 1))
+    raise ValueError(f"Points {start} to {stop} are not a block of a grid of shape {shape}")
+
+
+# Evaluate the block start..stop of the grid (see _blocks), run inside the worker processes. The axes are passed to
+# TurboFanBatch as an open grid, so stages that do not depend on every swept parameter run on a smaller array
+def _evaluate_chunk(dims, axes, fixed, outputs, start, stop, cache=None, exact=False, real_gas=False):
+    axes = [axis[part] for axis, part in zip(axes, _box(tuple(len(axis) for axis in axes), start, stop))]
+    inputs = dict(fixed, **{dim: axis for dim, axis in zip(dims, np.ix_(*axes))})
+    if cache is not None: # Only evaluate the points missing from the cache
+        options = {name: True for name, enabled in (('exact', exact), ('real_gas', real_gas)) if enabled}
+        cache = ResultCache(cache, options=options)
+        try:
+            results = evaluate_cached(cache, **inputs)
+        finally:
+            cache.close()
+        return {name: results[name] for name in outputs}
+    engine = TurboFanBatch(exact=exact, real_gas=real_gas, **inputs)
+    performance = dict(zip(PERFORMANCE_FIELDS, engine.performance()))
+    stations = engine.stations()
+    return {name: performance[name] if name in performance else stations[name] for name in outputs}
+
+
+# _evaluate_chunk in a worker process with a profiler enabled, returns the chunk and the worker's records
+def _profiled_chunk(*args):
+    with Instrumentation.profiling() as profiler:
+        with profiler.span('sweep chunk'):
+            chunk = _evaluate_chunk(*args)
+    return chunk, profiler.state()
+
+
+# Evaluate a full-factorial grid over the given axes, in chunks of about chunk_size points across a process pool.
+# With a store path the chunks are streamed to a result store, which also holds the swept inputs as columns, and with
+# resume=True a sweep already partly written to that store carries on after its last finished block.
+# With a cache path, points found in the result cache are reused and new points are added to it.
+# exact=True evaluates the unrounded, full-precision model and real_gas=True the model with temperature dependent gas properties
+@Instrumentation.instrumented('sweep_grid')
+def sweep_grid(axes, fixed=None, outputs=OUTPUTS, chunk_size=CHUNK_SIZE, workers=None, store=None, resume=False, cache=None,
+               exact=False, real_gas=False):
+    fixed = dict(fixed or {})
+    unknown = sorted((set(axes) | set(fixed)) - set(SWEEPABLE))
+    if unknown:
+        raise ValueError(f"Cannot sweep unknown parameters: {', '.join(unknown)}")
+    bad_outputs = sorted(set(outputs) - set(OUTPUTS))
+    if bad_outputs:
+        raise ValueError(f"Unknown sweep outputs: {', '.join(bad_outputs)}")
+    dims = tuple(axes)
+    values = [axis_values(axes[dim]) for dim in dims]
+    shape = tuple(len(axis) for axis in values)
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be at least 1, got {chunk_size}")
+    done = 0 # Points already in the store, in C order of the grid
+
+    if store is None:
+        data = {name: np.empty(shape) for name in outputs}
+        def collect(start, stop, chunk):
+            for name in outputs:
+                data[name].reshape(-1)[start:stop] = np.ravel(chunk[name])
+    else:
+        meta = {'dims': list(dims), 'coords': {dim: axis.tolist() for dim, axis in zip(dims, values)},
+                'fixed': fixed, 'outputs': list(outputs)}
+        if exact:
+            meta['exact'] = True
+        if real_gas:
+            meta['real_gas'] = True
+        mode = 'w'
+        if resume and os.path.exists(os.path.join(store, MANIFEST)):
+            previous = ResultReader(store)
+            if previous.meta != meta:
+                raise ValueError(f"Cannot resume, the store {store} holds a different sweep")
+            done, mode = len(previous), 'a'
+        writer = ResultWriter(store, dims + tuple(outputs), meta, mode)
+        def collect(start, stop, chunk): # Blocks arrive in order, so the rows stay in C order of the grid
+            grid = np.ix_(*[axis[part] for axis, part in zip(values, _box(shape, start, stop))])
+            chunk_shape = np.broadcast_shapes(*(axis.shape for axis in grid))
+            chunk = dict(chunk, **{dim: np.broadcast_to(axis, chunk_shape) for dim, axis in zip(dims, grid)})
+            writer.append(chunk)
+            writer.flush() # Checkpoint, the block survives an interruption
+    bounds = list(_blocks(shape, done, chunk_size))
+
+    workers = workers or os.cpu_count()
+    profiler = Instrumentation.PROFILER
+    if workers == 1 or len(bounds) == 1:
+        for start, stop in bounds:
+            with Instrumentation.span('sweep chunk'):
+                chunk = _evaluate_chunk(dims, values, fixed, outputs, start, stop, cache, exact, real_gas)
+            with Instrumentation.span('sweep collect'):
+                collect(start, stop, chunk)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            evaluate = _evaluate_chunk if profiler is None else _profiled_chunk # Workers profile themselves
+            # Only a few chunks per worker are in flight, so finished chunks waiting to be collected stay bounded
+            submit = lambda start, stop: (start, stop, pool.submit(evaluate, dims, values, fixed, outputs, start, stop, cache,
+                                                                   exact, real_gas))
+            pending = iter(bounds)
+            waiting = collections.deque(submit(*block) for block in itertools.islice(pending, IN_FLIGHT * workers))
+            while waiting:
+                start, stop, future = waiting.popleft()
+                chunk = future.result()
+                del future # The deque no longer holds it, so the chunk is freed once collected
+                waiting.extend(submit(*block) for block in itertools.islice(pending, 1))
+                if profiler is not None:
+                    chunk, state = chunk
+                    profiler.merge(state)
+                with Instrumentation.span('sweep collect'):
+                    collect(start, stop, chunk)
+
+    if store is None:
+        return SweepResult(dims, dict(zip(dims, values)), data, fixed)
+    writer.close()
+    return SweepResult.from_store(store)
+
+
+# Run a sweep spec. Full-factorial sweeps return one SweepResult, one-at-a-time sweeps a dict of 1-D SweepResults
+def run_sweep(spec):
+    mode = spec.get('mode', 'full_factorial')
+    if mode not in MODES:
+        raise ValueError(f"Unknown sweep mode '{mode}', expected one of: {', '.join(MODES)}")
+    options = {
+        'outputs':    tuple(spec.get('outputs', OUTPUTS)),
+        'chunk_size': int(spec.get('chunk_size', CHUNK_SIZE)),
+        'workers':    spec.get('workers'),
+    }
+    options.update(resume=bool(spec.get('resume', False)), cache=spec.get('cache'), exact=bool(spec.get('exact', False)),
+                   real_gas=bool(spec.get('real_gas', False)))
+    store = spec.get('store')
+    parameters = spec['parameters']
+    baseline = spec.get('baseline', {})
+    if mode == 'full_factorial':
+        return sweep_grid(parameters, baseline, store=store, **options)
+    results = {}
+    for name, entry in parameters.items(): # Vary one parameter, hold the others at their baseline values
+        fixed = {key: value for key, value in baseline.items() if key != name}
+        results[name] = sweep_grid({name: entry}, fixed, store=store and os.path.join(store, name), **options)
+    return results
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python Iterations/Sweep.py spec.json results.npz")
+    result = run_sweep(load_spec(sys.argv[1]))
+    if isinstance(result, SweepResult):
+        result.to_npz(sys.argv[2])
+    else: # One file per swept parameter for one-at-a-time sweeps
+        root, ext = os.path.splitext(sys.argv[2])
+        for name, sweep in result.items():
+            sweep.to_npz(f"{root}_{name}{ext or '.npz'}")
@@ -0,0 +1,281 @@
+"""
+This code integrates the fuel burn of whole missions with the TurboFan cycle, for many candidate engines and missions at once.
+A mission is a list of climb, cruise and descent segments, each split into steps with the altitude and Mach number taken
+at the middle of the step. At every step the required thrust balances the drag of the aircraft at its current weight
+(the drag polar of calculate_flight_metrics) plus the climb gradient and acceleration terms, and the fuel flow is
+TSFC x thrust, with TSFC from the cycle at the flight condition of the step. The weight is integrated through the steps
+with the midpoint (RK2) rule. In descent the thrust is not taken below IDLE times the drag. Engines and missions where
+the cycle has no solution at some step, or that burn more than the take-off weight, get NaN results.
+The specific thrust and TSFC of the cycle depend on the engine and the flight condition, not on the thrust required of
+it, so they are evaluated with one TurboFanBatch per chunk of engines over the distinct flight conditions of all the
+mission steps (every step of a cruise segment shares one), and only the weight recurrence runs step by step, on arrays of
+every engine and mission of the chunk. Chunks of engines are spread
+across a process pool like the sweeps of Iterations/Sweep.py.
+Each engine is also sized at its design point (calculate_flight_metrics, the default FlightCondition unless a design
+point is given), and flow_ratio reports the largest corrected air flow a mission asks of the engine relative to that
+design flow, so engines too small for the climb can be screened out.
+The results are a SweepResult over the engine parameters and a "mission" axis (the missions in spec order).
+
+    Example spec:
+        {
+            "engines": {                                                # swept engine design variables and constants
+                "BPR":  {"start": 6, "stop": 14, "num": 9},
+                "pi_f": [1.4, 1.5, 1.6],
+                "pi_c": 36.0,
+                "T04":  1560.0
+            },
+            "design_point": {"altitude": 11000, "M0": 0.85},            # optional, sizing flight condition
+            "missions": [
+                {
+                    "name": "long haul",
+                    "W_TO": 370000,                                     # take-off weight, [lbf]
+                    "S_W":  285,                                        # optional, wing area, [m^2]
+                    "segments": [
+                        {"kind": "climb",   "altitude": [0, 11000], "M0": [0.3, 0.85], "rate": 10,  "steps": 40},
+                        {"kind": "cruise",  "altitude": 11000,      "M0": 0.85,        "range": 8000, "steps": 100},
+                        {"kind": "descent", "altitude": [11000, 0], "M0": [0.85, 0.3], "rate": 8,   "steps": 30}
+                    ]
+                }
+            ],
+            "chunk_size": 1000000,
+            "workers": 4                                                # optional, default is os.cpu_count()
+        }
+    Climb and descent rates are vertical speeds [m/s], cruise segments take a "range" [km] or a "time" [s].
+
+    Usage:
+        python Mission/FuelBurn.py Mission/MissionSpec.json results.npz
+"""
+import sys
+sys.path.append(".")
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from CycleAnalysis.TurboFanBatch import TurboFanBatch, DESIGN_NAMES
+from Parameters.Conditions import FlightCondition, DESIGN_PARAMETER_NAMES
+from Parameters.Atmosphere import isa, G0, T_SL, P_SL
+from Iterations.Sweep import SweepResult, load_spec, axis_values
+import Parameters.TurboFanParameters as Parameters
+from Tools.Eqns import drag_coefficient
+import Tools.Instrumentation as Instrumentation
+
+ENGINE_NAMES   = DESIGN_NAMES + DESIGN_PARAMETER_NAMES
+SEGMENT_KINDS  = ('climb', 'cruise', 'descent')
+MISSION_FIELDS = ('fuel', 'time', 'range', 'W_final', 'TSFC_mean', 'flow_ratio', 'mDota', 'd')
+LBF            = 4.448   # Newtons per pound force, as in calculate_flight_metrics
+STEPS          = 20      # Default number of steps of a segment
+IDLE           = 0.1     # Smallest thrust in descent, as a fraction of the drag
+CHUNK_SIZE     = 1000000 # Default number of engine x mission x step points per chunk
+
+
+class Mission:
+    def __init__(self, segments, W_TO=Parameters.W_TO, S_W=Parameters.S_W, name=None):
+        self.name     = name
+        self.W_TO     = float(W_TO) # Take-off weight, [lbf]
+        self.S_W      = float(S_W)  # Wing Surface Area, [m^2]
+        self.segments = [dict(segment) for segment in segments]
+        if not self.segments:
+            raise ValueError(f"Mission {name or ''} has no segments")
+        steps = [segment_steps(segment) for segment in self.segments]
+        # Per step: altitude [m] and Mach at the middle of the step, duration [s], climb gradient (sin of the flight path
+        # angle) and acceleration dV/dt / g
+        self.altitude, self.M0, self.dt, self.gradient, self.acceleration = (np.concatenate(values) for values in zip(*steps))
+
+    def __repr__(self):
+        return f"Mission({self.name or ''}: {len(self.segments)} segments, {len(self.dt)} steps, W_TO={self.W_TO:g} lbf)"
+
+    def __len__(self):
+        return len(self.dt)
+
+    @classmethod
+    def from_spec(cls, spec):
+        return cls(spec['segments'], spec.get('W_TO', Parameters.W_TO), spec.get('S_W', Parameters.S_W), spec.get('name'))
+
+
+# Pair of start and end values of a segment entry, a single value for both
+def _ends(value):
+    values = np.atleast_1d(np.asarray(value, dtype=float))
+    if len(values) not in (1, 2):
+        raise ValueError(f"Expected a value or a [start, end] pair, got {value}")
+    return values[0], values[-1]
+
+
+# Steps of one segment: altitude and Mach at the step middles, durations [s], climb gradients and accelerations / g
+def segment_steps(segment):
+    kind = segment.get('kind')
+    if kind not in SEGMENT_KINDS:
+        raise ValueError(f"Unknown segment kind '{kind}', expected one of: {', '.join(SEGMENT_KINDS)}")
+    steps = int(segment.get('steps', STEPS))
+    if steps < 1:
+        raise ValueError(f"A {kind} segment needs at least one step")
+    (h_start, h_end), (M_start, M_end) = _ends(segment['altitude']), _ends(segment['M0'])
+    if min(M_start, M_end) <= 0:
+        raise ValueError(f"The Mach number of a {kind} segment must be positive")
+    ones = np.ones(steps)
+    if kind == 'cruise':
+        if h_start != h_end or M_start != M_end:
+            raise ValueError("A cruise segment flies at one altitude and Mach number")
+        V = M_start * isa(h_start)[2]
+        if ('range' in segment) == ('time' in segment):
+            raise ValueError("A cruise segment needs either a \"range\" [km] or a \"time\" [s]")
+        duration = segment['range'] * 1000 / V if 'range' in segment else float(segment['time'])
+        return h_start * ones, M_start * ones, duration / steps * ones, 0 * ones, 0 * ones
+    climb = h_end - h_start
+    if (kind == 'climb') != (climb > 0) or climb == 0:
+        raise ValueError(f"A {kind} segment must {'gain' if kind == 'climb' else 'lose'} altitude, "
+                         f"got {h_start:g} to {h_end:g} m")
+    rate = abs(float(segment['rate'])) # Vertical speed, [m/s]
+    fraction = np.linspace(0., 1., steps + 1)
+    h, M = h_start + climb * fraction, M_start + (M_end - M_start) * fraction
+    V = M * isa(h)[2] # True airspeed at the step ends, [m/s]
+    dt = abs(climb) / steps / rate * ones
+    middle = lambda values: (values[1:] + values[:-1]) / 2
+    return middle(h), middle(M), dt, np.sign(climb) * rate / middle(V), np.diff(V) / dt / G0
+
+
+# Mission step profiles padded to the same number of steps (padding steps take no time), as (missions, steps) arrays.
+# The distinct flight conditions of all steps (cruise steps share one) are kept in 'conditions' with the index of every
+# step into them in 'condition', so the cycle is only evaluated once per condition
+def _profiles(missions):
+    steps = max(len(mission) for mission in missions)
+    pad = lambda values, fill: np.concatenate([values, np.full(steps - len(values), fill)])
+    profile = {name: np.stack([pad(getattr(mission, name), getattr(mission, name)[-1] if name in ('altitude', 'M0') else 0.)
+                               for mission in missions])
+               for name in ('altitude', 'M0', 'dt', 'gradient', 'acceleration')}
+    profile['W_TO'] = np.array([mission.W_TO for mission in missions])
+    profile['S_W']  = np.array([mission.S_W for mission in missions])
+    conditions, index = np.unique(np.stack([profile['altitude'].ravel(), profile['M0'].ravel()], axis=1), axis=0,
+                                  return_inverse=True)
+    profile['conditions'], profile['condition'] = conditions, index.reshape(profile['dt'].shape)
+    return profile
+
+
+# Fly every mission of the profiles with the engines given as 1-D arrays of equal length (or scalars), run inside the
+# worker processes. Returns output name -> (engines, missions) array
+def _fly_chunk(engines, fixed, profile, design, exact=False, real_gas=False):
+    inputs = dict(fixed, **{name: np.reshape(values, (-1, 1)) for name, values in engines.items()})
+    altitude, M0 = profile['conditions'].T
+    T0, pa, a = isa(altitude)
+    with Instrumentation.span('mission cycle'):
+        cycle = TurboFanBatch(flight=FlightCondition(M0=M0, T0=T0, pa=pa), exact=exact, real_gas=real_gas, **inputs)
+        F_m0, TSFC = cycle.performance()[:2] # (engines, conditions)
+        sized = TurboFanBatch(flight=design, exact=exact, real_gas=real_gas, **inputs)
+        sized.performance()
+    engine_count = len(next(iter(engines.values()))) if engines else 1
+    mDota, d = np.broadcast_to(sized.mDota, (engine_count, 1)), np.broadcast_to(sized.d, (engine_count, 1))
+    design_flow = mDota * np.sqrt(sized.T01 / T_SL) / (sized.p01 / P_SL) # Design corrected air flow, [kg/s]
+    # Corrected air flow per newton of thrust at every condition, the required flow is this times the thrust
+    flow_per_N = np.sqrt(cycle.T01 / T_SL) / (cycle.p01 / P_SL) / F_m0
+    # Gathered to every step, (engines, missions, steps)
+    index = profile['condition']
+    TSFC, flow_per_N = (np.broadcast_to(values, (engine_count, len(M0)))[:, index] for values in (TSFC, flow_per_N))
+    T0, pa, a = isa(profile['altitude'])
+
+    q = Parameters.gamma_c / 2 * pa * 1e5 * profile['M0']**2 # Dynamic pressure of every step, [Pa]
+    qS = q * profile['S_W'][:, None]
+    V = profile['M0'] * a
+    shape = TSFC.shape[:2]
+    W = np.broadcast_to(profile['W_TO'], shape).copy() # [lbf]
+    impulse, distance, flow_ratio = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+    steps = profile['dt'].shape[1]
+    with Instrumentation.span('mission integration'), np.errstate(invalid='ignore'):
+        for k in range(steps):
+            dt = profile['dt'][:, k]
+            climb = profile['gradient'][:, k] + profile['acceleration'][:, k]
+            # Thrust [N] and fuel flow [kg/s] at a weight [lbf]
+            def thrust(W):
+                drag = drag_coefficient(W * LBF / qS[:, k]) * qS[:, k]
+                return np.maximum(drag + W * LBF * climb, IDLE * drag)
+            burn = lambda F: TSFC[..., k] * F / 1e6
+            F_start = thrust(W)
+            F_middle = thrust(W - burn(F_start) * dt / 2 * G0 / LBF)
+            W = W - burn(F_middle) * dt * G0 / LBF
+            impulse += F_middle * dt
+            distance += V[:, k] * dt
+            flow_ratio = np.fmax(flow_ratio, np.where(dt > 0, F_start * flow_per_N[..., k] / design_flow, np.nan))
+    W = np.where(W > 0, W, np.nan) # Missions that burn more than the take-off weight cannot be flown
+    fuel = (profile['W_TO'] - W) * LBF / G0 # [kg]
+    return {'fuel': fuel, 'time': np.broadcast_to(profile['dt'].sum(1), shape), 'range': distance / 1000, 'W_final': W,
+            'TSFC_mean': fuel / impulse * 1e6, 'flow_ratio': flow_ratio,
+            'mDota': np.broadcast_to(mDota, shape), 'd': np.broadcast_to(d, shape)}
+
+
+# Design flight condition from a spec entry: ISA 'altitude' with 'M0' and the other FlightCondition fields, or the fields
+# themselves. None gives the default cruise design point
+def design_point(entry=None):
+    if entry is None:
+        return FlightCondition()
+    entry = dict(entry)
+    if 'altitude' in entry:
+        return FlightCondition.at_altitude(entry.pop('altitude'), **entry)
+    return FlightCondition(**entry)
+
+
+# Fly every mission with every engine of the full-factorial grid over the engine axes (name -> values, see
+# Iterations/Sweep.py axis_values) with the fixed engine values, in chunks of about chunk_size engine x mission x step
+# points across a process pool. Returns a SweepResult over the engine axes and the missions
+@Instrumentation.instrumented('fly_missions')
+def fly_missions(engines, missions, fixed=None, design=None, chunk_size=CHUNK_SIZE, workers=None, exact=False,
+                 real_gas=False):
+    fixed = dict(fixed or {})
+    unknown = sorted((set(engines) | set(fixed)) - set(ENGINE_NAMES))
+    if unknown:
+        raise ValueError(f"Unknown engine parameters: {', '.join(unknown)}, expected some of: {', '.join(ENGINE_NAMES)}")
+    missions = [mission if isinstance(mission, Mission) else Mission.from_spec(mission) for mission in missions]
+    if not missions:
+        raise ValueError("No missions to fly")
+    design = design if isinstance(design, FlightCondition) else design_point(design)
+    dims = tuple(engines)
+    values = [axis_values(engines[dim]) for dim in dims]
+    shape = tuple(len(axis) for axis in values)
+    grid = {dim: axis.ravel() for dim, axis in zip(dims, np.meshgrid(*values, indexing='ij'))}
+    count = int(np.prod(shape))
+    profile = _profiles(missions)
+    rows = max(1, chunk_size // profile['dt'].size) # Engines per chunk, sized by the steps the integration works on
+    bounds = [(start, min(start + rows, count)) for start in range(0, count, rows)]
+    chunk = lambda start, stop: {dim: axis[start:stop] for dim, axis in grid.items()}
+
+    workers = workers or os.cpu_count()
+    if workers == 1 or len(bounds) == 1:
+        results = [_fly_chunk(chunk(start, stop), fixed, profile, design, exact, real_gas) for start, stop in bounds]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_fly_chunk, chunk(start, stop), fixed, profile, design, exact, real_gas)
+                       for start, stop in bounds]
+            results = [future.result() for future in futures]
+    data = {name: np.concatenate([result[name] for result in results]).reshape(shape + (len(missions),))
+            for name in MISSION_FIELDS}
+    coords = dict(zip(dims, values), mission=np.arange(len(missions), dtype=float))
+    return SweepResult(dims + ('mission',), coords, data, fixed)
+
+
+# Run a mission spec (see the module docstring). Engine entries with one value are held fixed, the others are swept
+def run_missions(spec):
+    engines, fixed = {}, {}
+    for name, entry in spec.get('engines', {}).items():
+        values = axis_values(entry)
+        if len(values) == 1:
+            fixed[name] = float(values[0])
+        else:
+            engines[name] = values
+    missions = [Mission.from_spec(mission) for mission in spec['missions']]
+    result = fly_missions(engines, missions, fixed, spec.get('design_point'), int(spec.get('chunk_size', CHUNK_SIZE)),
+                          spec.get('workers'), bool(spec.get('exact', False)), bool(spec.get('real_gas', False)))
+    return missions, result
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python Mission/FuelBurn.py spec.json results.npz")
+    missions, result = run_missions(load_spec(sys.argv[1]))
+    result.to_npz(sys.argv[2])
+    print(result)
+    for k, mission in enumerate(missions): # Lowest fuel burn engine of every mission
+        fuel = result['fuel'][..., k]
+        if np.all(np.isnan(fuel)):
+            print(f"{mission.name or k}: no engine completes the mission")
+            continue
+        best = np.unravel_index(np.nanargmin(fuel), fuel.shape)
+        engine = ', '.join(f"{dim}={result.coords[dim][i]:g}" for dim, i in zip(result.dims, best))
+        print(f"{mission.name or k}: {fuel[best]:.0f} kg in {result['time'][best + (k,)] / 3600:.2f} h over "
+              f"{result['range'][best + (k,)]:.0f} km, lowest with {engine or 'the fixed engine'} "
+              f"(flow ratio {result['flow_ratio'][best + (k,)]:.2f})")
@@ -0,0 +1,133 @@
+"""
+This code defines the component maps used by the off-design solver (OffDesign/OperatingLine.py). A map is a set of tables
+over two axes held in one stacked array, so a whole batch of operating points is interpolated with one gather:
+    - fan and compressor maps: relative corrected speed N (1 at the design point) and beta line (0 at choke, 1 at surge,
+      0.5 at the design point), with the tables 'flow' (corrected mass flow / design), 'ratio' ((PR - 1) / (PR_d - 1))
+      and 'efficiency' (polytropic efficiency / design)
+    - turbine maps: relative corrected speed N and relative pressure ratio q = (PR - 1) / (PR_d - 1), with the tables
+      'flow' and 'efficiency'
+Every value is relative to the design point, so one map can be scaled to any cycle. Interpolation is bicubic (cubic
+Hermite along both axes, with slopes from finite differences of the tables), so the values and their derivatives are
+continuous across cell edges, and it returns the value together with its analytic derivatives along both axes, which the
+Newton solver uses for its Jacobian (with bilinear cells the Jacobian jumps at every table line and Newton can cycle
+there). Outside the tables the maps are extended linearly from their edges; in_range flags those points.
+The generic maps below give smooth, typical shapes; measured maps are loaded from JSON with ComponentMap.from_json.
+
+    Map JSON:
+        {"speeds": [0.5, ..., 1.1], "lines": [0, ..., 1], "tables": {"flow": [[...], ...], "ratio": [[...], ...], ...}}
+"""
+import sys
+sys.path.append(".")
+import json
+import numpy as np
+
+SPEEDS = np.linspace(0.3, 1.2, 19) # Relative corrected speeds of the generic maps
+BETAS  = np.linspace(0., 1., 21)   # Beta lines of the generic fan and compressor maps
+RATIOS = np.linspace(0., 2., 41)   # Relative pressure ratios of the generic turbine maps
+
+
+class ComponentMap:
+    def __init__(self, speeds, lines, tables):
+        self.speeds = np.asarray(speeds, dtype=float) # Relative corrected speed axis
+        self.lines  = np.asarray(lines, dtype=float)  # Beta line or relative pressure ratio axis
+        self.names  = tuple(tables)
+        for name, axis in (('speeds', self.speeds), ('lines', self.lines)):
+            if axis.ndim != 1 or len(axis) < 2 or np.any(np.diff(axis) <= 0):
+                raise ValueError(f"Map {name} must be a strictly increasing 1-D axis of at least 2 values")
+        # Tables stacked into one (tables, speeds, lines) array, so a batch gathers the cell corners of every table at
+        # once, with the slopes along both axes and the cross slope the bicubic cells need
+        table = np.stack([np.asarray(tables[name], dtype=float) for name in self.names])
+        if table.shape[1:] != (len(self.speeds), len(self.lines)):
+            raise ValueError(f"Map tables must have the shape (speeds, lines) = {(len(self.speeds), len(self.lines))}, "
+                             f"not {table.shape[1:]}")
+        by_speed = np.gradient(table, self.speeds, axis=1)
+        self.table = np.stack([table, by_speed, np.gradient(table, self.lines, axis=2),
+                               np.gradient(by_speed, self.lines, axis=2)])
+
+    def __repr__(self):
+        return f"ComponentMap({len(self.speeds)} speeds x {len(self.lines)} lines; tables: {', '.join(self.names)})"
+
+    # Cell index, position within the cell (clipped to it) and cell width of every value along an axis
+    @staticmethod
+    def _locate(axis, x):
+        i = np.clip(np.searchsorted(axis, x, side='right') - 1, 0, len(axis) - 2)
+        width = axis[i + 1] - axis[i]
+        return i, np.clip((x - axis[i]) / width, 0., 1.), width
+
+    # Cubic Hermite weights of the values and slopes at both ends of a cell, and their derivatives along the axis
+    @staticmethod
+    def _hermite(t, width):
+        t2, t3 = t * t, t * t * t
+        values  = (2 * t3 - 3 * t2 + 1, 3 * t2 - 2 * t3)
+        slopes  = ((t3 - 2 * t2 + t) * width, (t3 - t2) * width)
+        dvalues = ((6 * t2 - 6 * t) / width, (6 * t - 6 * t2) / width)
+        dslopes = (3 * t2 - 4 * t + 1, 3 * t2 - 2 * t)
+        return values, slopes, dvalues, dslopes
+
+    # Interpolated tables at the speeds and lines (arrays of one shape). Returns table name -> (value, derivative along
+    # the speed axis, derivative along the line axis)
+    def __call__(self, speed, line):
+        speed, line = np.broadcast_arrays(np.asarray(speed, dtype=float), np.asarray(line, dtype=float))
+        i, t, dspeed = self._locate(self.speeds, speed)
+        j, u, dline  = self._locate(self.lines, line)
+        Vs, Ss, dVs, dSs = self._hermite(t, dspeed)
+        Vl, Sl, dVl, dSl = self._hermite(u, dline)
+        value = by_speed = by_line = cross = 0.
+        for a in (0, 1):
+            for b in (0, 1):
+                f, fs, fl, fsl = self.table[:, :, i + a, j + b] # Value, slopes and cross slope at the corner
+                value    = value + Vs[a] * Vl[b] * f + Ss[a] * Vl[b] * fs + Vs[a] * Sl[b] * fl + Ss[a] * Sl[b] * fsl
+                by_speed = by_speed + dVs[a] * Vl[b] * f + dSs[a] * Vl[b] * fs + dVs[a] * Sl[b] * fl + dSs[a] * Sl[b] * fsl
+                by_line  = by_line + Vs[a] * dVl[b] * f + Ss[a] * dVl[b] * fs + Vs[a] * dSl[b] * fl + Ss[a] * dSl[b] * fsl
+                cross    = cross + dVs[a] * dVl[b] * f + dSs[a] * dVl[b] * fs + dVs[a] * dSl[b] * fl + dSs[a] * dSl[b] * fsl
+        # Linear extension beyond the tables with the slopes at their edges, which along the edge vary with the other axis
+        beyond_speed = speed - np.clip(speed, self.speeds[0], self.speeds[-1])
+        beyond_line  = line - np.clip(line, self.lines[0], self.lines[-1])
+        value = value + by_speed * beyond_speed + by_line * beyond_line
+        by_speed, by_line = (by_speed + cross * np.where(beyond_speed == 0, beyond_line, 0.),
+                             by_line + cross * np.where(beyond_line == 0, beyond_speed, 0.))
+        return {name: (value[k], by_speed[k], by_line[k]) for k, name in enumerate(self.names)}
+
+    # Whether the points lie within the tables
+    def in_range(self, speed, line):
+        return ((speed >= self.speeds[0]) & (speed <= self.speeds[-1]) &
+                (line >= self.lines[0]) & (line <= self.lines[-1]))
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path) as file:
+            data = json.load(file)
+        return cls(data['speeds'], data['lines'], data['tables'])
+
+    def to_json(self, path):
+        with open(path, 'w') as file:
+            json.dump({'speeds': self.speeds.tolist(), 'lines': self.lines.tolist(),
+                       'tables': {name: table.tolist() for name, table in zip(self.names, self.table[0])}}, file)
+
+
+# Generic fan or compressor map: flow and pressure rise grow with speed, along a speed line the pressure rises and the
+# flow falls towards surge, over a wider flow range at low speed, and the efficiency falls away from the design speed and
+# beta line
+def compressor_map(speeds=SPEEDS, betas=BETAS, flow_exponent=1.2, ratio_exponent=2., flow_slope=0.3, choke_slope=1.2,
+                   ratio_slope=0.5):
+    N, beta = np.meshgrid(speeds, betas, indexing='ij')
+    flow       = N**flow_exponent * (1 + (flow_slope + choke_slope * (1 - N)) * (0.5 - beta))
+    ratio      = N**ratio_exponent * (1 + ratio_slope * (beta - 0.5))
+    efficiency = 1 - 0.4 * (N - 1)**2 - 0.3 * (beta - 0.5)**2
+    return ComponentMap(speeds, betas, {'flow': flow, 'ratio': ratio, 'efficiency': efficiency})
+
+
+# Generic fan map, a compressor map with flatter speed lines and a corrected flow proportional to speed, so the working
+# line set by the bypass nozzle stays within the map down to low power
+def fan_map(speeds=SPEEDS, betas=BETAS):
+    return compressor_map(speeds, betas, flow_exponent=1., ratio_slope=0.3)
+
+
+# Generic turbine map for a design pressure ratio: the corrected flow follows the ellipse law sqrt(1 - PR^-2), which
+# levels off as the turbine chokes, and depends only weakly on speed
+def turbine_map(pressure_ratio, speeds=SPEEDS, ratios=RATIOS):
+    N, q = np.meshgrid(speeds, ratios, indexing='ij')
+    PR = 1 + q * (pressure_ratio - 1)
+    flow       = np.sqrt(1 - PR**-2) / np.sqrt(1 - pressure_ratio**-2.) * (1 - 0.03 * (N - 1)**2)
+    efficiency = 1 - 0.3 * (N - 1)**2 - 0.1 * (q - 1)**2
+    return ComponentMap(speeds, ratios, {'flow': flow, 'efficiency': efficiency})
@@ -0,0 +1,390 @@
+"""
+This code solves the off-design operating point of the two-spool separate-flow turbofan of TurboFan / TurboFanBatch.
+The engine is first sized at its design point with the exact cycle (TurboFanBatch with exact=True): the design mass flows
+set the corrected flow capacities of the turbines and the areas of both nozzles, and the component maps
+(OffDesign/ComponentMaps.py) are scaled to the design pressure ratios and efficiencies. Away from the design point the
+turbine inlet temperature T04 (the throttle) and the flight condition are given, and six unknowns are matched:
+    N_f, beta_f     fan corrected speed and beta line
+    N_c, beta_c     compressor corrected speed and beta line
+    pi_hpt, pi_lpt  HP and LP turbine pressure ratios
+by six equations:
+    - mass-flow continuity: fan flow = core flow + cold nozzle flow, HP and LP turbine flow = their map flow,
+      hot nozzle flow = hot flow
+    - work balance of the HP spool (compressor and HP turbine) and of the LP spool (fan and LP turbine)
+The spool speeds follow from the corrected speeds, so the turbines run at the speed of the compressor they drive. The
+equations mirror the stage equations of the design cycle, so at the design point the solution is the design cycle.
+Every point of a batch is solved at once with Newton's method: the residuals and their Jacobian (derived analytically,
+through the map interpolation) are evaluated for all unconverged points together and the 6 x 6 systems are solved in one
+call. Steps are limited and backtracked per point, and every point reports whether it converged. A throttle line is solved
+as a continuation in T04 from the design point, warm-starting each setting from the nearest one solved.
+
+    Example spec:
+        {
+            "design": {"BPR": 10, "pi_f": 1.5, "pi_c": 36, "T04": 1560, "M0": 0.85, "altitude": 11000},
+            "T04": {"start": 1560, "stop": 1100, "num": 24},         # throttle line
+            "altitude": [0, 5000, 11000],                            # optional flight envelope, ISA altitudes [m]
+            "M0": [0.3, 0.6, 0.85]
+        }
+
+    Usage:
+        python OffDesign/OperatingLine.py spec.json results.npz
+"""
+import sys
+sys.path.append(".")
+import numpy as np
+from CycleAnalysis.TurboFanBatch import TurboFanBatch
+from OffDesign.ComponentMaps import fan_map, compressor_map, turbine_map
+from Parameters.Conditions import FlightCondition, EngineDesign, DESIGN_PARAMETER_NAMES, parameter_values
+from Iterations.Sweep import load_spec, axis_values
+from Tools.Eqns import n1_n, m1_m, total_temperature, pressure_ratio_n, get_TSFC
+import Tools.Instrumentation as Instrumentation
+
+UNKNOWNS  = ('N_f', 'beta_f', 'N_c', 'beta_c', 'pi_hpt', 'pi_lpt')
+RESIDUALS = ('bypass flow', 'HP turbine flow', 'LP turbine flow', 'hot nozzle flow', 'HP work', 'LP work')
+
+# Outputs of a solved operating point
+OFF_DESIGN_FIELDS = (
+    'T04', 'F', 'F_m0', 'TSFC', 'f', 'fuel', 'mDota', 'BPR',  # Throttle and performance
+    'pi_f', 'pi_c', 'N_L', 'N_H',                             # Fan, compressor and spool speeds
+    'T01', 'T02', 'T03', 'T05', 'T06',                        # Temperatures, [K]
+    'p01', 'p02', 'p04', 'p05', 'p06',                        # Pressures, [bar]
+    'C7', 'C8', 'Ca',                                         # Velocities, [m/s]
+)
+
+TOL         = 1e-10 # Largest scaled residual of a converged point
+MAX_ITER    = 50
+LINE_SEARCH = 8     # Step halvings tried per Newton iteration
+MAX_STEP    = 0.2   # Largest change of a relative speed or beta line per iteration
+_UNIT       = np.eye(len(UNKNOWNS)) # Derivatives of the unknowns themselves
+
+
+# Nozzle flow function m sqrt(T0) / (A p0), up to a constant, and its derivative by the pressure ratio p0/p_exit.
+# The nozzle chokes above the critical pressure ratio and passes no flow below 1
+def _flow_function(ratio, gamma):
+    critical = ((gamma + 1) / 2)**(gamma / (gamma - 1))
+    P = np.clip(ratio, 1., critical)
+    value = np.sqrt(P**(-2 / gamma) - P**(-(gamma + 1) / gamma))
+    slope = (-2 / gamma * P**(-2 / gamma - 1) + (gamma + 1) / gamma * P**(-(gamma + 1) / gamma - 1)) / (2 * np.where(value > 0, value, 1.))
+    return value, np.where((ratio > 1.) & (ratio < critical), slope, 0.)
+
+
+class OffDesignResult:
+    def __init__(self, shape, x, outputs, converged, iterations, residual):
+        self.shape      = shape
+        self.x          = x          # Solved unknowns, array of shape + (6,) in the order of UNKNOWNS
+        self.outputs    = outputs    # Output name -> array, see OFF_DESIGN_FIELDS
+        self.converged  = converged  # Per-point convergence flags
+        self.iterations = iterations # Newton iterations per point
+        self.residual   = residual   # Largest scaled residual per point
+
+    def __getitem__(self, name):
+        if name in UNKNOWNS:
+            return self.x[..., UNKNOWNS.index(name)]
+        return self.outputs[name]
+
+    def __repr__(self):
+        return f"OffDesignResult(shape {self.shape}, {int(self.converged.sum())} of {self.converged.size} points converged)"
+
+    def to_frame(self):
+        import pandas as pd # Only needed for reporting
+        columns = {name: self[name].ravel() for name in UNKNOWNS + tuple(self.outputs)}
+        return pd.DataFrame(dict(columns, converged=self.converged.ravel(), iterations=self.iterations.ravel()))
+
+    def to_npz(self, path):
+        np.savez(path, **{name: self[name] for name in UNKNOWNS + tuple(self.outputs)},
+                 converged=self.converged, iterations=self.iterations, residual=self.residual)
+
+
+class OffDesignEngine:
+    def __init__(self, BPR=10, pi_f=1.5, pi_c=36., flight=None, design=None, fan=None, compressor=None, hpt=None, lpt=None):
+        self.flight = flight or FlightCondition() # Design flight condition
+        self.design = design or EngineDesign()    # Engine constants, T04 is the design turbine inlet temperature
+        constants = parameter_values(self.flight, self.design)
+        if any(np.ndim(value) for value in (BPR, pi_f, pi_c, *constants.values())):
+            raise ValueError("The design point of an off-design engine must be a single point, not arrays")
+        for name, value in constants.items():
+            setattr(self, name, float(value))
+        self.BPR, self.pi_f, self.pi_c = float(BPR), float(pi_f), float(pi_c)
+        point = TurboFanBatch(BPR, pi_f, pi_c, self.flight, self.design, exact=True)
+        point.performance()
+        self.point = {name: float(value) for name, value in point.stations().items()} # Design station values
+        if not np.isfinite(self.point['mDota']):
+            raise ValueError("The cycle has no solution at the design point")
+        p = self.point
+        self.W_fan  = p['mDota']                              # Design mass flows, [kg/s]
+        self.W_core = p['mDota'] / (self.BPR + 1)
+        self.W_hot  = self.W_core + p['f_act'] * p['mDota']
+        self.W_cold = p['mDota'] * self.BPR / (self.BPR + 1)
+        self.pi_hpt = p['p04'] / p['p05']                     # Design turbine pressure ratios
+        self.pi_lpt = p['p05'] / p['p06']
+        self.fan        = fan or fan_map()
+        self.compressor = compressor or compressor_map()
+        self.hpt        = hpt or turbine_map(self.pi_hpt)
+        self.lpt        = lpt or turbine_map(self.pi_lpt)
+        # Flow capacities sized to pass the design flows
+        self.K4 = self.W_hot * np.sqrt(self.T04) / p['p04']
+        self.K5 = self.W_hot * np.sqrt(p['T05']) / p['p05']
+        self.A8 = self.W_cold * np.sqrt(p['T02']) / (p['p02'] * _flow_function(p['p02'] / self.p8, self.gamma_c)[0])
+        self.A7 = self.W_hot * np.sqrt(p['T06']) / (p['p06'] * _flow_function(p['p06'] / self.p7, self.gamma_h)[0])
+        self.HP_work = self.W_core * self.c_pa * p['DeltaT023'] # Design spool works, scale the work residuals
+        self.LP_work = self.W_fan * self.c_pa * p['DeltaT012']
+        self.guess = np.array([1., 0.5, 1., 0.5, self.pi_hpt, self.pi_lpt]) # Design point unknowns
+
+    def __repr__(self):
+        return f"OffDesignEngine(BPR={self.BPR:g}, pi_f={self.pi_f:g}, pi_c={self.pi_c:g}, T04={self.T04:g})"
+
+    # Scaled residuals (points, 6) of the matching equations at the unknowns x (points, 6) and, with jacobian=True, their
+    # Jacobian (points, 6, 6). With stations=True also returns the station values of the points
+    def match(self, x, T01, p01, T04, p7, p8, jacobian=True, stations=False):
+        p, E = self.point, _UNIT
+        N_f, beta_f, N_c, beta_c, pi_hpt, pi_lpt = x.T
+        col = lambda a: a[:, None]
+        grad = lambda table, i, j: col(table[1]) * E[i] + col(table[2]) * E[j] # Gradient of a map value
+
+        # Fan
+        fan = self.fan(N_f, beta_f)
+        PR_f  = 1 + fan['ratio'][0] * (self.pi_f - 1)
+        dPR_f = (self.pi_f - 1) * grad(fan['ratio'], 0, 1)
+        n_f   = n1_n(self.n_inff * fan['efficiency'][0], self.gamma_c, exact=True)
+        dn_f  = -col(n_f / fan['efficiency'][0]) * grad(fan['efficiency'], 0, 1)
+        T02   = T01 * PR_f**n_f
+        dT02  = col(T02) * (dn_f * col(np.log(PR_f)) + col(n_f / PR_f) * dPR_f)
+        p02   = PR_f * p01
+        dp02  = dPR_f / col(PR_f) # Relative derivative, d(p02)/p02
+        fan_capacity = self.W_fan * (p01 / p['p01']) * np.sqrt(p['T01'] / T01)
+        W_fan  = fan_capacity * fan['flow'][0]
+        dW_fan = col(fan_capacity) * grad(fan['flow'], 0, 1)
+
+        # Compressor
+        comp = self.compressor(N_c, beta_c)
+        PR_c  = 1 + comp['ratio'][0] * (self.pi_c - 1)
+        dPR_c = (self.pi_c - 1) * grad(comp['ratio'], 2, 3)
+        n_c   = n1_n(self.n_infc * comp['efficiency'][0], self.gamma_c, exact=True)
+        dn_c  = -col(n_c / comp['efficiency'][0]) * grad(comp['efficiency'], 2, 3)
+        T03   = T02 * PR_c**n_c
+        dT03  = col(T03) * (dT02 / col(T02) + dn_c * col(np.log(PR_c)) + col(n_c / PR_c) * dPR_c)
+        p04   = self.pi_b * PR_c * p02
+        dp04  = dPR_c / col(PR_c) + dp02
+        W_core  = self.W_core * comp['flow'][0] * (p02 / p['p02']) * np.sqrt(p['T02'] / T02)
+        dW_core = col(W_core) * (dp02 - 0.5 * dT02 / col(T02)) + col(W_core / comp['flow'][0]) * grad(comp['flow'], 2, 3)
+
+        # Combustor, fuel flow is f times the total air flow as in the design cycle
+        f  = (self.c_pg * T04 - self.c_pa * T03) / (self.h_fuel - self.c_pg * T04) / self.n_b
+        df = -col(self.c_pa / ((self.h_fuel - self.c_pg * T04) * self.n_b)) * dT03
+        W_hot  = W_core + f * W_fan
+        dW_hot = dW_core + df * col(W_fan) + col(f) * dW_fan
+
+        # HP turbine, on the HP spool
+        N_h   = N_c * np.sqrt(T02 / p['T02']) / np.sqrt(T04 / self.T04)
+        dN_h  = col(N_h) * (E[2] / col(N_c) + 0.5 * dT02 / col(T02))
+        hpt   = self.hpt(N_h, (pi_hpt - 1) / (self.pi_hpt - 1))
+        dw_h  = col(hpt['flow'][1]) * dN_h + col(hpt['flow'][2] / (self.pi_hpt - 1)) * E[4]
+        de_h  = col(hpt['efficiency'][1]) * dN_h + col(hpt['efficiency'][2] / (self.pi_hpt - 1)) * E[4]
+        m_h   = m1_m(self.n_inft * hpt['efficiency'][0], self.gamma_h, exact=True)
+        dm_h  = col(m_h / hpt['efficiency'][0]) * de_h
+        T05   = T04 * pi_hpt**-m_h
+        dT05  = col(T05) * (-dm_h * col(np.log(pi_hpt)) - col(m_h / pi_hpt) * E[4])
+        p05   = p04 / pi_hpt
+        dp05  = dp04 - E[4] / col(pi_hpt)
+
+        # LP turbine, on the LP spool
+        N_l   = N_f * np.sqrt(T01 / p['T01']) / np.sqrt(T05 / p['T05'])
+        dN_l  = col(N_l) * (E[0] / col(N_f) - 0.5 * dT05 / col(T05))
+        lpt   = self.lpt(N_l, (pi_lpt - 1) / (self.pi_lpt - 1))
+        dw_l  = col(lpt['flow'][1]) * dN_l + col(lpt['flow'][2] / (self.pi_lpt - 1)) * E[5]
+        de_l  = col(lpt['efficiency'][1]) * dN_l + col(lpt['efficiency'][2] / (self.pi_lpt - 1)) * E[5]
+        m_l   = m1_m(self.n_inft * lpt['efficiency'][0], self.gamma_h, exact=True)
+        dm_l  = col(m_l / lpt['efficiency'][0]) * de_l
+        T06   = T05 * pi_lpt**-m_l
+        dT06  = col(T06) * (dT05 / col(T05) - dm_l * col(np.log(pi_lpt)) - col(m_l / pi_lpt) * E[5])
+        p06   = p05 / pi_lpt
+        dp06  = dp05 - E[5] / col(pi_lpt)
+
+        # Nozzles
+        phi8, dphi8 = _flow_function(p02 / p8, self.gamma_c)
+        W8  = self.A8 * p02 * phi8 / np.sqrt(T02)
+        dW8 = col(W8) * (dp02 - 0.5 * dT02 / col(T02)) + col(self.A8 * p02 / np.sqrt(T02) * dphi8 * p02 / p8) * dp02
+        phi7, dphi7 = _flow_function(p06 / p7, self.gamma_h)
+        W7  = self.A7 * p06 * phi7 / np.sqrt(T06)
+        dW7 = col(W7) * (dp06 - 0.5 * dT06 / col(T06)) + col(self.A7 * p06 / np.sqrt(T06) * dphi7 * p06 / p7) * dp06
+
+        # Residuals, flows scaled by the design flows and works by the design works
+        capacity4 = np.sqrt(T04) / (p04 * self.K4)
+        capacity5 = np.sqrt(T05) / (p05 * self.K5)
+        HP = W_core * self.c_pa * (T03 - T02) - self.n_m * self.c_pg * W_hot * (T04 - T05)
+        LP = W_fan * self.c_pa * (T02 - T01) - self.n_m * self.c_pg * W_hot * (T05 - T06)
+        residuals = np.stack([
+            (W_fan - W_core - W8) / self.W_fan,
+            W_hot * capacity4 - hpt['flow'][0],
+            W_hot * capacity5 - lpt['flow'][0],
+            (W_hot - W7) / self.W_hot,
+            HP / self.HP_work,
+            LP / self.LP_work,
+        ], axis=1)
+        results = [residuals]
+        if jacobian:
+            results.append(np.stack([
+                (dW_fan - dW_core - dW8) / self.W_fan,
+                col(capacity4) * (dW_hot - col(W_hot) * dp04) - dw_h,
+                col(capacity5) * (dW_hot + col(W_hot) * (0.5 * dT05 / col(T05) - dp05)) - dw_l,
+                (dW_hot - dW7) / self.W_hot,
+                (dW_core * col(self.c_pa * (T03 - T02)) + col(W_core * self.c_pa) * (dT03 - dT02)
+                 - self.n_m * self.c_pg * (dW_hot * col(T04 - T05) - col(W_hot) * dT05)) / self.HP_work,
+                (dW_fan * col(self.c_pa * (T02 - T01)) + col(W_fan * self.c_pa) * dT02
+                 - self.n_m * self.c_pg * (dW_hot * col(T05 - T06) + col(W_hot) * (dT05 - dT06))) / self.LP_work,
+            ], axis=1))
+        if stations:
+            in_map = (self.fan.in_range(N_f, beta_f) & self.compressor.in_range(N_c, beta_c) &
+                      self.hpt.in_range(N_h, (pi_hpt - 1) / (self.pi_hpt - 1)) &
+                      self.lpt.in_range(N_l, (pi_lpt - 1) / (self.pi_lpt - 1)))
+            results.append({'T04': T04, 'T01': T01, 'T02': T02, 'T03': T03, 'T05': T05, 'T06': T06, 'p01': p01, 'p02': p02,
+                            'p04': p04, 'p05': p05, 'p06': p06, 'pi_f': PR_f, 'pi_c': PR_c, 'f': f, 'W_fan': W_fan,
+                            'W_core': W_core, 'W_hot': W_hot, 'W_cold': W8, 'in_map': in_map})
+        return results[0] if len(results) == 1 else tuple(results)
+
+    # Newton steps of every point, singular systems are solved in the least-squares sense
+    @staticmethod
+    def _newton_step(J, r):
+        try:
+            return np.linalg.solve(J, -r[..., None])[..., 0]
+        except np.linalg.LinAlgError:
+            return np.stack([np.linalg.lstsq(Jk, -rk, rcond=None)[0] for Jk, rk in zip(J, r)])
+
+    # Largest fraction of each step that keeps the speeds positive, the turbine pressure ratios above 1 and the change
+    # of the speeds and beta lines within MAX_STEP
+    @staticmethod
+    def _step_limit(x, dx):
+        limit = np.minimum(1., MAX_STEP / np.maximum(np.abs(dx[:, :4]).max(axis=1), 1e-300))
+        floor = np.array([0.05, -np.inf, 0.05, -np.inf, 1., 1.])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            room = np.where(dx < 0, 0.9 * (x - floor) / -dx, np.inf)
+        return np.minimum(limit, np.nanmin(room, axis=1))
+
+    # Solve the operating points at the turbine inlet temperatures T04 and flight conditions (arrays broadcast together).
+    # guess is an array of unknowns (broadcastable to the points + (6,)) or a previous OffDesignResult, default the
+    # design point
+    def solve(self, T04=None, flight=None, guess=None, tol=TOL, max_iter=MAX_ITER):
+        flight = flight or self.flight
+        T04 = self.T04 if T04 is None else T04
+        values = np.broadcast_arrays(*(np.asarray(value, dtype=float) for value in
+                                       (T04, flight.M0, flight.T0, flight.pa, flight.p7, flight.p8)))
+        shape = values[0].shape
+        T04, M0, T0, pa, p7, p8 = (value.ravel() for value in values)
+        T01 = total_temperature(M0, T0, self.gamma_c)
+        p01 = pressure_ratio_n(M0, self.n_i, self.gamma_c) * pa
+        state = (T01, p01, T04, p7, p8)
+        guess = self.guess if guess is None else guess.x if isinstance(guess, OffDesignResult) else guess
+        x = np.broadcast_to(np.asarray(guess, dtype=float), shape + (len(UNKNOWNS),)).reshape(-1, len(UNKNOWNS)).copy()
+        iterations = np.zeros(len(x), dtype=int)
+        nfev = np.zeros(len(x), dtype=int)
+        active = np.arange(len(x))
+
+        with Instrumentation.span('off-design Newton'), np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            for _ in range(max_iter):
+                r, J = self.match(x[active], *(value[active] for value in state))
+                nfev[active] += 1
+                norm = np.abs(r).max(axis=1)
+                keep = (norm >= tol) & np.isfinite(norm) & np.isfinite(J).all(axis=(1, 2))
+                active, r, J, norm = active[keep], r[keep], J[keep], norm[keep]
+                if not active.size:
+                    break
+                dx = self._newton_step(J, r)
+                alpha = self._step_limit(x[active], dx)
+                # Backtrack every point whose residual does not fall, the last halving is taken regardless
+                pending = np.arange(len(active))
+                for _ in range(LINE_SEARCH):
+                    rows = active[pending]
+                    trial = x[rows] + alpha[pending, None] * dx[pending]
+                    trial_norm = np.abs(self.match(trial, *(value[rows] for value in state), jacobian=False)).max(axis=1)
+                    nfev[rows] += 1
+                    better = trial_norm < (1 - 1e-4 * alpha[pending]) * norm[pending]
+                    x[rows[better]] = trial[better]
+                    pending = pending[~better]
+                    alpha[pending] /= 2
+                    if not pending.size:
+                        break
+                x[active[pending]] += alpha[pending, None] * dx[pending]
+                iterations[active] += 1
+
+            r, outputs = self.match(x, *state, jacobian=False, stations=True)
+        residual = np.abs(r).max(axis=1)
+        converged = residual < tol
+        Instrumentation.record_solver('off-design Newton', nfev, converged, iterations)
+        return OffDesignResult(shape, x.reshape(shape + (len(UNKNOWNS),)), self._performance(x, outputs, M0, T0, p7, p8, shape),
+                               converged.reshape(shape), iterations.reshape(shape), residual.reshape(shape))
+
+    # Thrust, fuel consumption and the other outputs of solved points, with the nozzle velocities of the design cycle
+    def _performance(self, x, s, M0, T0, p7, p8, shape):
+        p = self.point
+        Ca = M0 * np.sqrt(self.gamma_c * self.R * T0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            C8 = np.sqrt(2 * self.c_p * self.n_j * s['T02'] * (1 - (p8 / s['p02'])**((self.gamma_c - 1) / self.gamma_c)))
+            C7 = np.sqrt(2 * self.c_pg * 1000 * self.n_j * s['T06'] * (1 - (p7 / s['p06'])**((self.gamma_h - 1) / self.gamma_h)))
+            F = s['W_cold'] * (C8 - Ca) + s['W_hot'] * (C7 - Ca) # Net thrust, [N]
+            outputs = {
+                'F': F, 'F_m0': F / s['W_fan'], 'TSFC': get_TSFC(s['f'], F, s['W_fan']), 'f': s['f'],
+                'fuel': s['f'] * s['W_fan'], 'mDota': s['W_fan'], 'BPR': s['W_cold'] / s['W_core'],
+                'pi_f': s['pi_f'], 'pi_c': s['pi_c'],
+                'N_L': x[:, 0] * np.sqrt(s['T01'] / p['T01']), 'N_H': x[:, 2] * np.sqrt(s['T02'] / p['T02']),
+                'C7': C7, 'C8': C8, 'Ca': Ca, 'in_map': s['in_map'],
+            }
+        outputs.update({name: s[name] for name in OFF_DESIGN_FIELDS if name not in outputs})
+        return {name: np.reshape(np.broadcast_to(value, x.shape[:1]), shape) for name, value in outputs.items()}
+
+    # Throttle line: the operating points at every T04 in T04s (1-D) for the flight conditions (arrays of any shape),
+    # solved as a continuation from the design T04, each setting warm-started from the nearest setting already solved.
+    # The result has the flight condition shape + (len(T04s),)
+    def operating_line(self, T04s, flight=None, tol=TOL, max_iter=MAX_ITER):
+        flight = flight or self.flight
+        T04s = np.asarray(T04s, dtype=float)
+        solved = {}
+        for k in np.argsort(np.abs(T04s - self.T04), kind='stable'):
+            nearest = min(solved, key=lambda j: abs(T04s[j] - T04s[k]), default=None)
+            solved[k] = self.solve(T04s[k], flight, solved.get(nearest), tol, max_iter)
+        results = [solved[k] for k in range(len(T04s))]
+        stack = lambda arrays: np.stack(arrays, axis=-1)
+        return OffDesignResult(results[0].shape + (len(T04s),), np.stack([result.x for result in results], axis=-2),
+                               {name: stack([result.outputs[name] for result in results]) for name in results[0].outputs},
+                               stack([result.converged for result in results]), stack([result.iterations for result in results]),
+                               stack([result.residual for result in results]))
+
+
+# Design engine of a spec: the cycle design variables, any EngineDesign constant, and the design flight condition as
+# 'M0' with 'altitude' (ISA) or 'T0' and 'pa'
+def design_engine(design):
+    design = dict(design)
+    constants = EngineDesign(**{name: design.pop(name) for name in DESIGN_PARAMETER_NAMES if name in design})
+    cycle = {name: design.pop(name) for name in ('BPR', 'pi_f', 'pi_c') if name in design}
+    if 'altitude' in design:
+        flight = FlightCondition.at_altitude(design.pop('altitude'), **design)
+    else:
+        flight = FlightCondition(**design)
+    return OffDesignEngine(flight=flight, design=constants, **cycle)
+
+
+# Run an off-design spec, see the module docstring for its keys. Returns the engine and the throttle lines over the
+# altitude x M0 grid (or at the design flight condition)
+def run_off_design(spec):
+    engine = design_engine(spec.get('design', {}))
+    T04s = axis_values(spec['T04']) if 'T04' in spec else [engine.T04]
+    flight = engine.flight
+    if 'altitude' in spec or 'M0' in spec:
+        altitudes = np.asarray(spec.get('altitude', [engine.flight.altitude or 0.]), dtype=float)
+        machs = np.asarray(spec.get('M0', [engine.M0]), dtype=float)
+        flight = FlightCondition.at_altitude(altitudes[:, None], M0=machs[None, :])
+    return engine, engine.operating_line(T04s, flight)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python OffDesign/OperatingLine.py spec.json results.npz")
+    engine, result = run_off_design(load_spec(sys.argv[1]))
+    result.to_npz(sys.argv[2])
+    print(engine)
+    print(result)
+    line = (0,) * (len(result.shape) - 1) # Throttle line at the first flight condition
+    columns = ('T04', 'F', 'TSFC', 'mDota', 'BPR', 'pi_f', 'pi_c', 'N_L', 'N_H')
+    print(''.join(f"{name:>10s}" for name in columns))
+    for k in range(result.shape[-1]):
+        print(''.join(f"{result[name][line + (k,)]:10.4g}" for name in columns) +
+              ('' if result.converged[line + (k,)] else '  not converged'))
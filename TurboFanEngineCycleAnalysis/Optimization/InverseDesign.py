@@ -0,0 +1,340 @@
+"""
+This code solves inverse design problems of the TurboFan cycle for whole batches of design points: the value of one cycle
+input (the variable, e.g. pi_f, BPR or T04) at which an output meets a target, e.g.
+    - the pi_f or BPR that gives a target fan diameter d or specific thrust F_m0
+    - the T04 that gives a required thrust F at a given air mass flow (F = F_m0 x mass_flow)
+Every point is solved at once by a vectorized, safeguarded Newton method on the exact (unrounded) model: each iteration is
+one complex-step TurboFanBatch call over the points still unconverged, which gives the output and its derivative by the
+variable together. Each point keeps a bracket [lo, hi] on which the output crosses the target, the half of the bounds on
+either side of the guess where it does (the side of the first Newton step first, so the guess picks the branch where the
+output is not monotonic), tightened with every iterate; a Newton step that leaves the bracket or does not shrink fast
+enough is replaced by a bisection, so every bracketed point converges. Where the cycle has no solution at a bound end, the
+edge of the region where it has one is found by bisection between that end and the guess, and the bracket reaches out
+to it. Guesses where the cycle has no solution are first moved towards the bounds until it has one, guesses that already
+meet the target count as converged, and where neither half brackets the target (two roots on one side of the guess) the
+solver walks out from the guess with limited Newton steps until the sign changes. Every point reports whether it was
+bracketed and converged, its iterations and its residual.
+Guesses come from the baseline value of the variable, the middle of the bounds, a previous InverseResult (guess=) or, for
+batches of more than WARM_POINTS points, from a coarse pass: every few points along each axis are solved first and every
+point starts from the solution of its nearest coarse point, so neighbouring points reuse converged solutions and most
+points converge in two or three iterations. Warm-started points left unbracketed are solved again from their own
+guesses.
+
+    Example spec:
+        {
+            "solve":      "pi_f",                                          # variable
+            "output":     "d",                                             # any output, station quantity or "F"
+            "target":     {"start": 2.0, "stop": 2.6, "num": 61},         # a value or axis of values
+            "bounds":     [1.1, 1.8],                                      # optional, default from BOUNDS
+            "parameters": {"BPR": {"start": 6, "stop": 14, "num": 81}},   # optional swept inputs (grid axes)
+            "baseline":   {"pi_c": 36.0, "T04": 1560},                     # fixed values of the other inputs
+            "mass_flow":  600                                              # air mass flow [kg/s] for "F" targets
+        }
+
+    Usage:
+        python Optimization/InverseDesign.py Optimization/InverseSpec.json results.npz
+"""
+import sys
+sys.path.append(".")
+import numpy as np
+from CycleAnalysis.TurboFanBatch import TurboFanBatch, DESIGN_NAMES, PARAMETER_NAMES, STATION_FIELDS, PERFORMANCE_FIELDS
+from Iterations.Sweep import load_spec, axis_values
+import Tools.Instrumentation as Instrumentation
+
+INPUTS   = DESIGN_NAMES + PARAMETER_NAMES
+TARGETS  = PERFORMANCE_FIELDS + STATION_FIELDS + ('F',)
+BOUNDS   = {'BPR': (1., 30.), 'pi_f': (1.05, 3.), 'pi_c': (5., 60.), 'T04': (1000., 2200.)} # Default variable bounds
+REPORTED = PERFORMANCE_FIELDS + ('mDota', 'd') # Outputs returned at the solutions
+TOL         = 1e-10 # Largest residual of a converged point, relative to the target
+XTOL        = 1e-13 # Bracket width of a converged point, relative to the variable
+MAX_ITER    = 50
+STEP        = 1e-30 # Complex step
+IMAG_LIMIT  = 1e-10 # Larger imaginary parts of the output come from complex square roots, where the cycle has no solution
+BRACKET     = 30    # Bisections of the feasibility edge between a bound end without a cycle solution and the guess
+STEP_OUT    = 60    # Steps of the walk out from the guess where neither half of the bounds brackets the target
+WARM_POINTS = 4096  # Batches above this size are warm-started from a coarse pass of about this many points
+
+
+class InverseResult:
+    def __init__(self, variable, output, shape, x, converged, bracketed, iterations, residual, outputs):
+        self.variable   = variable
+        self.output     = output
+        self.shape      = shape
+        self.x          = x          # Solved variable, the last iterate where a point did not converge
+        self.converged  = converged  # Per-point convergence flags
+        self.bracketed  = bracketed  # Whether the output crosses the target within the bounds
+        self.iterations = iterations # Newton or bisection iterations per point
+        self.residual   = residual   # |output - target| / |target| per point
+        self.outputs    = outputs    # Output name -> array at the solutions, see REPORTED
+
+    def __getitem__(self, name):
+        return self.x if name == self.variable else self.outputs[name]
+
+    def __repr__(self):
+        return (f"InverseResult({self.variable} for {self.output}, shape {self.shape}: "
+                f"{int(self.converged.sum())} of {self.converged.size} points converged)")
+
+    def to_frame(self):
+        import pandas as pd # Only needed for reporting
+        columns = {self.variable: self.x.ravel()}
+        columns.update({name: np.ravel(array) for name, array in self.outputs.items() if name != self.variable})
+        return pd.DataFrame(dict(columns, converged=self.converged.ravel(), iterations=self.iterations.ravel()))
+
+    def to_npz(self, path):
+        np.savez(path, **{name: array for name, array in self.outputs.items() if name != self.variable},
+                 **{self.variable: self.x}, converged=self.converged, bracketed=self.bracketed,
+                 iterations=self.iterations, residual=self.residual)
+
+
+# Array entries of a points dict at the given flat indices, scalars as they are
+def _take(values, index):
+    return {name: value if np.ndim(value) == 0 else value[index] for name, value in values.items()}
+
+
+class _Problem:
+    def __init__(self, variable, output, inputs, mass_flow, real_gas):
+        self.variable  = variable
+        self.output    = output
+        self.inputs    = inputs    # Cycle inputs, flat arrays over the points or scalars
+        self.mass_flow = mass_flow # Air mass flow of the points for thrust targets
+        self.real_gas  = real_gas
+        self.nfev      = 0
+
+    # Output of the exact cycle at the variable values x of the points index. With slope=True x is given a complex step,
+    # and the output and its derivative come from the one batch; NaN where the cycle has no solution
+    def __call__(self, x, index, slope=True, outputs=None):
+        inputs = dict(_take(self.inputs, index), **{self.variable: x + 1j * STEP if slope else x})
+        engine = TurboFanBatch(exact=True, real_gas=self.real_gas, **inputs)
+        performance = dict(zip(PERFORMANCE_FIELDS, engine.performance()))
+        self.nfev += 1
+        value = lambda name: np.broadcast_to(performance[name] if name in performance else getattr(engine, name), np.shape(x))
+        if outputs is not None:
+            return {name: value(name) for name in outputs}
+        if self.output == 'F':
+            y = value('F_m0') * (self.mass_flow if np.ndim(self.mass_flow) == 0 else self.mass_flow[index])
+        else:
+            y = value(self.output)
+        if not slope:
+            return y
+        infeasible = ~(np.abs(y.imag) < IMAG_LIMIT)
+        return np.where(infeasible, np.nan, y.real), np.where(infeasible, np.nan, y.imag / STEP)
+
+
+# Safeguarded Newton iterations of every point (flat arrays) for problem(x) = target within lo..hi from the guesses x.
+# Returns the solutions, convergence and bracket flags, iterations and relative residuals
+def _solve(problem, target, lo, hi, x, tol=TOL, max_iter=MAX_ITER):
+    n = len(x)
+    scale = np.where(target != 0, np.abs(target), 1.)
+    g, slope = problem(x, np.arange(n))
+    g = g - target
+    # Guesses where the cycle has no solution are moved towards the lower, then the upper bound, halving the distance
+    # left each time, until it has one
+    for bound in (lo, hi):
+        index = np.flatnonzero(np.isnan(g))
+        start, fraction = x[index], 0.5
+        for _ in range(BRACKET):
+            if not index.size:
+                break
+            trial = start + (bound[index] - start) * fraction
+            value, trial_slope = problem(trial, index)
+            feasible = np.isfinite(value)
+            x[index[feasible]], g[index[feasible]] = trial[feasible], value[feasible] - target[index[feasible]]
+            slope[index[feasible]] = trial_slope[feasible]
+            index, start, fraction = index[~feasible], start[~feasible], (1 + fraction) / 2
+    # The guess splits the bounds, the half on the side of the Newton step is tried first and the other half only where
+    # the sign does not change on the first (the output is not monotonic in the variable there, and the guess picks the
+    # branch). Where the cycle has no solution at a bound end, the interval between the last end without one (outside)
+    # and the first with one (the guess to begin with) is bisected, the end moving to every midpoint with a solution,
+    # until the sign changes there or the end is at the edge of the region with solutions
+    lo, hi = lo.copy(), hi.copy()
+    lower, upper = np.zeros(n, dtype=bool), np.zeros(n, dtype=bool)
+    sign_lo = np.sign(g)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        downward = g / slope > 0
+    met = np.abs(g) <= tol * scale # Guesses that already meet the target, e.g. warm starts from converged neighbours
+    finite = np.flatnonzero(np.isfinite(g) & ~met)
+    for first in (True, False):
+        check = finite[~(lower | upper)[finite]]
+        for bound, side, found in ((lo, downward[check] == first, lower), (hi, downward[check] != first, upper)):
+            index = check[side]
+            value = problem(bound[index], index, slope=False) - target[index]
+            searching = np.flatnonzero(np.isnan(value)) # Positions in index of the ends being moved to the edge
+            outside = bound[index[searching]]
+            bound[index[searching]], value[searching] = x[index[searching]], g[index[searching]]
+            for _ in range(BRACKET):
+                if not searching.size:
+                    break
+                points = index[searching]
+                middle = (outside + bound[points]) / 2
+                middle_value = problem(middle, points, slope=False) - target[points]
+                feasible = np.isfinite(middle_value)
+                outside = np.where(feasible, outside, middle)
+                bound[points[feasible]], value[searching[feasible]] = middle[feasible], middle_value[feasible]
+                keep = ~(feasible & (np.sign(middle_value) != np.sign(g[points]))) # Bracketed points stop here
+                searching, outside = searching[keep], outside[keep]
+            found[index] = np.isfinite(value) & (np.sign(value) != np.sign(g[index]))
+            if found is lower:
+                sign_lo[index] = np.sign(value)
+    # Where neither half changes sign, the guess can sit just past a root with another root further on (two roots in the
+    # half on that side), or two roots lie close together. Walks out from the guess, in the Newton direction first, with
+    # steps of 1.5 Newton steps while those point the way of the walk, at most a step size doubled at every step, until
+    # the sign changes or the target is met, the bound is reached or the cycle has no solution
+    for forward in (True, False):
+        index = finite[~(lower | upper | met)[finite]]
+        y, gy, sy = x[index], g[index], slope[index]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            down = downward[index] == forward
+            size = np.abs(gy / sy) * 2
+        size = np.where(np.isfinite(size) & (size > 0), size, (hi[index] - lo[index]) * 1e-6)
+        for _ in range(STEP_OUT):
+            if not index.size:
+                break
+            with np.errstate(invalid='ignore', divide='ignore'):
+                newton = -gy / sy
+            towards = np.isfinite(newton) & ((newton < 0) == down)
+            step = np.where(towards, np.minimum(size, 1.5 * np.abs(newton)), size)
+            trial = np.clip(np.where(down, y - step, y + step), lo[index], hi[index])
+            value, trial_slope = problem(trial, index)
+            value = value - target[index]
+            hit = np.abs(value) <= tol * scale[index]
+            x[index[hit]], g[index[hit]], slope[index[hit]], met[index[hit]] = trial[hit], value[hit], trial_slope[hit], True
+            crossed = ~hit & np.isfinite(value) & (np.sign(value) != np.sign(g[index]))
+            for found, bound, side in ((lower, lo, down & crossed), (upper, hi, ~down & crossed)):
+                found[index[side]], bound[index[side]] = True, trial[side]
+            sign_lo[index[down & crossed]] = np.sign(value[down & crossed])
+            keep = ~hit & ~crossed & np.isfinite(value) & (trial != np.where(down, lo[index], hi[index]))
+            index, down, size = index[keep], down[keep], size[keep] * 2
+            y, gy, sy = trial[keep], value[keep], trial_slope[keep]
+    bracketed = lower | upper | met
+    lo, hi = np.where(upper, x, lo), np.where(lower, x, hi)
+    step = hi - lo # Previous step, for the rate test of the Newton steps
+    iterations = np.zeros(n, dtype=int)
+    converged = met.copy()
+    active = np.flatnonzero(bracketed & ~converged)
+
+    with Instrumentation.span('inverse design Newton'), np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        for _ in range(max_iter):
+            if not active.size:
+                break
+            xa, ga, sa, la, ha = x[active], g[active], slope[active], lo[active], hi[active]
+            newton = xa - ga / sa
+            # Bisect where the Newton step leaves the bracket, is not finite or does not halve the previous step
+            bisect = ~((newton > la) & (newton < ha)) | (np.abs(2 * ga) > np.abs(step[active] * sa))
+            new = np.where(bisect, (la + ha) / 2, newton)
+            step[active] = new - xa
+            value, new_slope = problem(new, active)
+            value = value - target[active]
+            # Where the cycle has no solution inside the bracket, step back halfway from the last point
+            failed = np.isnan(value)
+            x[active] = np.where(failed, (xa + new) / 2, new)
+            g[active], slope[active] = np.where(failed, ga, value), np.where(failed, sa, new_slope)
+            update = ~failed
+            same = update & (np.sign(value) == sign_lo[active])
+            lo[active] = np.where(same, new, la)
+            hi[active] = np.where(update & ~same, new, ha)
+            iterations[active] += 1
+            done = update & ((np.abs(value) <= tol * scale[active]) |
+                             (hi[active] - lo[active] <= XTOL * np.abs(new)))
+            converged[active[done]] = True
+            active = active[~done]
+    residual = np.abs(g) / scale
+    return x, converged & (residual <= np.sqrt(tol)), bracketed, iterations, residual
+
+
+# Solve for the variable (an input in INPUTS) at which the output (in TARGETS) equals the target, for every point of the
+# batch given by the target and the inputs (values or arrays broadcast together, like TurboFanBatch). bounds are arrays
+# (lo, hi) broadcast with the points, default BOUNDS[variable]. guess is an array or a previous InverseResult, default the
+# baseline value of the variable or the middle of the bounds. mass_flow [kg/s] is needed for thrust targets ("F")
+@Instrumentation.instrumented('solve_inverse')
+def solve_inverse(variable, output, target, bounds=None, guess=None, mass_flow=None, tol=TOL, max_iter=MAX_ITER,
+                  warm_start=True, real_gas=False, **inputs):
+    if variable not in INPUTS:
+        raise ValueError(f"Cannot solve for unknown input '{variable}', expected one of: {', '.join(INPUTS)}")
+    if output not in TARGETS:
+        raise ValueError(f"Unknown target output '{output}', expected one of: {', '.join(TARGETS)}")
+    unknown = sorted(set(inputs) - set(INPUTS))
+    if unknown:
+        raise ValueError(f"Unknown cycle inputs: {', '.join(unknown)}")
+    if output == 'F' and mass_flow is None:
+        raise ValueError("A thrust target needs the air mass flow (mass_flow=)")
+    if bounds is None:
+        if variable not in BOUNDS:
+            raise ValueError(f"No default bounds for {variable}, give bounds=(lo, hi)")
+        bounds = BOUNDS[variable]
+    if 'pa' in inputs: # Nozzles exhaust to ambient pressure unless told otherwise
+        inputs.setdefault('p7', inputs['pa'])
+        inputs.setdefault('p8', inputs['pa'])
+    baseline = inputs.pop(variable, None)
+    if isinstance(guess, InverseResult):
+        guess = guess.x
+    if guess is None:
+        guess = baseline if baseline is not None else (np.asarray(bounds[0]) + np.asarray(bounds[1])) / 2
+    arrays = {name: np.asarray(value, dtype=float) for name, value in inputs.items()}
+    arrays.update(target=np.asarray(target, dtype=float), lo=np.asarray(bounds[0], dtype=float),
+                  hi=np.asarray(bounds[1], dtype=float), guess=np.asarray(guess, dtype=float))
+    if mass_flow is not None:
+        arrays['mass_flow'] = np.asarray(mass_flow, dtype=float)
+    shape = np.broadcast_shapes(*(array.shape for array in arrays.values()))
+    size = int(np.prod(shape))
+
+    cold = np.broadcast_to(arrays['guess'], shape).ravel() # Guesses before the warm start
+    if warm_start and size > WARM_POINTS and len(shape):
+        # Coarse pass over every stride-th point along each axis, then every point starts from its nearest coarse point
+        stride = int(np.ceil((size / WARM_POINTS)**(1 / len(shape))))
+        coarse_index = np.ix_(*(np.arange(0, n, stride) for n in shape))
+        coarse = {name: np.broadcast_to(array, shape)[coarse_index] for name, array in arrays.items()}
+        with Instrumentation.span('inverse design coarse pass'):
+            first = solve_inverse(variable, output, coarse.pop('target'), (coarse.pop('lo'), coarse.pop('hi')),
+                                  coarse.pop('guess'), coarse.pop('mass_flow', None), tol, max_iter, False, real_gas, **coarse)
+        nearest = np.ix_(*(np.minimum(np.round(np.arange(n) / stride).astype(int), m - 1) for n, m in zip(shape, first.shape)))
+        arrays['guess'] = np.where(first.converged[nearest], first.x[nearest], np.broadcast_to(arrays['guess'], shape))
+
+    flat = {name: np.broadcast_to(array, shape).ravel() if array.ndim else array[()] for name, array in arrays.items()}
+    flat_array = lambda name: np.broadcast_to(flat[name], (size,)).astype(float)
+    lo, hi, target = flat_array('lo'), flat_array('hi'), flat_array('target')
+    if np.any(lo >= hi):
+        raise ValueError(f"The bounds of {variable} must have lo < hi")
+    x, cold = np.clip(flat_array('guess'), lo, hi), np.clip(cold, lo, hi)
+    problem = _Problem(variable, output, {name: flat[name] for name in inputs}, flat.get('mass_flow'), real_gas)
+    start = x.copy() # _solve updates x in place
+    x, converged, bracketed, iterations, residual = _solve(problem, target, lo, hi, x, tol, max_iter)
+    # A neighbour's solution can be a guess where the cycle has no solution or from where the bracket is missed, those
+    # points are solved again from their own guesses
+    retry = np.flatnonzero(~bracketed & (start != cold))
+    if retry.size:
+        again = _Problem(variable, output, _take(problem.inputs, retry), _take({'m': problem.mass_flow}, retry)['m'], real_gas)
+        solved = _solve(again, target[retry], lo[retry], hi[retry], cold[retry], tol, max_iter)
+        for array, values in zip((x, converged, bracketed, iterations, residual), solved):
+            array[retry] = values
+        problem.nfev += again.nfev
+    Instrumentation.record_solver('inverse design Newton', problem.nfev, converged, iterations)
+    outputs = problem(x, np.arange(size), slope=False, outputs=REPORTED)
+    outputs = {name: np.reshape(value, shape) for name, value in outputs.items()}
+    if output == 'F':
+        outputs['F'] = outputs['F_m0'] * np.broadcast_to(arrays['mass_flow'], shape)
+    return InverseResult(variable, output, shape, x.reshape(shape), converged.reshape(shape), bracketed.reshape(shape),
+                         iterations.reshape(shape), residual.reshape(shape), outputs)
+
+
+# Run an inverse design spec (see the module docstring). The swept parameters and a target axis are laid out as an open
+# grid in spec order, the target last. Returns the result and its axes (name -> values)
+def run_inverse(spec):
+    parameters = {name: axis_values(entry) for name, entry in spec.get('parameters', {}).items()}
+    target = axis_values(spec['target'])
+    axes = dict(parameters, **({'target': target} if len(target) > 1 else {}))
+    grid = dict(zip(axes, np.ix_(*axes.values()))) if axes else {}
+    result = solve_inverse(spec['solve'], spec['output'], grid.pop('target', target[0]), spec.get('bounds'),
+                           mass_flow=spec.get('mass_flow'), real_gas=bool(spec.get('real_gas', False)),
+                           **spec.get('baseline', {}), **grid)
+    return result, axes
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python Optimization/InverseDesign.py spec.json results.npz")
+    result, axes = run_inverse(load_spec(sys.argv[1]))
+    result.to_npz(sys.argv[2])
+    print(result)
+    print(f"{int(result.bracketed.sum())} points bracketed, iterations: mean {result.iterations.mean():.2f}, "
+          f"max {result.iterations.max()}, largest residual of the converged points "
+          f"{np.max(result.residual[result.converged], initial=0):.2e}")
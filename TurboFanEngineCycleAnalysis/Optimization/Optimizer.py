@@ -0,0 +1,189 @@
+"""
+This code finds cycle designs that minimize TSFC, or a weighted sum of any performance outputs and station quantities,
+over the design variables BPR, pi_f, pi_c and T04 (or any other subset of the cycle inputs) within bounds. Constraints
+bound any output from above or below, e.g. the fan diameter d, the core exit temperature T06 (LP turbine exit) or the
+specific thrust F_m0.
+The exact (unrounded) model is used, and every evaluation is one batch: the objective, every constraint and their
+gradients come from a single complex-step TurboFanBatch call (TurboFanBatch.derivatives). Each start is solved with SLSQP
+from scipy (only imported here). Starts are drawn at random within the bounds, screened for cycle feasibility in one
+batch, and solved in parallel across a process pool. Objective and constraints are scaled by their values at the centre
+of the bounds and the variables to 0..1, so the weights and tolerances do not depend on units.
+
+    Example spec:
+        {
+            "objective": {"TSFC": 1.0},                                  # output name -> weight, minimized
+            "variables": {"BPR": [5, 15], "pi_f": [1.3, 1.8], "pi_c": [20, 40], "T04": [1450, 1700]},
+            "constraints": {"d": {"max": 2.5}, "T06": {"max": 900}, "F_m0": {"min": 120, "max": 170}},
+            "baseline": {"M0": 0.8},                                     # values of the other cycle inputs
+            "starts": 16,
+            "seed": 1,
+            "workers": 4                                                 # optional, default is os.cpu_count()
+        }
+
+    Usage:
+        python Optimization/Optimizer.py spec.json
+"""
+import sys
+sys.path.append(".")
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from CycleAnalysis.TurboFanBatch import TurboFanBatch, DESIGN_NAMES, PARAMETER_NAMES, STATION_FIELDS, PERFORMANCE_FIELDS
+from Iterations.Sweep import load_spec
+import Tools.Instrumentation as Instrumentation
+
+INPUTS    = DESIGN_NAMES + PARAMETER_NAMES
+OUTPUTS   = PERFORMANCE_FIELDS + STATION_FIELDS
+VARIABLES = {'BPR': (3., 20.), 'pi_f': (1.2, 2.0), 'pi_c': (15., 45.), 'T04': (1400., 1800.)} # Default variables and bounds
+MAXITER   = 200
+TOL       = 1e-9
+
+
+class DesignProblem:
+    def __init__(self, objective=None, variables=None, constraints=None, fixed=None):
+        self.objective   = dict(objective or {'TSFC': 1.}) # Output name -> weight
+        self.variables   = {name: tuple(map(float, bounds)) for name, bounds in (variables or VARIABLES).items()}
+        self.constraints = {name: dict(limits) for name, limits in (constraints or {}).items()} # Output -> {'min', 'max'}
+        self.fixed       = {name: value for name, value in (fixed or {}).items() if name not in self.variables}
+        unknown = sorted((set(self.variables) | set(self.fixed)) - set(INPUTS))
+        if unknown:
+            raise ValueError(f"Unknown cycle inputs: {', '.join(unknown)}")
+        unknown = sorted((set(self.objective) | set(self.constraints)) - set(OUTPUTS))
+        if unknown:
+            raise ValueError(f"Unknown cycle outputs: {', '.join(unknown)}")
+        for name, limits in self.constraints.items():
+            if not limits or set(limits) - {'min', 'max'}:
+                raise ValueError(f"Constraint on {name} needs 'min' and/or 'max' limits only")
+        self.names   = tuple(self.variables)
+        self.lower   = np.array([bounds[0] for bounds in self.variables.values()])
+        self.upper   = np.array([bounds[1] for bounds in self.variables.values()])
+        self.outputs = tuple(dict.fromkeys(tuple(self.objective) + tuple(self.constraints)))
+        # One inequality g >= 0 per limit, as (output, sign, limit): sign * (output - limit) >= 0
+        self.limits  = [(name, 1. if kind == 'min' else -1., float(limit))
+                        for name, limits in self.constraints.items() for kind, limit in limits.items()]
+        centre = self.evaluate(((self.lower + self.upper) / 2)[None], gradients=False)[0]
+        self.scales = {name: abs(float(centre[name][0])) if np.isfinite(centre[name][0]) and centre[name][0] else 1.
+                       for name in self.outputs}
+
+    # Physical design vectors from scaled ones (0..1 within the bounds), one row per point
+    def to_design(self, u):
+        return self.lower + np.asarray(u) * (self.upper - self.lower)
+
+    # Exact outputs at design points (one row per point), and with gradients=True their derivatives (points x variables)
+    def evaluate(self, points, gradients=True):
+        points = np.atleast_2d(points)
+        engine = TurboFanBatch(exact=True, **self.fixed, **{name: points[:, i] for i, name in enumerate(self.names)})
+        performance = dict(zip(PERFORMANCE_FIELDS, engine.performance()))
+        values = {name: np.array(performance[name] if name in performance else np.broadcast_to(getattr(engine, name), engine.shape))
+                  for name in self.outputs}
+        if not gradients:
+            return values, None
+        derivatives = engine.derivatives(self.names, self.outputs)
+        return values, {name: np.stack([derivatives[name][var] for var in self.names], axis=-1) for name in self.outputs}
+
+    # Scaled objective and inequality constraints with their gradients in the scaled variables, at one scaled point
+    def scaled(self, u):
+        values, gradients = self.evaluate(self.to_design(u))
+        span = self.upper - self.lower
+        objective = sum(weight * values[name][0] / self.scales[name] for name, weight in self.objective.items())
+        objective_gradient = sum(weight * gradients[name][0] * span / self.scales[name] for name, weight in self.objective.items())
+        g = np.array([sign * (values[name][0] - limit) / (abs(limit) or 1.) for name, sign, limit in self.limits])
+        g_gradient = np.array([sign * gradients[name][0] * span / (abs(limit) or 1.) for name, sign, limit in self.limits])
+        return objective, objective_gradient, g, g_gradient.reshape(len(self.limits), len(self.names))
+
+    # Constraint violation of every point, 0 where every limit holds, inf where the cycle has no solution
+    def violation(self, values):
+        violation = np.zeros(len(next(iter(values.values()))))
+        for name, sign, limit in self.limits:
+            violation += np.maximum(0., -sign * (values[name] - limit) / (abs(limit) or 1.))
+        return np.where(np.isnan(sum(values.values())), np.inf, violation)
+
+
+class OptimizationResult:
+    def __init__(self, problem, u, start, success, message, nit, nfev):
+        self.design  = dict(zip(problem.names, problem.to_design(u).tolist()))
+        self.start   = dict(zip(problem.names, problem.to_design(start).tolist()))
+        values, _ = problem.evaluate(problem.to_design(u)[None], gradients=False)
+        self.outputs = {name: float(array[0]) for name, array in values.items()}
+        self.objective = sum(weight * self.outputs[name] for name, weight in problem.objective.items())
+        self.violation = float(problem.violation(values)[0])
+        self.success = bool(success) and self.violation <= 1e-6
+        self.message = message
+        self.nit     = nit
+        self.nfev    = nfev
+
+    def __repr__(self):
+        design = ', '.join(f"{name}={value:.5g}" for name, value in self.design.items())
+        return f"OptimizationResult({design}; objective {self.objective:.6g}, {'converged' if self.success else self.message})"
+
+
+# Solve one start with SLSQP, run inside the worker processes
+def _solve(problem, u0, maxiter, tol):
+    from scipy.optimize import minimize # Optional dependency, only needed for optimizing
+    cache = {}
+    def evaluate(u): # Objective, constraints and gradients come from one batch, reused by the four callbacks
+        key = u.tobytes()
+        if key not in cache:
+            cache.clear()
+            cache[key] = problem.scaled(u)
+        return cache[key]
+    constraints = [{'type': 'ineq', 'fun': lambda u: evaluate(u)[2], 'jac': lambda u: evaluate(u)[3]}] if problem.limits else []
+    try:
+        with np.errstate(invalid='ignore'):
+            result = minimize(lambda u: evaluate(u)[0], u0, jac=lambda u: evaluate(u)[1], method='SLSQP',
+                              bounds=[(0., 1.)] * len(u0), constraints=constraints,
+                              options={'maxiter': maxiter, 'ftol': tol})
+        return result.x, result.success and np.isfinite(result.fun), result.message, result.nit, result.nfev
+    except ValueError as error: # Steps into designs where the cycle has no solution
+        return u0, False, str(error), 0, 0
+
+
+# Scaled start points: the centre of the bounds followed by random points, all where the cycle has a solution.
+# Candidates are screened in one batch, constraint-satisfying ones first
+def start_points(problem, starts, seed=None):
+    rng = np.random.default_rng(seed)
+    candidates = np.vstack([np.full(len(problem.names), 0.5), rng.random((8 * starts, len(problem.names)))])
+    values, _ = problem.evaluate(problem.to_design(candidates), gradients=False)
+    violation = problem.violation(values)
+    order = np.argsort(violation, kind='stable')
+    order = order[np.isfinite(violation[order])]
+    if not order.size:
+        raise ValueError("The cycle has no solution anywhere in the start points, check the bounds")
+    return candidates[np.sort(order[:starts])]
+
+
+# Minimize the problem from several starts, solved in parallel. Returns the OptimizationResults, best first
+# (converged and feasible before the rest)
+def optimize(problem, starts=8, seed=None, workers=None, maxiter=MAXITER, tol=TOL):
+    points = start_points(problem, starts, seed)
+    workers = workers or os.cpu_count()
+    with Instrumentation.span('optimize'):
+        if workers == 1 or len(points) == 1:
+            solutions = [_solve(problem, u0, maxiter, tol) for u0 in points]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                solutions = list(pool.map(_solve, [problem] * len(points), points, [maxiter] * len(points), [tol] * len(points)))
+    results = [OptimizationResult(problem, u, u0, success, message, nit, nfev)
+               for u0, (u, success, message, nit, nfev) in zip(points, solutions)]
+    Instrumentation.record_solver('SLSQP', [result.nfev for result in results], [result.success for result in results],
+                                  [result.nit for result in results])
+    return sorted(results, key=lambda result: (not result.success, result.violation, result.objective))
+
+
+# Run an optimization spec, see the module docstring for its keys
+def run_optimization(spec):
+    problem = DesignProblem(spec.get('objective'), spec.get('variables'), spec.get('constraints'), spec.get('baseline'))
+    return optimize(problem, int(spec.get('starts', 8)), spec.get('seed'), spec.get('workers'),
+                    int(spec.get('maxiter', MAXITER)), float(spec.get('tol', TOL)))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python Optimization/Optimizer.py spec.json")
+    results = run_optimization(load_spec(sys.argv[1]))
+    for result in results:
+        print(result)
+    best = results[0]
+    print("\nBest design:")
+    for name, value in dict(best.design, **best.outputs).items():
+        print(f"    {name:6s} {value:.6g}")
@@ -0,0 +1,105 @@
+"""
+This code extracts Pareto (non-dominated) sets from large sets of evaluated designs, e.g. TSFC vs. fan diameter vs.
+specific thrust from a sweep. Objectives are minimized unless marked 'max'. Rows with a NaN objective (no cycle solution)
+are never on the front.
+Points are sorted lexicographically, so a point can only be dominated by points before it. With two objectives the front
+then follows from a running minimum in O(n log n). With more objectives most dominated points are first dropped by
+comparing with a few strong points, then the rest are checked in blocks against the front found so far and against each
+other, so the cost grows with n times the front size rather than n^2.
+
+    Usage:
+        front = pareto_front({'TSFC': TSFCs, 'd': ds, 'F_m0': F_m0s}, senses={'F_m0': 'max'})   # boolean mask
+        ranks = pareto_ranks({'TSFC': TSFCs, 'd': ds})                                          # 0 on the front
+"""
+import sys
+sys.path.append(".")
+import numpy as np
+
+BLOCK  = 1024 # Points checked together in the blockwise filter
+STRONG = 64   # Points used to drop most of the dominated points before the blockwise filter
+
+
+# (n, k) array of the objectives to minimize, with 'max' objectives negated
+def objective_matrix(objectives, senses=None):
+    senses = senses or {}
+    unknown = sorted(set(senses.values()) - {'min', 'max'})
+    if unknown:
+        raise ValueError(f"Objective senses must be 'min' or 'max', not: {', '.join(unknown)}")
+    columns = [np.ravel(values) * (-1. if senses.get(name, 'min') == 'max' else 1.) for name, values in objectives.items()]
+    return np.stack(columns, axis=1).astype(float)
+
+
+# Matrix of whether point j of a is no larger than point i of b in every objective, built one objective at a time
+def _no_larger(a, b):
+    result = a[None, :, 0] <= b[:, None, 0]
+    for k in range(1, a.shape[1]):
+        result &= a[None, :, k] <= b[:, None, k]
+    return result
+
+
+# Boolean mask of the non-dominated rows of an (n, k) array of objectives to minimize
+def non_dominated(values):
+    values = np.asarray(values, dtype=float)
+    mask = np.zeros(len(values), dtype=bool)
+    finite = np.flatnonzero(~np.isnan(values).any(axis=1))
+    if not finite.size:
+        return mask
+    # Sort lexicographically, equal points do not dominate each other, so each distinct point is checked once
+    order = finite[np.lexsort(values[finite].T[::-1])]
+    ordered = values[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = np.any(ordered[1:] != ordered[:-1], axis=1)
+    unique = ordered[first]
+    inverse = np.cumsum(first) - 1 # Distinct point of every sorted row
+    if unique.shape[1] == 1:
+        keep = unique[:, 0] == unique[0, 0]
+    elif unique.shape[1] == 2:
+        # Earlier rows have a smaller or equal first objective, a row is dominated if one of them has a second
+        # objective no larger than its own
+        best = np.minimum.accumulate(unique[:, 1])
+        keep = np.ones(len(unique), dtype=bool)
+        keep[1:] = unique[1:, 1] < best[:-1]
+    else:
+        keep = np.zeros(len(unique), dtype=bool)
+        # Points dominated by any point are off the front, so first drop those dominated by a few points that are
+        # strong in every objective (smallest sum of scaled objectives), which removes most of a large cloud cheaply
+        span = np.ptp(unique, axis=0)
+        scores = ((unique - unique.min(axis=0)) / np.where(span > 0, span, 1)).sum(axis=1)
+        strong = unique[np.argpartition(scores, min(STRONG, len(unique)) - 1)[:STRONG]]
+        survivors = np.ones(len(unique), dtype=bool)
+        for start in range(0, len(unique), BLOCK * 64):
+            chunk = unique[start:start + BLOCK * 64]
+            survivors[start:start + len(chunk)] = ~(_no_larger(strong, chunk) & ~_no_larger(chunk, strong).T).any(axis=1)
+        survivors = np.flatnonzero(survivors)
+        front = np.empty((0, unique.shape[1]))
+        for start in range(0, len(survivors), BLOCK):
+            rows = survivors[start:start + BLOCK]
+            block = unique[rows]
+            # Dominated by the front so far: some front point no larger in every objective (rows are distinct)
+            alive = np.flatnonzero(~_no_larger(front, block).any(axis=1))
+            # Dominated by an earlier surviving point of the same block
+            candidates = block[alive]
+            alive = alive[~(_no_larger(candidates, candidates) & np.tri(len(alive), k=-1, dtype=bool)).any(axis=1)]
+            keep[rows[alive]] = True
+            front = np.vstack([front, block[alive]])
+    mask[order] = keep[inverse]
+    return mask
+
+
+# Boolean mask of the designs on the Pareto front of the given objectives (name -> array, all of the same size)
+def pareto_front(objectives, senses=None):
+    return non_dominated(objective_matrix(objectives, senses))
+
+
+# Pareto rank of every design, 0 on the front, 1 on the front of the rest, ... and -1 beyond max_rank or for NaN rows
+def pareto_ranks(objectives, senses=None, max_rank=None):
+    values = objective_matrix(objectives, senses)
+    ranks = np.full(len(values), -1)
+    remaining = np.flatnonzero(~np.isnan(values).any(axis=1))
+    rank = 0
+    while remaining.size and (max_rank is None or rank <= max_rank):
+        front = non_dominated(values[remaining])
+        ranks[remaining[front]] = rank
+        remaining = remaining[~front]
+        rank += 1
+    return ranks
@@ -0,0 +1,72 @@
+"""
+This code provides the ISA standard atmosphere (ICAO 1993) up to 47 km geopotential altitude. The temperature, pressure
+and speed of sound are tabulated every TABLE_STEP metres when the module is imported, and lookups interpolate linearly
+in those tables, so a whole array of altitudes is converted with one np.interp per quantity. Between the table nodes the
+interpolation error is below 1e-6 relative.
+
+    Usage:
+        T0, pa, a = isa(11000.)                        # [K], [bar], [m/s]
+        T0, pa, a = isa(np.linspace(0, 12000, 121))    # arrays of the same shape
+"""
+import sys
+sys.path.append(".")
+import numpy as np
+
+T_SL       = 288.15     # Sea level temperature, [K]
+P_SL       = 1.01325    # Sea level pressure, [bar]
+G0         = 9.80665    # Standard gravity, [m/s^2]
+R_AIR      = 287.05     # Gas constant of air, [J/kgK], as in Parameters/TurboFanParameters.py
+GAMMA_AIR  = 1.4        # Specific heat ratio of air
+TABLE_STEP = 10.        # Spacing of the altitude tables, [m]
+
+# Base geopotential altitude [m] and temperature lapse rate [K/m] of each layer, the last altitude is the top of the model
+LAYERS = ((0., -0.0065), (11000., 0.), (20000., 0.001), (32000., 0.0028), (47000., None))
+
+
+# Temperature and pressure at height dz [m] above the base of a layer with the given base values and lapse rate
+def _layer(T_base, p_base, lapse, dz):
+    if lapse == 0: # Isothermal layer
+        return T_base + 0 * dz, p_base * np.exp(-G0 * dz / (R_AIR * T_base))
+    T = T_base + lapse * dz
+    return T, p_base * (T / T_base)**(-G0 / (lapse * R_AIR))
+
+
+# Exact ISA temperature [K] and pressure [bar] at the given geopotential altitudes [m]
+def _isa_exact(altitude):
+    altitude = np.asarray(altitude, dtype=float)
+    T, p = np.full(altitude.shape, T_SL), np.full(altitude.shape, P_SL)
+    T_base, p_base = T_SL, P_SL
+    for (base, lapse), (top, _) in zip(LAYERS[:-1], LAYERS[1:]):
+        inside = altitude > base
+        T_layer, p_layer = _layer(T_base, p_base, lapse, np.clip(altitude - base, 0, top - base))
+        T, p = np.where(inside, T_layer, T), np.where(inside, p_layer, p)
+        T_base, p_base = _layer(T_base, p_base, lapse, top - base)
+    return T, p
+
+
+ALTITUDES = np.arange(0., LAYERS[-1][0] + TABLE_STEP, TABLE_STEP) # Table altitudes, [m]
+TEMPERATURES, PRESSURES = _isa_exact(ALTITUDES) # [K], [bar]
+LOG_PRESSURES = np.log(PRESSURES) # Pressure falls off exponentially, so it is interpolated in log space
+SPEEDS_OF_SOUND = np.sqrt(GAMMA_AIR * R_AIR * TEMPERATURES) # [m/s]
+
+
+def _check_range(altitude):
+    if np.any(altitude < ALTITUDES[0]) or np.any(altitude > ALTITUDES[-1]) or np.any(np.isnan(altitude)):
+        raise ValueError(f"Altitude must be between {ALTITUDES[0]:g} and {ALTITUDES[-1]:g} m")
+
+
+# Ambient temperature [K], pressure [bar] and speed of sound [m/s] at geopotential altitudes [m], scalar or array
+def isa(altitude):
+    altitude = np.asarray(altitude, dtype=float)
+    _check_range(altitude)
+    T  = np.interp(altitude, ALTITUDES, TEMPERATURES)
+    pa = np.exp(np.interp(altitude, ALTITUDES, LOG_PRESSURES))
+    a  = np.interp(altitude, ALTITUDES, SPEEDS_OF_SOUND)
+    if altitude.ndim == 0:
+        return float(T), float(pa), float(a)
+    return T, pa, a
+
+
+# Speed of sound [m/s] at an ambient temperature [K]
+def speed_of_sound(T, gamma=GAMMA_AIR, R=R_AIR):
+    return np.sqrt(gamma * R * np.asarray(T, dtype=float))
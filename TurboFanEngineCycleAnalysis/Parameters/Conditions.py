@@ -0,0 +1,85 @@
+"""
+This code defines the parameter objects passed to the TurboFan and TurboFanBatch classes instead of the module-level
+constants of Parameters/TurboFanParameters.py. FlightCondition holds the operating point (Mach number, ambient state,
+nozzle exit pressures and the aircraft weight and wing area that set the required thrust) and EngineDesign holds the
+engine constants (turbine inlet temperature, component efficiencies, gas properties and fuel heating value).
+Both are frozen, so engines evaluated at different conditions never share mutable state and can run concurrently in one
+process. Their defaults are the values in Parameters/TurboFanParameters.py, and variants are made with
+dataclasses.replace or FlightCondition.at_altitude. For TurboFanBatch the fields can also be NumPy arrays, so one batch
+can span altitude and Mach number.
+
+    Usage:
+        cruise = FlightCondition.at_altitude(11000., M0=0.85)
+        climb  = FlightCondition.at_altitude(np.linspace(0, 11000, 12)[:, None], M0=np.linspace(0.3, 0.85, 12))
+        TurboFan(10, 1.5, 36., flight=cruise, design=EngineDesign(T04=1600.)).performance()
+"""
+import sys
+sys.path.append(".")
+from dataclasses import dataclass, field, fields
+import Parameters.TurboFanParameters as Parameters
+from Parameters.Atmosphere import isa, speed_of_sound
+
+
+@dataclass(frozen=True)
+class FlightCondition:
+    M0:  object = Parameters.M0         # Freestream Mach
+    T0:  object = Parameters.T0         # Ambient Temperature, [K]
+    pa:  object = Parameters.pa         # Ambient Pressure, [bar]
+    p7:  object = None                  # Hot nozzle exit pressure, [bar], defaults to pa
+    p8:  object = None                  # Cold nozzle exit pressure, [bar], defaults to pa
+    W:   object = Parameters.W          # Aircraft weight, [lbf]
+    S_W: object = Parameters.S_W        # Wing Surface Area, [m^2]
+    altitude: object = field(default=None, compare=False) # ISA altitude the ambient state was taken from, [m]
+    at_pa:    tuple  = field(default=(), init=False, compare=False, repr=False) # Nozzle exit pressures defaulted to pa
+
+    def __post_init__(self):
+        # Nozzles exhaust to ambient pressure unless told otherwise
+        object.__setattr__(self, 'at_pa', tuple(name for name in ('p7', 'p8') if getattr(self, name) is None))
+        if self.p7 is None:
+            object.__setattr__(self, 'p7', self.pa)
+        if self.p8 is None:
+            object.__setattr__(self, 'p8', self.pa)
+
+    # Flight condition with the ambient temperature and pressure of the ISA atmosphere at a geopotential altitude [m]
+    @classmethod
+    def at_altitude(cls, altitude, M0=Parameters.M0, **values):
+        T0, pa, _ = isa(altitude)
+        return cls(M0=M0, T0=T0, pa=pa, altitude=altitude, **values)
+
+    # Speed of sound at the ambient temperature, [m/s]
+    @property
+    def a(self):
+        return speed_of_sound(self.T0)
+
+
+@dataclass(frozen=True)
+class EngineDesign:
+    T04:     object = Parameters.T04      # Turbine Inlet Temperature, [K]
+    pi_b:    object = Parameters.pi_b     # Pressure loss combustor
+    n_inft:  object = Parameters.n_inft   # Polytropic turbine
+    n_inff:  object = Parameters.n_inff   # Polytropic fan
+    n_infc:  object = Parameters.n_infc   # Polytropic compressor
+    n_b:     object = Parameters.n_b      # Burner
+    n_i:     object = Parameters.n_i      # Intake
+    n_m:     object = Parameters.n_m      # Mechanical
+    n_j:     object = Parameters.n_j      # Nozzle
+    gamma_c: object = Parameters.gamma_c  # Specific Heat Ratio core
+    gamma_h: object = Parameters.gamma_h  # Specific Heat Ratio hot section
+    c_pg:    object = Parameters.c_pg     # Specific Heat combustion gas, [kJ/kgK]
+    c_pa:    object = Parameters.c_pa     # Specific Heat air, [kJ/kgK]
+    c_p:     object = Parameters.c_p      # Specific Heat air, [J/kgK]
+    R:       object = Parameters.R        # Universal Gas Constant, [J/kgK]
+    h_fuel:  object = Parameters.h_fuel   # Heating Value of the Fuel [kJ/kg]
+
+
+FLIGHT_NAMES = tuple(f.name for f in fields(FlightCondition) if f.init and f.name != 'altitude') # Cycle inputs set by a FlightCondition
+DESIGN_PARAMETER_NAMES = tuple(f.name for f in fields(EngineDesign))                 # Cycle inputs set by an EngineDesign
+
+
+# Mapping of every cycle parameter name -> value from a flight condition and engine design (defaults when None)
+def parameter_values(flight=None, design=None):
+    flight = flight or FlightCondition()
+    design = design or EngineDesign()
+    values = {name: getattr(design, name) for name in DESIGN_PARAMETER_NAMES}
+    values.update({name: getattr(flight, name) for name in FLIGHT_NAMES})
+    return values
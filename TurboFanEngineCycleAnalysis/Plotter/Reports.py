@@ -0,0 +1,299 @@
+"""
+This code renders headless plot reports of sweep results, for nightly trade-study reports without a display.
+A report spec lists figures over one or more sources, each a sweep saved as .npz (Iterations/Sweep.py) or written to a
+result store (Storage/ResultStore.py), or a SweepResult passed in directly. The figure kinds are
+    - lines:       outputs against a swept parameter, optionally one line per value of a second swept parameter
+    - performance: the 2x3 layout of Plotter.plot_3 (specific thrust, TSFC, fuel/air ratio and the efficiencies)
+    - contour:     an output over two swept parameters, e.g. TSFC over BPR x pi_f
+    - carpet:      two outputs plotted against each other over a 2-D sweep, with a line for every value of both swept
+                   parameters, e.g. TSFC against specific thrust over BPR x pi_f
+Swept parameters not on a figure are fixed with "select" (nearest grid value, SweepResult.sel). The data of every figure
+is taken from the sweep arrays in the main process and reduced there before it is rendered: dense line series are
+downsampled to MAX_POINTS points keeping the minimum and maximum of every bucket (so peaks survive), contour grids to
+MAX_GRID values per axis and carpets to MAX_LINES lines per family. Only these small arrays are sent to the worker
+processes, which render the figures in batches with matplotlib Figure objects and the Agg canvas, without pyplot, so no
+display or interactive backend is involved. Figures are written as PNG, SVG or PDF.
+
+    Example spec:
+        {
+            "sources": {"grid": "Results/sweep", "BPR": "IterateResults/BPR"},  # store directories or .npz files
+            "directory": "Report",
+            "format": "png",                                                    # png, svg or pdf
+            "workers": 4,                                                       # optional, default is os.cpu_count()
+            "figures": [
+                {"kind": "contour", "source": "grid", "x": "BPR", "y": "pi_f", "z": "TSFC", "select": {"pi_c": 36}},
+                {"kind": "carpet", "source": "grid", "x": "F_m0", "y": "TSFC", "select": {"pi_c": 36}},
+                {"kind": "lines", "source": "grid", "x": "BPR", "y": ["TSFC"], "series": "pi_f", "select": {"pi_c": 36}},
+                {"kind": "performance", "source": "BPR", "x": "BPR", "name": "bpr_performance"}
+            ]
+        }
+
+    Usage:
+        python Plotter/Reports.py Plotter/ReportSpec.json [--workers N]
+"""
+import sys
+sys.path.append(".")
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import Tools.Instrumentation as Instrumentation
+
+FORMATS    = ('png', 'svg', 'pdf')
+KINDS      = ('lines', 'performance', 'contour', 'carpet')
+MAX_POINTS = 2000  # Points per line series above which it is downsampled
+MAX_GRID   = 300   # Values per axis above which contour grids are thinned
+MAX_LINES  = 12    # Lines per series or carpet family above which evenly spaced values are kept
+FIGSIZE    = (10, 6)
+DPI        = 100
+
+# Axis labels of the swept parameters and outputs, the name itself for the others
+LABELS = {
+    'BPR':   'BPR',
+    'pi_f':  r'$\pi_{f}$',
+    'pi_c':  r'$\pi_{c}$',
+    'T04':   r'$T_{04}$ [K]',
+    'F_m0':  r'$F/m_0$ [N/(kg/s)]',
+    'TSFC':  'TSFC [g/(kN-s)]',
+    'f':     'f',
+    'eta_T': r'$\eta_T$',
+    'eta_P': r'$\eta_P$',
+    'eta_O': r'$\eta_O$',
+}
+
+
+def label(name):
+    return LABELS.get(name, name)
+
+
+# Indices kept when a series is downsampled for plotting: above max_points, the first and last points and the minimum
+# and maximum of each of (max_points - 2) / 2 buckets, in order, so the extremes of the series are drawn exactly
+def downsample_index(y, max_points=MAX_POINTS):
+    y = np.asarray(y)
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    interior = y[1:-1]
+    buckets = max(1, (max_points - 2) // 2)
+    size = -(-len(interior) // buckets)
+    padded = np.concatenate([interior, np.repeat(interior[-1:], size * buckets - len(interior))]).reshape(buckets, size)
+    start = np.arange(buckets) * size + 1
+    kept = np.minimum(np.concatenate([start + padded.argmin(1), start + padded.argmax(1)]), n - 2)
+    return np.unique(np.concatenate([[0, n - 1], kept]))
+
+
+# Downsample a series for plotting, see downsample_index
+def downsample(x, y, max_points=MAX_POINTS):
+    index = downsample_index(y, max_points)
+    return np.asarray(x)[index], np.asarray(y)[index]
+
+
+# Downsample several series over the same x at one shared set of indices, the union of the indices each series keeps,
+# so every series keeps its extremes and stays paired with its x. metrics: output name -> values over x
+def downsample_metrics(x, metrics, max_points=MAX_POINTS):
+    index = np.unique(np.concatenate([downsample_index(y, max_points) for y in metrics.values()]))
+    return np.asarray(x)[index], {name: np.asarray(y)[index] for name, y in metrics.items()}
+
+
+# At most limit evenly spaced indices into an axis of n values, including both ends
+def thin(n, limit):
+    return np.arange(n) if n <= limit else np.unique(np.linspace(0, n - 1, limit).round().astype(int))
+
+
+# 2x3 performance layout of Plotter.plot_3 on a figure: specific thrust, TSFC and fuel/air ratio in the first row and the
+# efficiencies across the second. metrics: output name -> values over x, drawn as they are (see downsample_metrics)
+def performance_axes(figure, x, xlabel, metrics):
+    grid = figure.add_gridspec(2, 3)
+    first = None
+    for column, (name, title) in enumerate((('F_m0', "Turbofan specific thrust"),
+                                            ('TSFC', "Turbofan thrust-specific fuel consumption"),
+                                            ('f', "Turbofan fuel/air ratio"))):
+        ax = figure.add_subplot(grid[0, column], sharex=first)
+        first = first or ax
+        ax.plot(x, metrics[name], 'o-', color='black')
+        ax.set_title(title)
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(label(name))
+        ax.grid(True)
+    ax = figure.add_subplot(grid[1, :])
+    for name, marker, legend in (('eta_T', 'o-', 'ηT'), ('eta_P', 's-', 'ηP'), ('eta_O', 'd-', 'ηO')):
+        ax.plot(x, metrics[name], marker, color='black', label=legend)
+    ax.set_title("Turbofan thermal, propulsive, and overall efficiencies")
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel("Efficiency")
+    ax.grid(True)
+    ax.legend()
+
+
+# Open a source: a SweepResult as it is, a path to a result store directory or an .npz file
+def open_source(source):
+    from Iterations.Sweep import SweepResult
+    if isinstance(source, SweepResult):
+        return source
+    if os.path.isdir(source):
+        return SweepResult.from_store(source)
+    return SweepResult.from_npz(source)
+
+
+# The sweep of a figure with its "select" values fixed, checked to have exactly the given swept parameters left
+def _restrict(result, spec, dims):
+    selected = result.sel(**spec.get('select', {}))
+    if sorted(selected.dims) != sorted(dims):
+        raise ValueError(f"Figure '{spec['name']}' plots over {', '.join(dims)} but the sweep has {', '.join(selected.dims)} "
+                         f"left, fix the others with \"select\"")
+    return selected
+
+
+# Output of a sweep with its axes in the given order
+def _output(result, name, dims):
+    if name not in result.data:
+        raise ValueError(f"Output '{name}' is not in the sweep, it has: {', '.join(result.data)}")
+    return np.transpose(result[name], [result.dims.index(dim) for dim in dims])
+
+
+# Plot data of a figure spec from its sweep, reduced for plotting: a dict of small arrays and labels that is all a worker
+# needs to draw it
+def prepare(spec, result):
+    kind = spec.get('kind', 'lines')
+    if kind not in KINDS:
+        raise ValueError(f"Unknown figure kind '{kind}', expected one of: {', '.join(KINDS)}")
+    data = {'kind': kind, 'name': spec['name'], 'title': spec.get('title')}
+    if kind in ('lines', 'performance'):
+        x, series = spec['x'], spec.get('series') if kind == 'lines' else None
+        dims = (x, series) if series else (x,)
+        selected = _restrict(result, spec, dims)
+        names = spec.get('y', ['F_m0', 'TSFC']) if kind == 'lines' else ('F_m0', 'TSFC', 'f', 'eta_T', 'eta_P', 'eta_O')
+        if isinstance(names, str):
+            names = [names]
+        index = thin(len(selected.coords[series]), MAX_LINES) if series else [None]
+        values = selected.coords[x]
+        if kind == 'performance': # One shared set of indices, so all six metrics are drawn against the same x
+            xs, metrics = downsample_metrics(values, {name: _output(selected, name, dims) for name in names})
+            data.update(x=x, xs=xs, metrics=metrics)
+            return data
+        lines = {}
+        for name in names:
+            array = _output(selected, name, dims)
+            lines[name] = [downsample(values, array if i is None else array[:, i]) for i in index]
+        data.update(x=x, lines=lines, series=series, series_values=selected.coords[series][index] if series else None)
+    elif kind == 'contour':
+        dims = (spec['x'], spec['y'])
+        selected = _restrict(result, spec, dims)
+        ix, iy = (thin(len(selected.coords[dim]), MAX_GRID) for dim in dims)
+        data.update(x=dims[0], y=dims[1], z=spec['z'], levels=spec.get('levels', 15),
+                    xs=selected.coords[dims[0]][ix], ys=selected.coords[dims[1]][iy],
+                    zs=np.asarray(_output(selected, spec['z'], dims)[np.ix_(ix, iy)]))
+    else: # carpet
+        dims = tuple(spec.get('dims') or [dim for dim in result.dims if dim not in spec.get('select', {})])
+        if len(dims) != 2:
+            raise ValueError(f"Carpet '{spec['name']}' needs two swept parameters, got: {', '.join(dims)}")
+        selected = _restrict(result, spec, dims)
+        xs, ys = (np.asarray(_output(selected, spec[axis], dims)) for axis in ('x', 'y'))
+        families = []
+        for axis, dim in enumerate(dims): # Lines of constant dim, drawn along the other swept parameter
+            along = len(selected.coords[dims[1 - axis]])
+            points = thin(along, MAX_POINTS)
+            lines = []
+            for i in thin(len(selected.coords[dim]), MAX_LINES):
+                line = (i, points) if axis == 0 else (points, i)
+                lines.append((selected.coords[dim][i], xs[line], ys[line]))
+            families.append((dim, lines))
+        data.update(x=spec['x'], y=spec['y'], families=families)
+    return data
+
+
+# Draw prepared plot data on a new Figure (no pyplot, so nothing is registered with a GUI backend)
+def draw(data):
+    from matplotlib.figure import Figure
+    kind = data['kind']
+    if kind == 'performance':
+        figure = Figure(figsize=(20, 10), dpi=DPI)
+        performance_axes(figure, data['xs'], label(data['x']), data['metrics'])
+        if data['title']:
+            figure.suptitle(data['title'])
+        return figure
+    figure = Figure(figsize=FIGSIZE, dpi=DPI)
+    ax = figure.add_subplot()
+    if kind == 'lines':
+        for name, lines in data['lines'].items():
+            for k, (x, y) in enumerate(lines):
+                legend = label(name)
+                if data['series'] is not None:
+                    legend += f", {label(data['series'])} = {data['series_values'][k]:.4g}"
+                ax.plot(x, y, '-', label=legend)
+        ax.set_xlabel(label(data['x']))
+        ax.set_ylabel(label(next(iter(data['lines']))) if len(data['lines']) == 1 else "")
+        ax.legend(fontsize='small')
+    elif kind == 'contour':
+        X, Y = np.meshgrid(data['xs'], data['ys'], indexing='ij')
+        filled = ax.contourf(X, Y, data['zs'], levels=data['levels'], cmap='viridis')
+        lines = ax.contour(X, Y, data['zs'], levels=filled.levels, colors='black', linewidths=0.5)
+        ax.clabel(lines, fontsize='x-small', fmt='%.4g')
+        figure.colorbar(filled, ax=ax, label=label(data['z']))
+        ax.set_xlabel(label(data['x']))
+        ax.set_ylabel(label(data['y']))
+    else: # carpet
+        for (dim, lines), color in zip(data['families'], ('black', 'tab:blue')):
+            for value, x, y in lines:
+                ax.plot(x, y, '-', color=color, linewidth=1)
+                ax.annotate(f"{label(dim)} = {value:.4g}", (x[-1], y[-1]), fontsize='x-small', color=color)
+        ax.set_xlabel(label(data['x']))
+        ax.set_ylabel(label(data['y']))
+    ax.set_title(data['title'] or data['name'])
+    ax.grid(True)
+    return figure
+
+
+# Draw and save a batch of prepared figures, run inside the worker processes. Returns the paths written
+def render_batch(batch, directory, fmt):
+    paths = []
+    for data in batch:
+        figure = draw(data)
+        path = os.path.join(directory, f"{data['name']}.{fmt}")
+        figure.savefig(path, format=fmt)
+        paths.append(path)
+    return paths
+
+
+# Render figure specs to files in directory. sources: source name -> SweepResult or path, a spec without a "source" uses
+# the only source. The figures are prepared in this process and rendered in batches across a process pool
+@Instrumentation.instrumented('render_report')
+def render_report(figures, sources, directory, fmt='png', workers=None):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown figure format '{fmt}', expected one of: {', '.join(FORMATS)}")
+    os.makedirs(directory, exist_ok=True)
+    opened, prepared = {}, []
+    for number, spec in enumerate(figures):
+        name = spec.get('source', next(iter(sources)) if len(sources) == 1 else None)
+        if name not in sources:
+            raise ValueError(f"Figure {number} needs a \"source\", one of: {', '.join(sources)}")
+        if name not in opened:
+            opened[name] = open_source(sources[name])
+        spec = dict(spec, name=spec.get('name', f"{number:02d}_{spec.get('kind', 'lines')}_{name}"))
+        with Instrumentation.span('report prepare'):
+            prepared.append(prepare(spec, opened[name]))
+    workers = min(workers or os.cpu_count(), len(prepared)) or 1
+    batches = [prepared[k::workers] for k in range(workers)]
+    if workers == 1:
+        with Instrumentation.span('report render'):
+            return render_batch(prepared, directory, fmt)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(render_batch, batch, directory, fmt) for batch in batches]
+        return sorted(path for future in futures for path in future.result())
+
+
+# Run a report spec (see the module docstring)
+def run_report(spec, workers=None):
+    sources = spec.get('sources') or {'source': spec['source']}
+    return render_report(spec['figures'], sources, spec.get('directory', 'Report'), spec.get('format', 'png'),
+                         workers or spec.get('workers'))
+
+
+if __name__ == '__main__':
+    from Iterations.Sweep import load_spec
+    parser = argparse.ArgumentParser(description="Render a headless plot report of sweep results")
+    parser.add_argument('spec', help="report spec, .json or .yaml")
+    parser.add_argument('--workers', type=int, help="rendering processes, default from the spec or os.cpu_count()")
+    args = parser.parse_args()
+    for path in run_report(load_spec(args.spec), args.workers):
+        print(path)
@@ -0,0 +1,410 @@
+"""
+This code runs a local evaluation service for the cycle, so tools that need cycle results on demand share one warm process
+instead of each importing the model and paying its startup and per-point costs. The service speaks plain HTTP/1.1 with
+JSON bodies, over TCP on the loopback interface or over a Unix socket, and only needs the standard library and NumPy.
+Concurrent requests are gathered into micro-batches: the first queued request waits at most BATCH_WINDOW for others, up to
+MAX_BATCH points, and every batch is evaluated as one vectorized TurboFanBatch on a worker thread, so the event loop keeps
+accepting requests meanwhile and requests that arrive during an evaluation form the next batch. Requests with different
+model options (exact, real_gas) are batched apart. At most MAX_PENDING points wait for evaluation, requests beyond that are
+turned away with 503 and a Retry-After header (backpressure), so a burst cannot grow the queue or the latency without
+bound. With a cache path, results are also kept in a persistent result cache (Storage/ResultCache.py) shared by all clients.
+
+    Endpoints:
+        POST /evaluate   {"inputs": {"BPR": [8, 10, 12], "pi_c": 36}, "outputs": ["TSFC", "d"], "real_gas": false}
+                         or {"points": [{"BPR": 10, "T04": 1600}, ...]}, inputs not given take their default values.
+                         Returns {"outputs": {"TSFC": [...], "d": [...]}}, null where the cycle has no solution
+        GET  /metrics    request, point and batch counts, batch sizes, queue depth, latency percentiles and throughput
+        GET  /health     {"status": "ok"}
+
+    Usage:
+        python Service/EvaluationService.py [--port 8750 | --unix /tmp/turbofan.sock] [--cache cycle_cache.sqlite]
+
+        client = ServiceClient(unix='/tmp/turbofan.sock')       # or ServiceClient(port=8750)
+        outputs = client.evaluate(inputs={'BPR': BPRs}, outputs=['TSFC'])
+"""
+import sys
+sys.path.append(".")
+import asyncio
+import collections
+import http.client
+import json
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from CycleAnalysis.TurboFanBatch import TurboFanBatch, DESIGN_NAMES, PARAMETER_NAMES, STATION_FIELDS, PERFORMANCE_FIELDS
+import Tools.Instrumentation as Instrumentation
+
+HOST, PORT         = '127.0.0.1', 8750
+INPUTS             = DESIGN_NAMES + PARAMETER_NAMES
+OUTPUTS            = PERFORMANCE_FIELDS + STATION_FIELDS
+MAX_BATCH          = 8192     # Points evaluated together at most
+BATCH_WINDOW       = 0.002    # Longest wait for more requests once one is queued, [s]
+MAX_PENDING        = 65536    # Points waiting for evaluation before requests are turned away
+MAX_REQUEST_POINTS = 100000   # Points in one request at most
+MAX_BODY           = 2**24    # Largest request body, [bytes]
+LATENCY_WINDOW     = 10000    # Latest request latencies kept for the percentiles
+RATE_WINDOW        = 10.      # Time over which the recent throughput is measured, [s]
+STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+          500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class ServiceError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# Request counts, batch sizes, latencies and throughput of a running service
+class ServiceMetrics:
+    def __init__(self):
+        self.started   = time.monotonic()
+        self.requests  = 0 # Requests answered with results
+        self.points    = 0 # Points evaluated
+        self.batches   = 0
+        self.rejected  = 0 # Requests turned away by backpressure
+        self.errors    = 0 # Bad requests and failed evaluations
+        self.max_batch = 0
+        self.busy      = 0. # Time spent evaluating batches, [s]
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW) # Seconds from arrival to result, per request
+        self.recent    = collections.deque() # (time, points) of the batches within RATE_WINDOW
+
+    def batch(self, points, seconds):
+        now = time.monotonic()
+        self.batches += 1
+        self.points += points
+        self.max_batch = max(self.max_batch, points)
+        self.busy += seconds
+        self.recent.append((now, points))
+        while self.recent and self.recent[0][0] < now - RATE_WINDOW:
+            self.recent.popleft()
+
+    def snapshot(self, pending=0):
+        uptime = time.monotonic() - self.started
+        latencies = np.array(self.latencies) * 1000
+        percentiles = dict(zip(('p50', 'p90', 'p99', 'max'), np.percentile(latencies, [50, 90, 99, 100]).tolist())) \
+            if latencies.size else {}
+        recent = [points for moment, points in self.recent if moment >= time.monotonic() - RATE_WINDOW]
+        return {
+            'uptime_s':          uptime,
+            'requests':          self.requests,
+            'points':            self.points,
+            'batches':           self.batches,
+            'rejected':          self.rejected,
+            'errors':            self.errors,
+            'pending_points':    pending,
+            'mean_batch_points': self.points / self.batches if self.batches else 0.,
+            'max_batch_points':  self.max_batch,
+            'latency_ms':        percentiles,
+            'points_per_s':      self.points / uptime if uptime > 0 else 0.,
+            'recent_points_per_s': sum(recent) / RATE_WINDOW,
+            'busy_fraction':     self.busy / uptime if uptime > 0 else 0.,
+        }
+
+
+# One request waiting for evaluation: its inputs as 1-D arrays of one length, the outputs it wants and the model options
+class _Job:
+    __slots__ = ('inputs', 'size', 'outputs', 'options', 'future', 'arrival')
+
+    def __init__(self, inputs, size, outputs, options, future):
+        self.inputs, self.size, self.outputs, self.options, self.future = inputs, size, outputs, options, future
+        self.arrival = time.monotonic()
+
+
+# Inputs of a request body as 1-D arrays of one length, from columns ("inputs", broadcast together) or from a list of
+# points ("points", inputs missing from a point take their defaults)
+def parse_inputs(body, defaults):
+    if ('inputs' in body) == ('points' in body):
+        raise ServiceError(400, "Give either 'inputs' or 'points'")
+    points = body.get('points', [])
+    if not isinstance(points, list) or not all(isinstance(point, dict) for point in points):
+        raise ServiceError(400, "'points' must be a list of objects of cycle inputs")
+    points = [dict(point) for point in points]
+    columns = body.get('inputs', {})
+    if not isinstance(columns, dict):
+        raise ServiceError(400, "'inputs' must be an object of cycle inputs")
+    columns = dict(columns)
+    unknown = sorted(set(columns).union(*points) - set(INPUTS))
+    if unknown:
+        raise ServiceError(400, f"Unknown cycle inputs: {', '.join(unknown)}")
+    if points:
+        for point in points: # Nozzles exhaust to the ambient pressure of their own point unless told otherwise
+            if 'pa' in point:
+                point.setdefault('p7', point['pa'])
+                point.setdefault('p8', point['pa'])
+        columns = {name: [point.get(name, defaults[name]) for point in points] for name in set().union(*points)}
+    if 'pa' in columns:
+        columns.setdefault('p7', columns['pa'])
+        columns.setdefault('p8', columns['pa'])
+    try:
+        arrays = {name: np.asarray(values, dtype=float) for name, values in columns.items()}
+        shape = np.broadcast_shapes((1,), *(array.shape for array in arrays.values()))
+    except (TypeError, ValueError) as error:
+        raise ServiceError(400, f"Inputs must be numbers or equally long lists of numbers: {error}")
+    if len(shape) != 1:
+        raise ServiceError(400, "Inputs must be numbers or 1-D lists")
+    invalid = sorted(name for name, array in arrays.items() if not np.isfinite(array).all()) # null is read as NaN
+    if invalid:
+        raise ServiceError(400, f"Inputs must be finite numbers, not null, NaN or infinite: {', '.join(invalid)}")
+    if shape[0] > MAX_REQUEST_POINTS:
+        raise ServiceError(413, f"At most {MAX_REQUEST_POINTS} points per request")
+    return {name: np.broadcast_to(array, shape) for name, array in arrays.items()}, shape[0]
+
+
+class EvaluationService:
+    def __init__(self, cache=None, max_batch=MAX_BATCH, batch_window=BATCH_WINDOW, max_pending=MAX_PENDING):
+        self.cache_path   = cache
+        self.max_batch    = max_batch
+        self.batch_window = batch_window
+        self.max_pending  = max_pending
+        self.metrics      = ServiceMetrics()
+        self.pending      = 0 # Points queued or being evaluated
+        self.defaults     = {name: float(value) for name, value in TurboFanBatch().inputs().items()}
+        self._caches      = {} # Result caches per model options, opened on the worker thread that uses them
+        self._executor    = ThreadPoolExecutor(max_workers=1) # Batches run one at a time, off the event loop
+        self._queue       = None
+
+    # Evaluate one group of points with the same model options, on the worker thread
+    def _evaluate(self, options, inputs, outputs):
+        with np.errstate(invalid='ignore', divide='ignore'), Instrumentation.span('service batch'):
+            if self.cache_path is not None:
+                from Storage.ResultCache import ResultCache, evaluate_cached
+                key = tuple(sorted(options.items()))
+                if key not in self._caches:
+                    self._caches[key] = ResultCache(self.cache_path, options={k: v for k, v in key if v})
+                results = evaluate_cached(self._caches[key], **inputs)
+            else:
+                engine = TurboFanBatch(**options, **inputs)
+                results = dict(zip(PERFORMANCE_FIELDS, engine.performance()), **engine.stations())
+            return {name: np.asarray(results[name]) for name in outputs}
+
+    # Evaluate the jobs of one batch, grouped by model options, and hand every job its slice of the results
+    async def _run_batch(self, jobs):
+        loop = asyncio.get_running_loop()
+        groups = collections.defaultdict(list)
+        for job in jobs:
+            groups[tuple(sorted(job.options.items()))].append(job)
+        for key, group in groups.items():
+            names = sorted(set().union(*(job.inputs for job in group)))
+            inputs = {name: np.concatenate([job.inputs[name] if name in job.inputs else np.full(job.size, self.defaults[name])
+                                            for job in group]) for name in names}
+            outputs = sorted(set().union(*(job.outputs for job in group)))
+            size = sum(job.size for job in group)
+            start = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self._executor, self._evaluate, dict(key), inputs, outputs)
+            except Exception as error:
+                for job in group:
+                    if not job.future.done():
+                        job.future.set_exception(ServiceError(500, f"Evaluation failed: {error}"))
+            else:
+                self.metrics.batch(size, time.perf_counter() - start)
+                offset = 0
+                for job in group:
+                    if not job.future.done():
+                        job.future.set_result({name: results[name][offset:offset + job.size] for name in job.outputs})
+                    offset += job.size
+            finally:
+                self.pending -= size
+
+    # Gather queued jobs into micro-batches: after the first job, wait up to the batch window for more, then evaluate
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            jobs = [await self._queue.get()]
+            points = jobs[0].size
+            deadline = loop.time() + self.batch_window
+            while points < self.max_batch:
+                if self._queue.empty():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        job = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    job = self._queue.get_nowait()
+                jobs.append(job)
+                points += job.size
+            await self._run_batch(jobs)
+
+    # Queue the points of a request body and wait for their outputs
+    async def evaluate(self, body):
+        if not isinstance(body, dict):
+            raise ServiceError(400, "The request body must be a JSON object")
+        inputs, size = parse_inputs(body, self.defaults)
+        outputs = body.get('outputs', PERFORMANCE_FIELDS)
+        if not isinstance(outputs, (list, tuple)) or not all(isinstance(name, str) for name in outputs):
+            raise ServiceError(400, "'outputs' must be a list of output names")
+        outputs = tuple(outputs)
+        unknown = sorted(set(outputs) - set(OUTPUTS))
+        if unknown:
+            raise ServiceError(400, f"Unknown outputs: {', '.join(unknown)}")
+        options = {name: body.get(name, False) for name in ('exact', 'real_gas')}
+        invalid = sorted(name for name, value in options.items() if not isinstance(value, bool))
+        if invalid:
+            raise ServiceError(400, f"{', '.join(invalid)} must be true or false")
+        if self.pending + size > self.max_pending:
+            self.metrics.rejected += 1
+            raise ServiceError(503, f"Busy, {self.pending} points are waiting")
+        self.pending += size
+        job = _Job(inputs, size, outputs, options, asyncio.get_running_loop().create_future())
+        await self._queue.put(job)
+        results = await job.future
+        self.metrics.requests += 1
+        self.metrics.latencies.append(time.monotonic() - job.arrival)
+        # NaN (no cycle solution) becomes null, which JSON can hold
+        return {'outputs': {name: [None if value != value else value for value in array.tolist()]
+                            for name, array in results.items()}}
+
+    async def _route(self, method, path, body):
+        path = path.split('?', 1)[0]
+        if path == '/evaluate':
+            if method != 'POST':
+                raise ServiceError(405, "Use POST for /evaluate")
+            try:
+                request = json.loads(body or b'null')
+            except ValueError as error:
+                raise ServiceError(400, f"Invalid JSON: {error}")
+            return await self.evaluate(request)
+        if path in ('/metrics', '/health'):
+            if method != 'GET':
+                raise ServiceError(405, f"Use GET for {path}")
+            return self.metrics.snapshot(self.pending) if path == '/metrics' else {'status': 'ok'}
+        raise ServiceError(404, f"No such endpoint: {path}")
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode()
+        headers = [f"HTTP/1.1 {status} {STATUS[status]}", 'Content-Type: application/json', f"Content-Length: {len(body)}",
+                   f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if status == 503:
+            headers.append('Retry-After: 1')
+        writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+    # Serve the requests of one connection, kept open between requests unless the client closes it
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                parts = line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                if len(parts) != 3:
+                    await self._respond(writer, 400, {'error': "Malformed request line"}, False)
+                    break
+                method, path, version = parts
+                length = int(headers.get('content-length') or 0)
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, {'error': f"Bodies of at most {MAX_BODY} bytes"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                try:
+                    status, payload = 200, await self._route(method, path, body)
+                except ServiceError as error:
+                    if error.status != 503:
+                        self.metrics.errors += 1
+                    status, payload = error.status, {'error': str(error)}
+                except Exception as error: # A bug, the client still gets an answer and the connection is closed
+                    self.metrics.errors += 1
+                    status, payload, keep_alive = 500, {'error': f"{type(error).__name__}: {error}"}, False
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    # Serve on a Unix socket path if given, else on TCP host:port, until cancelled
+    async def serve(self, host=HOST, port=PORT, unix=None, ready=None):
+        self._queue = asyncio.Queue()
+        # Warm up: imports, gas tables and the first batch are paid for before the first request
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._evaluate,
+                                                         {'exact': False, 'real_gas': True}, {}, PERFORMANCE_FIELDS)
+        if unix is not None:
+            server = await asyncio.start_unix_server(self._handle, path=unix)
+        else:
+            server = await asyncio.start_server(self._handle, host, port)
+        batcher = asyncio.create_task(self._batcher())
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self._executor.shutdown(wait=False)
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=60):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+# Client of a running service, keeps its connection open between calls
+class ServiceClient:
+    def __init__(self, host=HOST, port=PORT, unix=None, timeout=60):
+        self.connection = _UnixConnection(unix, timeout) if unix is not None else \
+            http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _request(self, method, path, payload=None):
+        body = json.dumps(payload) if payload is not None else None
+        self.connection.request(method, path, body, {'Content-Type': 'application/json'} if body else {})
+        response = self.connection.getresponse()
+        data = json.loads(response.read())
+        if response.status != 200:
+            raise ServiceError(response.status, data.get('error', response.reason))
+        return data
+
+    # Outputs at the given inputs (columns) or points (list of dicts), as a dict of float arrays with NaN where the cycle
+    # has no solution
+    def evaluate(self, inputs=None, points=None, outputs=PERFORMANCE_FIELDS, exact=False, real_gas=False):
+        body = {'outputs': list(outputs), 'exact': exact, 'real_gas': real_gas}
+        if points is not None:
+            body['points'] = points
+        else:
+            body['inputs'] = {name: np.asarray(values, dtype=float).tolist() for name, values in (inputs or {}).items()}
+        data = self._request('POST', '/evaluate', body)['outputs']
+        return {name: np.array(values, dtype=float) for name, values in data.items()}
+
+    def metrics(self):
+        return self._request('GET', '/metrics')
+
+    def close(self):
+        self.connection.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Serve cycle evaluations over HTTP on a local port or Unix socket")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--unix', help="serve on this Unix socket path instead of TCP")
+    parser.add_argument('--cache', help="persistent result cache shared by all requests")
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH, help="points evaluated together at most")
+    parser.add_argument('--batch-window', type=float, default=BATCH_WINDOW, help="wait for more requests, [s]")
+    parser.add_argument('--max-pending', type=int, default=MAX_PENDING, help="queued points before requests get 503")
+    args = parser.parse_args()
+    service = EvaluationService(args.cache, args.max_batch, args.batch_window, args.max_pending)
+    print(f"Serving on {args.unix or f'http://{args.host}:{args.port}'}")
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,109 @@
+"""
+This code provides a persistent, content-addressed cache of evaluated design points, shared between runs and users.
+Each point is keyed by a hash of its full input set: the design variables (BPR, pi_f, pi_c) and every constant from
+Parameters/TurboFanParameters.py used by the cycle (TurboFanBatch.PARAMETER_NAMES), so a point is only reused when every
+input matches. The cached value holds the performance() outputs and every station quantity.
+The cache is a SQLite database in WAL mode so several processes can read and write it at once. It keeps at most
+max_entries points and evicts the least recently used ones beyond that. The number of points is kept in a metadata row,
+updated in the same transaction as every insert and eviction, so it is never counted by scanning the table.
+
+    Usage:
+        cache = ResultCache('cycle_cache.sqlite')
+        outputs = evaluate_cached(cache, BPR=np.linspace(5, 20, 16), pi_f=1.5, pi_c=36.)
+"""
+import sys
+sys.path.append(".")
+import hashlib
+import json
+import sqlite3
+import time
+import numpy as np
+from CycleAnalysis.TurboFanBatch import TurboFanBatch, DESIGN_NAMES, PARAMETER_NAMES, STATION_FIELDS, PERFORMANCE_FIELDS
+
+INPUTS      = DESIGN_NAMES + PARAMETER_NAMES
+OUTPUTS     = PERFORMANCE_FIELDS + STATION_FIELDS
+MAX_ENTRIES = 5000000 # About 2 GB of cached points
+# Changes whenever the inputs, outputs or cycle model change, so stale entries are never matched
+MODEL_VERSION = 'turbofan-cycle-1:' + ','.join(INPUTS) + ':' + ','.join(OUTPUTS)
+
+
+class ResultCache:
+    def __init__(self, path, max_entries=MAX_ENTRIES, options=None):
+        self.path        = path
+        self.max_entries = max_entries
+        self.options     = dict(options or {}) # Model options that change the results, e.g. {'exact': True} or {'real_gas': True}
+        self._prefix     = (MODEL_VERSION + json.dumps(self.options, sort_keys=True)).encode() # Part of every key
+        self._db = sqlite3.connect(path, timeout=60)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('BEGIN IMMEDIATE') # Other processes may be setting up the same cache
+        self._db.execute('CREATE TABLE IF NOT EXISTS results (key BLOB PRIMARY KEY, value BLOB, last_access REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)')
+        # Caches written before the count was kept are counted once
+        self._db.execute("INSERT OR IGNORE INTO meta SELECT 'entries', COUNT(*) FROM results "
+                         "WHERE NOT EXISTS (SELECT 1 FROM meta WHERE name = 'entries')")
+        self._db.commit()
+
+    def __len__(self):
+        return self._db.execute("SELECT value FROM meta WHERE name = 'entries'").fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+    # One key per point from a mapping of every input name -> array, all of the same shape
+    def keys(self, inputs):
+        rows = np.stack([np.ravel(inputs[name]) for name in INPUTS], axis=1).astype('<f8') + 0.0 # + 0.0 turns -0.0 into 0.0
+        return [hashlib.sha256(self._prefix + row.tobytes()).digest()[:16] for row in rows]
+
+    # Cached outputs for the given keys, as (found mask, values with one row per key in OUTPUTS order)
+    def get(self, keys):
+        values = np.full((len(keys), len(OUTPUTS)), np.nan)
+        found = np.zeros(len(keys), dtype=bool)
+        index = {key: i for i, key in enumerate(keys)}
+        hits = []
+        for start in range(0, len(keys), 500): # Stay below SQLite's limit on query parameters
+            batch = keys[start:start + 500]
+            query = f"SELECT key, value FROM results WHERE key IN ({','.join('?' * len(batch))})"
+            for key, value in self._db.execute(query, batch):
+                i = index[key]
+                values[i] = np.frombuffer(value, dtype='<f8')
+                found[i] = True
+                hits.append(key)
+        if hits: # Record the access for the LRU eviction
+            now = time.time()
+            self._db.executemany('UPDATE results SET last_access = ? WHERE key = ?', ((now, key) for key in hits))
+            self._db.commit()
+        return found, values
+
+    # Store outputs (one row per key in OUTPUTS order) and evict the least recently used points beyond max_entries
+    def put(self, keys, values):
+        now = time.time()
+        values = np.asarray(values, dtype='<f8')
+        # Points already cached (by another process since get) hold the same outputs, only the new ones are added
+        added = self._db.executemany('INSERT OR IGNORE INTO results VALUES (?, ?, ?)',
+                                     ((key, row.tobytes(), now) for key, row in zip(keys, values))).rowcount
+        self._db.execute("UPDATE meta SET value = value + ? WHERE name = 'entries'", (added,))
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            evicted = self._db.execute('DELETE FROM results WHERE key IN '
+                                       '(SELECT key FROM results ORDER BY last_access LIMIT ?)', (excess,)).rowcount
+            self._db.execute("UPDATE meta SET value = value - ? WHERE name = 'entries'", (evicted,))
+        self._db.commit()
+
+
+# Evaluate a batch like TurboFanBatch with the cache's model options, reusing cached points and caching the new ones.
+# Returns a dict of every output in OUTPUTS (performance and station quantities) with the batch shape
+def evaluate_cached(cache, **inputs):
+    exact = bool(cache.options.get('exact', False))
+    real_gas = bool(cache.options.get('real_gas', False))
+    resolved = TurboFanBatch(**inputs).inputs() # Defaults filled in, nothing is evaluated yet
+    shape = np.broadcast_shapes(*(array.shape for array in resolved.values()))
+    keys = cache.keys(resolved)
+    found, values = cache.get(keys)
+    missing = ~found
+    if missing.any():
+        engine = TurboFanBatch(exact=exact, real_gas=real_gas, **{name: np.ravel(array)[missing] for name, array in resolved.items()})
+        outputs = dict(zip(PERFORMANCE_FIELDS, engine.performance()), **engine.stations())
+        values[missing] = np.stack([outputs[name] for name in OUTPUTS], axis=1)
+        cache.put([key for key, miss in zip(keys, missing) if miss], values[missing])
+    return {name: values[:, i].reshape(shape) for i, name in enumerate(OUTPUTS)}
@@ -0,0 +1,164 @@
+"""
+This code provides a columnar result store for sweep outputs. A store is a directory holding one raw binary file per
+column (station quantities, performance outputs and the swept inputs) plus a "manifest.json" with the column names,
+row count and free-form metadata such as the sweep dimensions.
+ResultWriter keeps every column file open and streams chunks into them as they are produced, so no text is formatted and
+no file is reopened per point. ResultReader memory-maps the columns, so reading a subset of columns or rows is zero-copy,
+and builds the human-readable tables (the per-component table of a point or a performance table) on demand.
+
+    Usage:
+        python Storage/ResultStore.py STORE                     # summary of the store
+        python Storage/ResultStore.py STORE --point 12          # component table of row 12
+        python Storage/ResultStore.py STORE --columns BPR,TSFC  # table of the given columns
+"""
+import sys
+sys.path.append(".")
+import json
+import os
+import numpy as np
+import Tools.Instrumentation as Instrumentation
+
+MANIFEST = 'manifest.json'
+DTYPE    = np.dtype('<f8') # Every column is stored as little-endian float64
+
+
+def _column_path(path, name):
+    return os.path.join(path, f"{name}.f8")
+
+
+class ResultWriter:
+    def __init__(self, path, columns, meta=None, mode='w'):
+        self.path    = path
+        self.columns = tuple(columns)
+        self.meta    = dict(meta or {})
+        self.rows    = 0
+        os.makedirs(path, exist_ok=True)
+        if mode == 'a' and os.path.exists(os.path.join(path, MANIFEST)): # Continue an existing store
+            reader = ResultReader(path)
+            if reader.columns != self.columns:
+                raise ValueError(f"Store {path} has columns {reader.columns}, cannot append {self.columns}")
+            self.rows = len(reader)
+            self.meta = dict(reader.meta, **self.meta)
+            for name in self.columns: # Drop anything written after the last manifest update
+                with open(_column_path(path, name), 'r+b') as file:
+                    file.truncate(self.rows * DTYPE.itemsize)
+            mode = 'a'
+        else:
+            mode = 'w'
+        self._files = {name: open(_column_path(path, name), mode + 'b') for name in self.columns}
+        self._write_manifest()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Append a chunk of rows, given as a mapping of column name -> array (arrays are flattened in C order)
+    @Instrumentation.instrumented('ResultWriter.append')
+    def append(self, chunk):
+        missing = [name for name in self.columns if name not in chunk]
+        if missing:
+            raise ValueError(f"Chunk is missing columns: {', '.join(missing)}")
+        arrays = {name: np.ravel(np.asarray(chunk[name], dtype=DTYPE)) for name in self.columns}
+        rows = max(array.size for array in arrays.values())
+        for name, array in arrays.items():
+            if array.size == 1 and rows > 1: # Scalars are repeated for every row of the chunk
+                array = np.full(rows, array[0], dtype=DTYPE)
+            elif array.size != rows:
+                raise ValueError(f"Column {name} has {array.size} rows, the rest of the chunk has {rows}")
+            array.tofile(self._files[name])
+        self.rows += rows
+
+    # Make the rows written so far visible to readers
+    @Instrumentation.instrumented('ResultWriter.flush')
+    def flush(self):
+        for file in self._files.values():
+            file.flush()
+        self._write_manifest()
+
+    def close(self):
+        if self._files:
+            self.flush()
+            for file in self._files.values():
+                file.close()
+            self._files = {}
+
+    def _write_manifest(self):
+        manifest = {'columns': self.columns, 'rows': self.rows, 'dtype': DTYPE.str, 'meta': self.meta}
+        temp = os.path.join(self.path, MANIFEST + '.tmp')
+        with open(temp, 'w') as file:
+            json.dump(manifest, file, indent=4)
+        os.replace(temp, os.path.join(self.path, MANIFEST)) # Readers never see a half-written manifest
+
+
+class ResultReader:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as file:
+            manifest = json.load(file)
+        self.columns = tuple(manifest['columns'])
+        self.rows    = manifest['rows']
+        self.meta    = manifest['meta']
+        self._maps   = {}
+
+    def __len__(self):
+        return self.rows
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    # Read-only memory map of one column, no data is copied
+    def __getitem__(self, name):
+        if name not in self.columns:
+            raise KeyError(name)
+        if name not in self._maps:
+            if self.rows:
+                self._maps[name] = np.memmap(_column_path(self.path, name), dtype=DTYPE, mode='r', shape=(self.rows,))
+            else:
+                self._maps[name] = np.empty(0, dtype=DTYPE)
+        return self._maps[name]
+
+    # Views of the given columns (default all) and rows (an index, slice or index array; slices stay zero-copy)
+    def read(self, columns=None, rows=slice(None)):
+        return {name: self[name][rows] for name in (columns or self.columns)}
+
+    # Values of every column at one row, with swept-constant inputs filled in from the metadata
+    def row(self, index):
+        values = dict(self.meta.get('fixed', {}))
+        values.update({name: float(self[name][index]) for name in self.columns})
+        return values
+
+    def to_frame(self, columns=None, rows=slice(None)):
+        import pandas as pd # Only needed for reporting
+        return pd.DataFrame(self.read(columns, rows))
+
+    # Per-component table of one row, the same table TurboFan.display_results produces
+    def component_table(self, index):
+        from CycleAnalysis.TurboFan import component_table
+        from Parameters.Conditions import EngineDesign
+        values = self.row(index)
+        values.setdefault('T04', EngineDesign().T04)
+        return component_table(values)
+
+    # Text table of the given columns and rows
+    def table(self, columns=None, rows=slice(None)):
+        return self.to_frame(columns, rows).to_string()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Print tables from a result store")
+    parser.add_argument('store')
+    parser.add_argument('--point', type=int, help="row to print the component table of")
+    parser.add_argument('--columns', help="comma separated columns to print")
+    args = parser.parse_args()
+    reader = ResultReader(args.store)
+    if args.point is not None:
+        print(reader.component_table(args.point))
+    elif args.columns:
+        print(reader.table(args.columns.split(',')))
+    else:
+        print(f"{reader.path}: {len(reader)} rows")
+        print(f"columns: {', '.join(reader.columns)}")
+        print(f"meta: {json.dumps(reader.meta)}")
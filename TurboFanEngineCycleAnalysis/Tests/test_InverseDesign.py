@@ -0,0 +1,46 @@
+"""
+This code tests the inverse design solver of Optimization/InverseDesign.py.
+
+    Usage:
+        python -m pytest Tests
+"""
+import sys
+sys.path.append(".")
+import numpy as np
+from CycleAnalysis.TurboFanBatch import TurboFanBatch
+from Optimization.InverseDesign import solve_inverse
+
+
+# With the default T04 bounds the cycle (BPR 8, pi_f 1.6, pi_c 36) only has a solution from T04 of about 1225 K, so the
+# lower bound end has none. The bracket must reach the edge of the feasible region, every reachable thrust down to the
+# thrust at the edge is bracketed and solved
+def test_bracket_reaches_feasibility_edge():
+    inputs = {'BPR': 8, 'pi_f': 1.6, 'pi_c': 36}
+    targets = np.linspace(5e4, 1.5e5, 50)
+    result = solve_inverse('T04', 'F', targets, mass_flow=600., **inputs)
+    T04 = np.linspace(1000., 2200., 20001)
+    thrust = TurboFanBatch(exact=True, T04=T04, **inputs).performance()[0] * 600.
+    reachable = (targets >= np.nanmin(thrust)) & (targets <= np.nanmax(thrust))
+    assert np.isnan(thrust[0]) and reachable.all()
+    assert result.bracketed.all() and result.converged.all()
+    solved = TurboFanBatch(exact=True, T04=result.x, **inputs).performance()[0] * 600.
+    assert np.allclose(solved, targets, rtol=1e-8)
+
+
+# F_m0 rises and falls again with pi_f, so for this target both halves of the bounds around a guess just past the upper
+# root have no sign change. The guess is next to the root and must still be bracketed and solved
+def test_guess_just_past_a_root():
+    result = solve_inverse('pi_f', 'F_m0', 154.5, guess=2.5892, BPR=6, pi_c=36, T04=1560)
+    assert result.bracketed and result.converged
+    assert abs(result.x - 2.58914) < 1e-4
+
+
+# Warm starts reuse the solutions of neighbouring points as guesses, they must bracket the same points as cold starts
+def test_warm_and_cold_starts_bracket_the_same_points():
+    inputs = {'BPR': np.linspace(6, 14, 200)[:, None], 'pi_c': 36, 'T04': 1560}
+    targets = np.linspace(150, 200, 100)[None, :]
+    warm = solve_inverse('pi_f', 'F_m0', targets, warm_start=True, **inputs)
+    cold = solve_inverse('pi_f', 'F_m0', targets, warm_start=False, **inputs)
+    assert warm.bracketed.any()
+    assert np.array_equal(warm.bracketed, cold.bracketed)
+    assert np.array_equal(warm.converged, warm.bracketed) and np.array_equal(cold.converged, cold.bracketed)
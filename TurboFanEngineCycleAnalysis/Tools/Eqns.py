@@ -1,22 +1,34 @@
 """
 Various equations used by the TurboFan class
 """
-import sympy as sp
+import numpy as np
 
 import sys
 sys.path.append(".")
 
+# Round element-wise exactly like the built-in round(), which np.round does not do for values halfway after scaling
+def round_array(x, ndigits):
+    x      = np.asarray(x, dtype=float)
+    scaled = x * 10.0**ndigits
+    result = np.asarray(np.round(scaled) / 10.0**ndigits)
+    ties   = np.abs(scaled - np.trunc(scaled)) == 0.5 # Resolve these with round() on the exact binary value
+    if ties.any():
+        result[ties] = [round(float(value), ndigits) for value in x[ties]]
+    return result if result.ndim else result[()]
+
 # Calculate the ratio of total temperatures 
 def T02_T01(ratio, n):
     return (ratio)**n
 
-# Calculates (n-1)/n for a fan or compressor based on n_i and gamma
-def n1_n(n_i, gamma = 1.4):
-    return round(1/(n_i) * ((gamma-1)/gamma),4)
+# Calculates (n-1)/n for a fan or compressor based on n_i and gamma, unrounded when exact
+def n1_n(n_i, gamma = 1.4, exact=False):
+    n1 = 1/(n_i) * ((gamma-1)/gamma)
+    return n1 if exact else round_array(n1,4)
 
-# Calculates (m-1)/m for a turbine based on n_t and gamma
-def m1_m(n_i, gamma = 1.3333):
-    return round((n_i) * ((gamma-1)/gamma),4)
+# Calculates (m-1)/m for a turbine based on n_t and gamma, unrounded when exact
+def m1_m(n_i, gamma = 1.3333, exact=False):
+    m1 = (n_i) * ((gamma-1)/gamma)
+    return m1 if exact else round_array(m1,4)
 
 # Calculate the pressure ratio P0/P1 for a given Mach number
 def pressure_ratio(M, gamma=1.4):
@@ -33,13 +45,14 @@ def total_temperature(M, T, gamma=1.4):
     T0T1 = (1 + (gamma-1)/2.0*M**2.0)
     return T0T1*T
 
-# Ideal fuel flow fraction
+# Ideal fuel flow fraction, analytic solution of (1 + f)*c_pg*(T_afcomb - 298) - f*h_fuel + c_pa*(298 - T_b4comb) = 0
 def solve_f_ideal( T_b4comb, T_afcomb, c_pa=1.005, c_pg=1.148, h_fuel=43100):
-    f = sp.symbols('f')
-    solve_f = (1 + f)*c_pg*(T_afcomb - 298) + (f * -h_fuel) + (c_pa * (298 - T_b4comb))
-    f_ideal = sp.solve(solve_f, f)
-    f_ideal = round(float(f_ideal[0]), 5)
-    return f_ideal
+    f_ideal = (c_pg*(T_afcomb - 298) + c_pa*(298 - T_b4comb)) / (h_fuel - c_pg*(T_afcomb - 298))
+    return round_array(f_ideal, 5)
+
+# Drag coefficient of the aircraft drag polar for a lift coefficient
+def drag_coefficient(C_L):
+    return 0.056*C_L**2 - 0.004*C_L + 0.014
 
 # Calculate TSFC in units of g/kN-s
 def get_TSFC(f, F, mDot0):
@@ -0,0 +1,178 @@
+"""
+Temperature dependent gas properties for the real-gas option of TurboFan and TurboFanBatch (real_gas=True).
+The specific heat of dry air and of kerosene combustion products follows the polynomial fits of Walsh & Fletcher (Gas
+Turbine Performance): cp(T, f) = A(T/1000) + f/(1+f) * B(T/1000), valid from 200 to 2000 K (the tables run to 2400 K).
+From them the enthalpy h(T, f) = int cp dT (zero at the fuel heating value reference of 298.15 K) and the entropy function
+phi(T, f) = int cp/T dT are integrated analytically, and the air and products parts of all three are tabulated once, on
+first use, over a uniform temperature grid (1 K). Every property is linear in f/(1+f), so the air and products tables give
+it exactly at any fuel-air ratio. Lookups interpolate linearly on the uniform grid, so the cell index is computed directly
+instead of searched, and work on whole arrays (complex arrays too, for the complex-step derivatives).
+Temperatures are recovered from enthalpy or entropy function values by Newton iterations on the tables, which converge
+in a few steps since the table slope is the specific heat (or cp/T). Units follow TurboFanParameters: cp, phi, R in kJ/kgK
+and h in kJ/kg.
+
+    Usage:
+        T03 = polytropic_temperature(T02, pi_c, n_infc)              # compression with a polytropic efficiency
+        f   = fuel_air_ratio(T03, T04, h_fuel)                       # combustor energy balance with the products at f
+        T05, p05_p04 = turbine(T04, work, n_inft, f)                 # turbine delivering the work [kJ/kg]
+        DeltaT, C = nozzle(T06, p06 / p7, n_j, f)                    # nozzle temperature drop and exit velocity
+        cp(T04, f), gamma(T04, f), enthalpy(T04, f)
+"""
+import sys
+sys.path.append(".")
+import functools
+import numpy as np
+
+# Walsh & Fletcher cp fits in T/1000 [kJ/kgK]: dry air (A0..A8) and the combustion products correction (B0..B7)
+AIR      = (0.992313, 0.236688, -1.852148, 6.083152, -8.893933, 7.097112, -3.234725, 0.794571, -0.081873)
+PRODUCTS = (-0.718874, 8.747481, -15.863157, 17.254096, -10.233795, 3.081778, -0.361112, -0.003919)
+
+T_MIN, T_MAX, T_STEP = 200., 2400., 1.  # Temperature grid of the tables, [K]
+T_REF                = 298.15           # Zero of the enthalpy, reference temperature of the fuel heating value, [K]
+R_GAS                = 287.05e-3        # Gas constant of air and products, [kJ/kgK]
+MAX_ITER             = 10               # Iteration limit of the table inversions
+SUBSET               = 0.25             # Fraction of points below which the inversions only step the points still moving
+
+
+# cp, h and phi of a Walsh & Fletcher fit at temperatures T, from the coefficients of the polynomial in T/1000
+def _integrate(coefficients, T):
+    polynomial = np.polynomial.Polynomial(coefficients)
+    TZ, TZ_ref = T / 1000, T_REF / 1000
+    antiderivative = polynomial.integ()
+    # int cp/T dT = A0 ln(T) + int of the remaining terms divided by T
+    over_T = np.polynomial.Polynomial(coefficients[1:]).integ()
+    cp  = polynomial(TZ)
+    h   = 1000 * (antiderivative(TZ) - antiderivative(TZ_ref))
+    phi = coefficients[0] * np.log(TZ / TZ_ref) + over_T(TZ) - over_T(TZ_ref)
+    return cp, h, phi
+
+
+# Property tables, built on first use and kept: for cp, h and phi the air and the products correction as the intercept and
+# slope of the line through every temperature cell, value = intercept + slope * T, each a contiguous array (gathers from
+# separate arrays are much faster than gathers of table rows)
+@functools.lru_cache(maxsize=None)
+def property_tables():
+    T = np.arange(T_MIN, T_MAX + T_STEP / 2, T_STEP)
+    tables = []
+    for air, products in zip(_integrate(AIR, T), _integrate(PRODUCTS, T)):
+        columns = []
+        for values in (air, products):
+            slope = np.append(np.diff(values), 0.) / T_STEP
+            columns += [values - slope * T, slope]
+        tables.append(tuple(columns))
+    return tuple(tables)
+
+
+# Temperature cell of every point, from the real part of T. fmax / fmin put NaN temperatures in the first cell, where
+# their values stay NaN
+def _cell(T):
+    return np.fmin(np.fmax((np.real(T) - T_MIN) * (1 / T_STEP), 0), (T_MAX - T_MIN) / T_STEP - 1).astype(int)
+
+
+# Products mass fraction f/(1+f) weighting the products correction of the tables, None for air
+def _fraction(f):
+    return None if np.ndim(f) == 0 and f == 0 else f / (1 + f)
+
+
+# Linear lookup of a table at temperatures T in the given cells, for products mass fractions x (broadcast with T). Returns
+# the value and its slope along T, complex T keeps its imaginary part
+def _lookup(table, T, x, cell):
+    intercept, slope = table[0].take(cell), table[1].take(cell)
+    if x is not None:
+        intercept = intercept + x * table[2].take(cell)
+        slope = slope + x * table[3].take(cell)
+    return intercept + slope * T, slope
+
+
+def cp(T, f=0.):
+    return _lookup(property_tables()[0], T, _fraction(f), _cell(T))[0]
+
+
+def enthalpy(T, f=0.):
+    return _lookup(property_tables()[1], T, _fraction(f), _cell(T))[0]
+
+
+def entropy_function(T, f=0.):
+    return _lookup(property_tables()[2], T, _fraction(f), _cell(T))[0]
+
+
+def gamma(T, f=0., R=R_GAS):
+    c = cp(T, f)
+    return c / (c - R)
+
+
+# Temperature where the table reaches the target value, and its cell, by Newton iterations from the guess. Within one cell
+# the table is linear, so a step from a point that stays in its cell lands on the root, and the iterations end once every
+# point does. After the first step usually only a few points still change cells, so the rest of the steps only work on those
+def _invert(table, target, x, T):
+    cell = _cell(T)
+    for _ in range(MAX_ITER):
+        value, slope = _lookup(table, T, x, cell)
+        T = T + (target - value) / slope
+        previous, cell = cell, _cell(T)
+        moved = np.flatnonzero(cell != previous)
+        if not moved.size:
+            break
+        if moved.size < SUBSET * cell.size:
+            index = np.unravel_index(moved, T.shape)
+            subset = lambda a: a if np.ndim(a) == 0 else np.broadcast_to(a, T.shape)[index]
+            T[index], cell[index] = _invert(table, subset(target), None if x is None else subset(x), T[index])
+            break
+    return T, cell
+
+
+def temperature_from_enthalpy(h, f=0., guess=1000.):
+    return _invert(property_tables()[1], h, _fraction(f), guess)[0]
+
+
+def temperature_from_entropy(phi, f=0., guess=1000.):
+    return _invert(property_tables()[2], phi, _fraction(f), guess)[0]
+
+
+# Temperature and cell where the entropy function has changed by change from its value at T_in (in its cell). The guess
+# keeps cp at its inlet value, which the slope of phi (cp/T) gives for free
+def _entropy_change(T_in, x, cell, change):
+    phi_in, slope = _lookup(property_tables()[2], T_in, x, cell)
+    return _invert(property_tables()[2], phi_in + change, x, T_in * np.exp(change / (slope * T_in)))
+
+
+# Exit temperature of a compression by the pressure ratio with a polytropic efficiency: phi rises by R ln(ratio) / eta
+def polytropic_temperature(T_in, ratio, efficiency, f=0., R=R_GAS):
+    return _entropy_change(T_in, _fraction(f), _cell(T_in), R * np.log(ratio) / efficiency)[0]
+
+
+# Exit temperature of an isentropic expansion from T_in by the pressure ratio p_in/p_out
+def isentropic_temperature(T_in, ratio, f=0., R=R_GAS):
+    return _entropy_change(T_in, _fraction(f), _cell(T_in), -R * np.log(ratio))[0]
+
+
+# Temperature drop and exit velocity [m/s] of a nozzle expanding from T_in by the pressure ratio p_in/p_out, with the
+# nozzle efficiency applied to the isentropic enthalpy drop
+def nozzle(T_in, ratio, efficiency, f=0., R=R_GAS):
+    x, cell, table = _fraction(f), _cell(T_in), property_tables()[1]
+    T_isentropic, cell_isentropic = _entropy_change(T_in, x, cell, -R * np.log(ratio))
+    h_in = _lookup(table, T_in, x, cell)[0]
+    drop = efficiency * (h_in - _lookup(table, T_isentropic, x, cell_isentropic)[0])
+    T_out = _invert(table, h_in - drop, x, T_in - efficiency * (T_in - T_isentropic))[0]
+    return T_in - T_out, np.sqrt(2 * 1000 * drop)
+
+
+# Exit temperature and pressure ratio p_out/p_in of a turbine delivering the specific work [kJ/kg of turbine gas] from T_in,
+# with a polytropic efficiency: phi falls by eta R ln(p_in/p_out)
+def turbine(T_in, work, efficiency, f, R=R_GAS):
+    x, cell = _fraction(f), _cell(T_in)
+    h_tables, phi_tables = property_tables()[1:]
+    h_in, cp_in = _lookup(h_tables, T_in, x, cell)
+    T_out, cell_out = _invert(h_tables, h_in - work, x, T_in - work / cp_in)
+    drop = _lookup(phi_tables, T_in, x, cell)[0] - _lookup(phi_tables, T_out, x, cell_out)[0]
+    return T_out, np.exp(-drop / (efficiency * R))
+
+
+# Fuel-air ratio heating air from T_in to T_out with a fuel of heating value h_fuel [kJ/kg]: (1 + f) h(T_out, f) =
+# h(T_in, 0) + f h_fuel. The products enthalpy depends on f, but as (1 + f) h(T_out, f) = (1 + f) h_air + f h_products is
+# linear in f, the fixed point of iterating on f is found directly
+def fuel_air_ratio(T_in, T_out, h_fuel):
+    table, cell = property_tables()[1], _cell(T_out)
+    h_air = _lookup(table, T_out, None, cell)[0]
+    h_products = table[2].take(cell) + table[3].take(cell) * T_out
+    return (h_air - enthalpy(T_in)) / (h_fuel - h_air - h_products)
@@ -0,0 +1,227 @@
+"""
+Opt-in instrumentation of the cycle stages, solvers, sweeps and result writing.
+While a Profiler is enabled, every instrumented section records its wall time and call count, solvers record their
+function evaluations and convergence, and cache hits and other events are counted. The records can be exported as JSON
+(aggregated per section), as a Chrome trace (chrome://tracing, Perfetto or speedscope) and as collapsed stacks for
+flamegraph.pl. Sweeps run in worker processes send the records of their workers back to the profiler of the parent.
+When no profiler is enabled the instrumented code only checks the module-level PROFILER for None.
+
+    Usage:
+        with profiling() as profiler:
+            TurboFan().performance()
+        profiler.to_json('profile.json')
+        profiler.to_trace('trace.json')
+"""
+import sys
+sys.path.append(".")
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+
+PROFILER   = None     # The enabled Profiler, None while instrumentation is off
+MAX_EVENTS = 1000000  # Trace events kept per profiler, later sections are still aggregated
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._stack().append(self.name)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        stack = self.profiler._stack()
+        self.profiler._add(tuple(stack), self.start, end - self.start)
+        stack.pop()
+        return False
+
+
+class Profiler:
+    def __init__(self, trace=True):
+        self.trace    = trace # Keep individual trace events, not only the aggregates
+        self.sections = {}    # Section name -> [calls, total ns, min ns, max ns]
+        self.stacks   = {}    # Stack of section names -> total ns, for the flame graph
+        self.solvers  = {}    # Solver name -> {'calls', 'points', 'nfev', 'iterations', 'converged', 'failed'}
+        self.counters = {}    # Event name -> count
+        self.events   = []    # (name, pid, tid, start ns, duration ns)
+        self.dropped  = 0     # Trace events beyond MAX_EVENTS
+        self._local   = threading.local()
+        self._lock    = threading.Lock()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _add(self, stack, start, duration):
+        name = stack[-1]
+        with self._lock:
+            section = self.sections.get(name)
+            if section is None:
+                self.sections[name] = [1, duration, duration, duration]
+            else:
+                section[0] += 1
+                section[1] += duration
+                section[2] = min(section[2], duration)
+                section[3] = max(section[3], duration)
+            self.stacks[stack] = self.stacks.get(stack, 0) + duration
+            if self.trace:
+                if len(self.events) < MAX_EVENTS:
+                    self.events.append((name, os.getpid(), threading.get_ident(), start, duration))
+                else:
+                    self.dropped += 1
+
+    # Context manager timing the enclosed code as the named section
+    def span(self, name):
+        return _Span(self, name)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    # Record one solver call over one or more points. converged is a bool or an array of per-point flags, nfev and
+    # iterations the function evaluations and iterations, per point or in total
+    def solver(self, name, nfev=1, converged=True, iterations=None):
+        converged = np.asarray(converged, dtype=bool)
+        points = converged.size
+        with self._lock:
+            stats = self.solvers.setdefault(name, dict.fromkeys(('calls', 'points', 'nfev', 'iterations', 'converged', 'failed'), 0))
+            stats['calls']      += 1
+            stats['points']     += points
+            stats['nfev']       += int(np.sum(nfev)) if np.ndim(nfev) else int(nfev)
+            stats['iterations'] += 0 if iterations is None else int(np.max(iterations))
+            stats['converged']  += int(converged.sum())
+            stats['failed']     += points - int(converged.sum())
+
+    # Everything recorded, as plain Python data that can be pickled back from a worker process
+    def state(self):
+        return {'sections': self.sections, 'stacks': self.stacks, 'solvers': self.solvers,
+                'counters': self.counters, 'events': self.events, 'dropped': self.dropped}
+
+    # Add the records of another profiler (e.g. of a worker process), with its stacks nested under the current section
+    def merge(self, state):
+        prefix = tuple(self._stack())
+        with self._lock:
+            for name, (calls, total, low, high) in state['sections'].items():
+                section = self.sections.setdefault(name, [0, 0, low, high])
+                section[0] += calls
+                section[1] += total
+                section[2] = min(section[2], low)
+                section[3] = max(section[3], high)
+            for stack, total in state['stacks'].items():
+                stack = prefix + tuple(stack)
+                self.stacks[stack] = self.stacks.get(stack, 0) + total
+            for name, stats in state['solvers'].items():
+                mine = self.solvers.setdefault(name, dict.fromkeys(stats, 0))
+                for key, value in stats.items():
+                    mine[key] += value
+            for name, n in state['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + n
+            room = MAX_EVENTS - len(self.events)
+            self.events.extend(state['events'][:max(room, 0)])
+            self.dropped += state['dropped'] + max(len(state['events']) - max(room, 0), 0)
+
+    # Aggregated records: per section the calls and wall times in seconds, the solver statistics and the counters
+    def to_dict(self):
+        sections = {name: {'calls': calls, 'total_s': total * 1e-9, 'mean_s': total * 1e-9 / calls,
+                           'min_s': low * 1e-9, 'max_s': high * 1e-9}
+                    for name, (calls, total, low, high) in sorted(self.sections.items(), key=lambda item: -item[1][1])}
+        return {'sections': sections, 'solvers': self.solvers, 'counters': self.counters,
+                'trace_events': len(self.events), 'dropped_events': self.dropped}
+
+    def to_json(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file, indent=4)
+
+    # Chrome trace event format, one complete ("X") event per recorded section
+    def to_trace(self, path):
+        origin = min((event[3] for event in self.events), default=0)
+        events = [{'name': name, 'ph': 'X', 'pid': pid, 'tid': tid, 'ts': (start - origin) / 1e3, 'dur': duration / 1e3}
+                  for name, pid, tid, start, duration in self.events]
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+
+    # Collapsed stacks ("outer;inner self-time-in-us" per line) as read by flamegraph.pl and speedscope
+    def to_collapsed(self, path):
+        self_time = dict(self.stacks)
+        for stack, total in self.stacks.items(): # Time of a section minus the time of the sections inside it
+            if len(stack) > 1 and stack[:-1] in self_time:
+                self_time[stack[:-1]] -= total
+        with open(path, 'w') as file:
+            for stack, total in sorted(self_time.items()):
+                file.write(f"{';'.join(stack)} {max(total // 1000, 0)}\n")
+
+
+def enable(trace=True):
+    global PROFILER
+    PROFILER = Profiler(trace)
+    return PROFILER
+
+
+def disable():
+    global PROFILER
+    profiler, PROFILER = PROFILER, None
+    return profiler
+
+
+# Enable a profiler for the enclosed code and return it
+@contextmanager
+def profiling(trace=True):
+    profiler = enable(trace)
+    try:
+        yield profiler
+    finally:
+        disable()
+
+
+# Time the enclosed code as the named section, a shared no-op while no profiler is enabled
+def span(name):
+    profiler = PROFILER
+    return _NULL_SPAN if profiler is None else profiler.span(name)
+
+
+def count(name, n=1):
+    if PROFILER is not None:
+        PROFILER.count(name, n)
+
+
+def record_solver(name, nfev=1, converged=True, iterations=None):
+    if PROFILER is not None:
+        PROFILER.solver(name, nfev, converged, iterations)
+
+
+# Decorator timing every call of a function as a section, the name defaults to the function's qualified name
+def instrumented(name=None):
+    def decorate(function):
+        section = name or function.__qualname__
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profiler = PROFILER
+            if profiler is None:
+                return function(*args, **kwargs)
+            with profiler.span(section):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,261 @@
+"""
+This code propagates uncertainty in the cycle constants through the TurboFan cycle by Monte Carlo sampling. The component
+efficiencies, pi_b, T04 or any other parameter in TurboFanBatch.PARAMETER_NAMES can be given a distribution, and the
+samples are evaluated with TurboFanBatch in chunks spread across a process pool.
+Each chunk is reduced to streaming accumulators before it is returned: RunningStats (count, mean and variance by
+Welford's method, min and max) and QuantileSketch, a mergeable log-bucket sketch whose quantiles are within a relative
+error alpha of the exact sample quantiles, in the tails too. Memory therefore does not grow with the number of samples.
+Points where the cycle has no solution (NaN outputs) are counted as infeasible and left out of the statistics.
+Every chunk draws from its own stream spawned from one seed, so a seeded run gives the same result for any number of workers.
+
+    Example spec:
+        {
+            "samples": 1000000,
+            "seed": 2024,
+            "distributions": {                                             # numpy.random.Generator method and its arguments
+                "n_inft": {"dist": "normal", "loc": 0.90, "scale": 0.01, "clip": [0, 1]},
+                "pi_b":   {"dist": "uniform", "low": 0.95, "high": 0.97},
+                "T04":    {"dist": "triangular", "left": 1520, "mode": 1560, "right": 1580}
+            },
+            "baseline": {"BPR": 10, "pi_f": 1.5, "pi_c": 36.0},           # values of the parameters not sampled
+            "outputs": ["F_m0", "TSFC"],                                   # optional, default is the performance outputs
+            "quantiles": [0.001, 0.5, 0.999],                              # optional
+            "chunk_size": 100000,
+            "workers": 4                                                   # optional, default is os.cpu_count()
+        }
+
+    Usage:
+        python Uncertainty/MonteCarlo.py spec.json
+"""
+import sys
+sys.path.append(".")
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from CycleAnalysis.TurboFanBatch import TurboFanBatch, DESIGN_NAMES, PARAMETER_NAMES, STATION_FIELDS, PERFORMANCE_FIELDS
+from Iterations.Sweep import load_spec
+
+SAMPLEABLE  = DESIGN_NAMES + PARAMETER_NAMES
+OUTPUTS     = PERFORMANCE_FIELDS + STATION_FIELDS
+CHUNK_SIZE  = 100000 # Default number of samples per chunk
+QUANTILES   = (0.001, 0.01, 0.05, 0.5, 0.95, 0.99, 0.999)
+ALPHA       = 1e-4   # Default relative accuracy of the quantile sketch
+
+
+class RunningStats:
+    def __init__(self):
+        self.count      = 0
+        self.infeasible = 0 # Samples with a NaN output
+        self.mean       = 0.
+        self.m2         = 0. # Sum of squared deviations from the mean
+        self.min        = math.inf
+        self.max        = -math.inf
+
+    # Add an array of samples, NaNs are counted as infeasible
+    def update(self, values):
+        values = np.ravel(values)
+        finite = values[~np.isnan(values)]
+        self.infeasible += values.size - finite.size
+        if finite.size:
+            chunk = RunningStats()
+            chunk.count, chunk.mean = finite.size, float(finite.mean())
+            chunk.m2  = float(((finite - chunk.mean)**2).sum())
+            chunk.min, chunk.max = float(finite.min()), float(finite.max())
+            self.merge(chunk)
+        return self
+
+    # Combine with the statistics of another set of samples (Chan et al. parallel form of Welford's update)
+    def merge(self, other):
+        count = self.count + other.count
+        if count:
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / count
+            self.m2   += other.m2 + delta**2 * self.count * other.count / count
+        self.count = count
+        self.infeasible += other.infeasible
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self): # Sample variance
+        return self.m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+# Counts of values in logarithmic buckets, bucket k holds values in (gamma^(k-1), gamma^k]
+class _LogBuckets:
+    def __init__(self):
+        self.offset = 0                       # Bucket index of counts[0]
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def add(self, keys, counts=None):
+        if not keys.size:
+            return
+        low, high = int(keys.min()), int(keys.max())
+        if not self.counts.size:
+            self.offset, self.counts = low, np.zeros(high - low + 1, dtype=np.int64)
+        elif low < self.offset or high >= self.offset + self.counts.size: # Grow to cover the new keys
+            start, stop = min(low, self.offset), max(high + 1, self.offset + self.counts.size)
+            grown = np.zeros(stop - start, dtype=np.int64)
+            grown[self.offset - start:self.offset - start + self.counts.size] = self.counts
+            self.offset, self.counts = start, grown
+        self.counts += np.bincount(keys - self.offset, weights=counts, minlength=self.counts.size).astype(np.int64)
+
+    def merge(self, other):
+        if other.counts.size:
+            self.add(np.arange(other.offset, other.offset + other.counts.size), other.counts)
+
+
+class QuantileSketch:
+    def __init__(self, alpha=ALPHA):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = _LogBuckets()
+        self.negative = _LogBuckets() # Buckets of -x for negative x
+        self.zeros = 0
+        self.count = 0
+
+    def _keys(self, values):
+        return np.ceil(np.log(values) / self._log_gamma).astype(np.int64)
+
+    # Add an array of samples, NaNs are ignored
+    def update(self, values):
+        values = np.ravel(values)
+        values = values[~np.isnan(values)]
+        self.positive.add(self._keys(values[values > 0]))
+        self.negative.add(self._keys(-values[values < 0]))
+        self.zeros += int(np.count_nonzero(values == 0))
+        self.count += values.size
+        return self
+
+    def merge(self, other):
+        if other.alpha != self.alpha:
+            raise ValueError("Cannot merge quantile sketches with different accuracy")
+        self.positive.merge(other.positive)
+        self.negative.merge(other.negative)
+        self.zeros += other.zeros
+        self.count += other.count
+        return self
+
+    # Estimates of the given quantiles (0..1, scalar or sequence), each within a relative error alpha of the exact value
+    def quantile(self, q):
+        q = np.asarray(q, dtype=float)
+        if not self.count:
+            return np.full(q.shape, np.nan)[()]
+        # Representative value of every bucket in ascending order, with its count
+        representative = lambda buckets: 2 * self.gamma**np.arange(buckets.offset, buckets.offset + buckets.counts.size) / (self.gamma + 1)
+        values = np.concatenate([-representative(self.negative)[::-1], [0.], representative(self.positive)])
+        counts = np.concatenate([self.negative.counts[::-1], [self.zeros], self.positive.counts])
+        ranks  = np.clip(np.floor(q * (self.count - 1)), 0, self.count - 1)
+        return values[np.searchsorted(np.cumsum(counts), ranks, side='right')][()]
+
+
+# Draw samples for every distribution from one random generator. Each spec entry names a numpy.random.Generator method
+# ("dist") and its keyword arguments, with an optional "clip": [low, high] to keep e.g. efficiencies at or below 1
+def draw_samples(distributions, size, rng):
+    samples = {}
+    for name, entry in distributions.items():
+        entry = dict(entry)
+        method, clip = entry.pop('dist'), entry.pop('clip', None)
+        if not hasattr(rng, method):
+            raise ValueError(f"Unknown distribution '{method}' for {name}")
+        values = getattr(rng, method)(size=size, **entry)
+        samples[name] = np.clip(values, *clip) if clip is not None else values
+    return samples
+
+
+# Evaluate one chunk of samples and reduce it to accumulators, run inside the worker processes
+def _evaluate_chunk(distributions, fixed, outputs, size, seed, alpha):
+    samples = draw_samples(distributions, size, np.random.default_rng(seed))
+    engine = TurboFanBatch(**dict(fixed, **samples))
+    performance = dict(zip(PERFORMANCE_FIELDS, engine.performance()))
+    stations = engine.stations()
+    results = {}
+    for name in outputs:
+        values = performance[name] if name in performance else stations[name]
+        results[name] = (RunningStats().update(values), QuantileSketch(alpha).update(values))
+    return results
+
+
+class MonteCarloResult:
+    def __init__(self, stats, sketches, samples, seed):
+        self.stats    = stats    # Output name -> RunningStats
+        self.sketches = sketches # Output name -> QuantileSketch
+        self.samples  = samples
+        self.seed     = seed
+
+    def quantile(self, name, q):
+        return self.sketches[name].quantile(q)
+
+    # Output name -> dict of the mean, standard deviation, range, infeasible count and the given quantiles
+    def summary(self, quantiles=QUANTILES):
+        summary = {}
+        for name, stats in self.stats.items():
+            summary[name] = {'mean': stats.mean, 'std': stats.std, 'min': stats.min, 'max': stats.max,
+                             'infeasible': stats.infeasible}
+            summary[name].update({f"q{q:g}": float(value) for q, value in
+                                  zip(quantiles, np.atleast_1d(self.quantile(name, quantiles)))})
+        return summary
+
+    def to_frame(self, quantiles=QUANTILES):
+        import pandas as pd # Only needed for reporting
+        return pd.DataFrame(self.summary(quantiles)).T
+
+
+# Sample the distributions around the fixed values and propagate them through the cycle.
+# The samples are split into chunks of chunk_size evaluated across a process pool, seed makes the run reproducible
+def monte_carlo(distributions, samples, fixed=None, outputs=PERFORMANCE_FIELDS, seed=None, chunk_size=CHUNK_SIZE,
+                workers=None, alpha=ALPHA):
+    fixed = dict(fixed or {})
+    unknown = sorted((set(distributions) | set(fixed)) - set(SAMPLEABLE))
+    if unknown:
+        raise ValueError(f"Cannot sample unknown parameters: {', '.join(unknown)}")
+    bad_outputs = sorted(set(outputs) - set(OUTPUTS))
+    if bad_outputs:
+        raise ValueError(f"Unknown Monte Carlo outputs: {', '.join(bad_outputs)}")
+    fixed = {name: value for name, value in fixed.items() if name not in distributions}
+    sizes = [min(chunk_size, samples - start) for start in range(0, samples, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes)) # Independent stream per chunk
+    stats = {name: RunningStats() for name in outputs}
+    sketches = {name: QuantileSketch(alpha) for name in outputs}
+
+    def collect(chunk): # Merged in chunk order, so the result does not depend on the number of workers
+        for name, (chunk_stats, chunk_sketch) in chunk.items():
+            stats[name].merge(chunk_stats)
+            sketches[name].merge(chunk_sketch)
+
+    workers = workers or os.cpu_count()
+    if workers == 1 or len(sizes) == 1:
+        for size, chunk_seed in zip(sizes, seeds):
+            collect(_evaluate_chunk(distributions, fixed, outputs, size, chunk_seed, alpha))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_evaluate_chunk, distributions, fixed, outputs, size, chunk_seed, alpha)
+                       for size, chunk_seed in zip(sizes, seeds)]
+            for future in futures:
+                collect(future.result())
+    return MonteCarloResult(stats, sketches, samples, seed)
+
+
+# Run a Monte Carlo spec, see the module docstring for its keys
+def run_monte_carlo(spec):
+    return monte_carlo(spec['distributions'], int(spec['samples']), spec.get('baseline'),
+                       tuple(spec.get('outputs', PERFORMANCE_FIELDS)), spec.get('seed'),
+                       int(spec.get('chunk_size', CHUNK_SIZE)), spec.get('workers'), spec.get('alpha', ALPHA))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python Uncertainty/MonteCarlo.py spec.json")
+    spec = load_spec(sys.argv[1])
+    result = run_monte_carlo(spec)
+    quantiles = tuple(spec.get('quantiles', QUANTILES))
+    print(f"{result.samples} samples, seed {result.seed}")
+    for name, summary in result.summary(quantiles).items():
+        print(f"{name:6s} " + '  '.join(f"{key} {value:.6g}" for key, value in summary.items()))